@@ -1,7 +1,7 @@
 from flask import Flask, render_template
 from flask_cors import CORS
 from .config import Config
-from .extensions import db, jwt, mail, migrate, login_manager
+from .extensions import db, jwt, mail, migrate, login_manager, cache, carts
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -12,6 +12,8 @@ def create_app(config_class=Config):
     jwt.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
+    cache.init_app(app)
+    carts.init_app(app)
     CORS(app)
 
     # Initialize login manager
@@ -19,7 +21,31 @@ def create_app(config_class=Config):
     login_manager.login_view = 'admin.login'
     
     # Import models after db initialization to avoid circular imports
-    from .models import User, Product, Category, Address, Cart, CartItem, Coupon, Order, OrderItem, Review
+    from .models import User, Product, Category, Address, Cart, CartItem, Coupon, Order, OrderItem, Review, IdempotencyKey, StockHold, DailySales, TableCounter, Job
+    
+    # Full-text search index lives next to the products table
+    from .services.search_service import register_search_ddl, search_cli
+    register_search_ddl()
+    app.cli.add_command(search_cli)
+    
+    from .services.cart_service import carts_cli
+    from .services.idempotency_service import idempotency_cli
+    from .services.stock_hold_service import holds_cli, schedule_release
+    from .services.sales_service import sales_cli
+    from .services.counter_service import counters_cli
+    from .services.analytics_service import analytics_cli
+    from .services.job_service import jobs_cli
+    app.cli.add_command(carts_cli)
+    app.cli.add_command(idempotency_cli)
+    app.cli.add_command(holds_cli)
+    app.cli.add_command(sales_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(jobs_cli)
+    
+    # Expired stock holds are released in the background by whichever
+    # worker notices first
+    app.before_request(schedule_release)
     
     @login_manager.user_loader
     def load_user(user_id):
@@ -51,18 +77,13 @@ def create_app(config_class=Config):
     
     @app.route('/')
     def home():
-        # Fetch featured products
-        featured_products = Product.query.filter_by(is_featured=True, is_active=True).limit(8).all()
-    
-        # Fetch categories
-        categories = Category.query.limit(8).all()
-    
-        # Fetch recent products
-        recent_products = Product.query.filter_by(is_active=True).order_by(Product.created_at.desc()).limit(4).all()
+        # Featured products, categories and new arrivals are precomputed and
+        # rebuilt in the background when the catalog changes
+        from .services.storefront_service import get_home_page
+        home = get_home_page()
     
         return render_template("index.html", 
-                             featured_products=featured_products,
-                             categories=categories,
-                             recent_products=recent_products)
+                             home=home,
+                             categories=home['categories'])
     
     return app
\ No newline at end of file
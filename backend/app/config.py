@@ -20,4 +20,91 @@ class Config:
     # File upload configuration
     UPLOAD_FOLDER = os.path.join('app', 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
\ No newline at end of file
+    # Raw-body product imports are streamed, so they get their own limit
+    PRODUCT_IMPORT_MAX_SIZE = int(os.environ.get('PRODUCT_IMPORT_MAX_SIZE', 1024 * 1024 * 1024))
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+    # Response cache: 'sqlite' is shared by all workers on a host (CACHE_PATH,
+    # default <instance>/cache.db), 'memory' is per-process, 'null' disables it
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'sqlite'
+    CACHE_PATH = os.environ.get('CACHE_PATH')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000))
+
+    # Cart storage: 'database' writes every cart change to carts/cart_items;
+    # 'sqlite' (shared by all workers on a host, CART_STORE_PATH, default
+    # <instance>/carts.db) and 'memory' (single process) keep active carts in
+    # a key/value store and write them back in batches every
+    # CART_FLUSH_INTERVAL seconds, at checkout and on `flask carts flush`
+    CART_STORE = os.environ.get('CART_STORE') or 'database'
+    CART_STORE_PATH = os.environ.get('CART_STORE_PATH')
+    CART_FLUSH_INTERVAL = int(os.environ.get('CART_FLUSH_INTERVAL', 5))
+    CART_FLUSH_BATCH_SIZE = int(os.environ.get('CART_FLUSH_BATCH_SIZE', 200))
+    CART_FLUSH_LEASE = 60  # seconds a flush may hold its claimed carts
+    CART_STORE_IDLE_TTL = int(os.environ.get('CART_STORE_IDLE_TTL', 24 * 3600))
+
+    # Guest carts (X-Cart-Token) are merged into the user's cart at login;
+    # `flask carts sweep` deletes the ones not written to for GUEST_CART_TTL
+    # seconds, GUEST_CART_SWEEP_BATCH_SIZE carts per transaction
+    GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL', 30 * 24 * 3600))
+    GUEST_CART_SWEEP_BATCH_SIZE = int(os.environ.get('GUEST_CART_SWEEP_BATCH_SIZE', 1000))
+
+    # Idempotency-Key responses are replayed for IDEMPOTENCY_KEY_TTL seconds
+    # (`flask idempotency purge` deletes expired keys); a first request that
+    # has not finished after IDEMPOTENCY_LOCK_TIMEOUT seconds may be retried
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+    # Coupon terms are cached this many seconds; uses are always counted
+    # in the database
+    COUPON_CACHE_TTL = int(os.environ.get('COUPON_CACHE_TTL', 30))
+
+    # Stock for Stripe/Razorpay orders is held STOCK_HOLD_TTL seconds for the
+    # payment webhook, then given back and the order cancelled. Each worker
+    # releases expired holds every STOCK_HOLD_RELEASE_INTERVAL seconds (0 to
+    # leave it to `flask holds release`), in batches of
+    # STOCK_HOLD_RELEASE_BATCH_SIZE holds
+    STOCK_HOLD_TTL = int(os.environ.get('STOCK_HOLD_TTL', 15 * 60))
+    STOCK_HOLD_RELEASE_INTERVAL = int(os.environ.get('STOCK_HOLD_RELEASE_INTERVAL', 30))
+    STOCK_HOLD_RELEASE_BATCH_SIZE = int(os.environ.get('STOCK_HOLD_RELEASE_BATCH_SIZE', 500))
+
+    # Admin views read row counts from table_counters instead of COUNT(*);
+    # counters older than COUNTER_RECONCILE_INTERVAL seconds are recounted in
+    # the background. TABLE_COUNT_MODE = 'estimate' uses the planner's row
+    # estimates on PostgreSQL instead (approximate)
+    TABLE_COUNT_MODE = os.environ.get('TABLE_COUNT_MODE') or 'exact'
+    COUNTER_RECONCILE_INTERVAL = int(os.environ.get('COUNTER_RECONCILE_INTERVAL', 3600))
+
+    # Precomputed home page: refreshed in the background once older than
+    # HOME_PAGE_TTL seconds (or on catalog changes), dropped after MAX_AGE
+    HOME_PAGE_TTL = int(os.environ.get('HOME_PAGE_TTL', 60))
+    HOME_PAGE_MAX_AGE = int(os.environ.get('HOME_PAGE_MAX_AGE', 3600))
+
+    # Sales reports read a columnar snapshot of orders and their lines under
+    # ANALYTICS_PATH (default <instance>/analytics), extended in the
+    # background once older than ANALYTICS_REFRESH_INTERVAL seconds and by
+    # `flask analytics refresh`. Orders younger than ANALYTICS_SETTLE_TIME
+    # seconds wait for the next refresh, so none still being committed is
+    # skipped; ANALYTICS_BATCH_SIZE orders are copied per query
+    ANALYTICS_PATH = os.environ.get('ANALYTICS_PATH')
+    ANALYTICS_REFRESH_INTERVAL = int(os.environ.get('ANALYTICS_REFRESH_INTERVAL', 300))
+    ANALYTICS_SETTLE_TIME = 60
+    ANALYTICS_BATCH_SIZE = 50000
+
+    # Emails, image resizing and payment webhooks are queued in the jobs
+    # table and run by `flask jobs work`, JOBS_CONCURRENCY at a time per
+    # worker, which polls every JOBS_POLL_INTERVAL seconds when idle. A job
+    # still running after JOBS_LEASE seconds is presumed lost and run again.
+    # Failures are retried after JOBS_RETRY_BACKOFF seconds, doubling up to
+    # JOBS_RETRY_BACKOFF_MAX, until JOBS_MAX_ATTEMPTS attempts have been
+    # made; the job is then left 'dead' for `flask jobs retry`
+    JOBS_CONCURRENCY = int(os.environ.get('JOBS_CONCURRENCY', 4))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1))
+    JOBS_LEASE = int(os.environ.get('JOBS_LEASE', 600))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_RETRY_BACKOFF = 10
+    JOBS_RETRY_BACKOFF_MAX = 3600
+
+    # Upper bounds of the price facet buckets on the product listing; the
+    # last bucket is open-ended
+    FACET_PRICE_BUCKETS = (25, 50, 100, 250, 500)
\ No newline at end of file
@@ -3,9 +3,13 @@ from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from .services.cache_service import ResponseCache
+from .services.cart_store import CartStorage
 
 db = SQLAlchemy()
 jwt = JWTManager()
 mail = Mail()
 migrate = Migrate()
-login_manager = LoginManager()
\ No newline at end of file
+login_manager = LoginManager()
+cache = ResponseCache()
+carts = CartStorage()
\ No newline at end of file
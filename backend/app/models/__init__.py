@@ -8,8 +8,15 @@ from .coupon import Coupon
 from .order import Order
 from .order_item import OrderItem
 from .review import Review
+from .idempotency_key import IdempotencyKey
+from .stock_hold import StockHold
+from .daily_sales import DailySales
+from .table_counter import TableCounter
+from .job import Job
+from .catalog_version import CatalogVersion
 
 __all__ = [
     'User', 'Category', 'Product', 'Address', 'Cart', 
-    'CartItem', 'Coupon', 'Order', 'OrderItem', 'Review'
+    'CartItem', 'Coupon', 'Order', 'OrderItem', 'Review', 'IdempotencyKey',
+    'StockHold', 'DailySales', 'TableCounter', 'Job', 'CatalogVersion'
 ]
\ No newline at end of file
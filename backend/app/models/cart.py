@@ -2,11 +2,17 @@ from ..extensions import db
 
 class Cart(db.Model):
     __tablename__ = 'carts'
+    __table_args__ = (
+        # A user's cart, and the sweep of guest carts (user_id IS NULL) by age
+        db.Index('ix_carts_user_updated', 'user_id', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Nullable for guest carts
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+    # Last cart-store version written to cart_items (see services/cart_store.py)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     items = db.relationship('CartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
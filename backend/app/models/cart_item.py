@@ -10,5 +10,9 @@ class CartItem(db.Model):
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)  # Price snapshot
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     
+    __table_args__ = (
+        db.Index('ix_cart_items_cart_product', 'cart_id', 'product_id'),
+    )
+    
     def get_subtotal(self):
         return self.unit_price * self.quantity
\ No newline at end of file
@@ -0,0 +1,13 @@
+from ..extensions import db
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_version'
+
+    # A single row (id 1) whose token changes on every catalog write; kept
+    # in the database so every worker sees the same one, whatever the
+    # cache backend (see services/cache_service.py)
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)  # UTC
+    # Counts stock changes, which leave the token alone
+    stock_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
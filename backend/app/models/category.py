@@ -1,3 +1,4 @@
+from sqlalchemy.orm.attributes import set_committed_value
 from ..extensions import db
 
 class Category(db.Model):
@@ -7,7 +8,76 @@ class Category(db.Model):
     slug = db.Column(db.String(50), unique=True, nullable=False)
     description = db.Column(db.String(200), nullable=True)  # Add this line
     parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
-    
+
+    # Materialized path of ancestor ids including this one, e.g. '/1/4/9/'.
+    # A subtree is every row whose path starts with the root's path.
+    # Compared bytewise (SQLite's default; "C" on PostgreSQL, whose locale
+    # collations skip punctuation) for subtree_range and tree order.
+    path = db.Column(db.String(255).with_variant(db.String(255, collation='C'), 'postgresql'), index=True)
+    depth = db.Column(db.Integer, default=0)
+
     # Relationships
     products = db.relationship('Product', backref='category', lazy=True)
-    children = db.relationship('Category', backref=db.backref('parent', remote_side=[id]))
\ No newline at end of file
+    children = db.relationship('Category', backref=db.backref('parent', remote_side=[id]))
+
+    @staticmethod
+    def subtree_range(column, path):
+        """Index-friendly 'column starts with path' test.
+
+        Paths only contain digits and '/', and '0' sorts right after '/'
+        bytewise (the column's collation), so the prefix '/1/' covers
+        exactly the range ['/1/', '/10').
+        """
+        if isinstance(path, str):
+            upper = path[:-1] + '0'
+        else:
+            upper = db.func.substr(path, 1, db.func.length(path) - 1) + '0'
+        return db.and_(column >= path, column < upper)
+
+    @classmethod
+    def subtree_query(cls, root_id):
+        """All categories in the subtree rooted at root_id, in one query"""
+        root = db.aliased(cls)
+        return cls.query.join(root, cls.subtree_range(cls.path, root.path)).filter(root.id == root_id)
+
+    @classmethod
+    def subtree_ids(cls, root_id):
+        """Select of the ids in the subtree rooted at root_id (for IN filters)"""
+        root = db.aliased(cls)
+        return db.select(cls.id).join(root, cls.subtree_range(cls.path, root.path)).where(root.id == root_id)
+
+    def move_to(self, parent):
+        """Re-parent this category, rewriting the paths of its whole subtree"""
+        if parent is not None and parent.path.startswith(self.path):
+            raise ValueError('A category cannot be moved under itself or its descendants')
+
+        old_path, old_depth = self.path, self.depth or 0
+        self.parent = parent
+        new_path = f'{parent.path if parent else "/"}{self.id}/'
+        new_depth = (parent.depth or 0) + 1 if parent else 0
+
+        Category.query.filter(Category.subtree_range(Category.path, old_path)).update({
+            Category.path: db.literal(new_path) + db.func.substr(Category.path, len(old_path) + 1),
+            Category.depth: Category.depth + (new_depth - old_depth)
+        }, synchronize_session=False)
+
+        self.path, self.depth = new_path, new_depth
+
+
+@db.event.listens_for(Category, 'after_insert')
+def set_category_path(mapper, connection, target):
+    """Fill in path and depth as soon as the new row has an id"""
+    parent_path, parent_depth = '/', -1
+    if target.parent_id is not None:
+        parent = connection.execute(
+            db.select(Category.path, Category.depth).where(Category.id == target.parent_id)
+        ).first()
+        if parent is not None and parent.path:
+            parent_path, parent_depth = parent.path, parent.depth or 0
+
+    path, depth = f'{parent_path}{target.id}/', parent_depth + 1
+    connection.execute(
+        Category.__table__.update().where(Category.id == target.id).values(path=path, depth=depth)
+    )
+    set_committed_value(target, 'path', path)
+    set_committed_value(target, 'depth', depth)
@@ -0,0 +1,70 @@
+from decimal import Decimal
+from sqlalchemy.dialects import postgresql, sqlite
+from ..extensions import db
+from .order import Order, OrderStatus
+
+class DailySales(db.Model):
+    __tablename__ = 'daily_sales'
+
+    # Orders placed each day and the revenue they still bring in; kept up
+    # to date by the Order mapper events below, rebuilt by `flask sales backfill`
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+
+# Orders in these states are counted but bring in no revenue
+NON_REVENUE_STATUSES = (OrderStatus.CANCELLED, OrderStatus.REFUNDED)
+
+
+def order_revenue(status, total_amount):
+    if status in NON_REVENUE_STATUSES or total_amount is None:
+        return Decimal('0')
+    return Decimal(total_amount)
+
+
+def apply_sales_delta(connection, day, orders=0, revenue=0):
+    """Add ``orders`` and ``revenue`` (either may be negative) to one day's row.
+
+    An upsert where the database has one, so the first order of a day
+    cannot race another for the insert.
+    """
+    table = DailySales.__table__
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table).values(
+            day=day, order_count=orders, revenue=revenue
+        )
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.day],
+            set_={
+                'order_count': table.c.order_count + insert.excluded.order_count,
+                'revenue': table.c.revenue + insert.excluded.revenue,
+            }
+        ))
+        return
+
+    result = connection.execute(
+        table.update().where(table.c.day == day)
+        .values(order_count=table.c.order_count + orders, revenue=table.c.revenue + revenue)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(day=day, order_count=orders, revenue=revenue))
+
+
+@db.event.listens_for(Order, 'after_insert')
+def order_inserted(mapper, connection, target):
+    status = target.status or OrderStatus.PENDING
+    apply_sales_delta(connection, target.created_at.date(), 1, order_revenue(status, target.total_amount))
+
+
+@db.event.listens_for(Order, 'after_update')
+def order_updated(mapper, connection, target):
+    attrs = db.inspect(target).attrs
+    status, amount = attrs.status.history, attrs.total_amount.history
+    if not (status.deleted or amount.deleted):
+        return
+    old_status = status.deleted[0] if status.deleted else target.status
+    old_amount = amount.deleted[0] if amount.deleted else target.total_amount
+    delta = order_revenue(target.status, target.total_amount) - order_revenue(old_status, old_amount)
+    if delta:
+        apply_sales_delta(connection, target.created_at.date(), revenue=delta)
@@ -0,0 +1,14 @@
+from ..extensions import db
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # sha256 of the caller, endpoint and Idempotency-Key header
+    key_hash = db.Column(db.String(64), unique=True, nullable=False)
+    # sha256 of the method, path and body of the first request
+    fingerprint = db.Column(db.String(64), nullable=False)
+    response_status = db.Column(db.Integer, nullable=True)  # None while the first request runs
+    response_body = db.Column(db.Text, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
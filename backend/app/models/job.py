@@ -0,0 +1,22 @@
+from ..extensions import db
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    # Work queued for `flask jobs work` (see services/job_service.py). A
+    # queued job is due at run_at; a running one is presumed lost once
+    # run_at (the end of its lease) has passed. Jobs that succeed are
+    # deleted, jobs out of attempts stay behind as 'dead'
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(200), nullable=False)  # module:function
+    payload = db.Column(db.JSON, nullable=False)  # {'args': [...], 'kwargs': {...}}
+    status = db.Column(db.String(10), nullable=False, default='queued', server_default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+    )
@@ -18,6 +18,7 @@ class Order(db.Model):
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     shipping_amount = db.Column(db.Numeric(10, 2), default=0)
     coupon_id = db.Column(db.Integer, db.ForeignKey('coupons.id'), nullable=True)
+    coupon_discount = db.Column(db.Numeric(10, 2), nullable=True)  # Already taken off total_amount
     payment_method = db.Column(db.String(20))  # stripe, razorpay, cod
     shipping_address_id = db.Column(db.Integer, db.ForeignKey('addresses.id'), nullable=False)
     stripe_payment_id = db.Column(db.String(100))
@@ -25,5 +26,19 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
     
+    # created_at comes back with the INSERT, for the daily_sales rollup
+    __mapper_args__ = {'eager_defaults': True}
+    
+    __table_args__ = (
+        # A user's order history, newest first
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+        # Admin listing (optionally by status), dashboard recent orders and
+        # daily sales ranges
+        db.Index('ix_orders_created_at', 'created_at', 'id'),
+        db.Index('ix_orders_status_created', 'status', 'created_at', 'id'),
+        # Orders changed since the last analytics snapshot refresh
+        db.Index('ix_orders_updated_at', 'updated_at'),
+    )
+    
     # Relationships
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
\ No newline at end of file
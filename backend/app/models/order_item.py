@@ -8,4 +8,10 @@ class OrderItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
-    total_price = db.Column(db.Numeric(10, 2), nullable=False)
\ No newline at end of file
+    total_price = db.Column(db.Numeric(10, 2), nullable=False)
+    
+    # Both directions are covering for the frequently-bought-together query
+    __table_args__ = (
+        db.Index('ix_order_items_order_product', 'order_id', 'product_id'),
+        db.Index('ix_order_items_product_order', 'product_id', 'order_id'),
+    )
\ No newline at end of file
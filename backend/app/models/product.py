@@ -2,6 +2,21 @@ from ..extensions import db
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Covers the facet GROUP BY over active products, so counting the
+        # catalog reads this narrow index instead of the product rows
+        db.Index('ix_products_facets', 'is_active', 'category_id', 'price', 'stock'),
+        # Newest-first listings (storefront, home page, admin) and price sorts,
+        # ending in id to match the keyset sort keys
+        db.Index('ix_products_active_created', 'is_active', 'created_at', 'id'),
+        db.Index('ix_products_created_at', 'created_at', 'id'),
+        db.Index('ix_products_active_price', 'is_active', 'price', 'id'),
+        # Category pages with price filters, similar products, category deletes
+        db.Index('ix_products_category_price', 'category_id', 'price'),
+        db.Index('ix_products_featured', 'is_featured', 'is_active'),
+        # Imports and bulk price/stock updates find products by SKU
+        db.Index('ix_products_sku', 'sku', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -18,7 +33,22 @@ class Product(db.Model):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
     
+    # Review aggregates, maintained incrementally by the Review mapper events
+    rating_avg = db.Column(db.Numeric(3, 2))
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_1_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_2_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_3_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_4_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_5_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
     # Relationships
     reviews = db.relationship('Review', backref='product', lazy=True)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
-    cart_items = db.relationship('CartItem', backref='product', lazy=True)
\ No newline at end of file
+    cart_items = db.relationship('CartItem', backref='product', lazy=True)
+    
+    def rating_histogram(self):
+        return {
+            star: getattr(self, f'rating_{star}_count') or 0
+            for star in range(1, 6)
+        }
@@ -1,3 +1,4 @@
+from sqlalchemy.orm import Session
 from ..extensions import db
 
 class Review(db.Model):
@@ -13,4 +14,75 @@ class Review(db.Model):
     # Ensure a user can only review a product once
     __table_args__ = (
         db.UniqueConstraint('user_id', 'product_id', name='unique_user_product_review'),
-    )
\ No newline at end of file
+        # A product's reviews newest first, and the admin listing
+        db.Index('ix_reviews_product_created', 'product_id', 'created_at', 'id'),
+        db.Index('ix_reviews_created_at', 'created_at', 'id'),
+    )
+
+RATING_ATTRIBUTES = ['rating_avg', 'rating_count'] + [f'rating_{star}_count' for star in range(1, 6)]
+
+
+def apply_rating_delta(connection, product_id, deltas):
+    """Adjust a product's review aggregates by {star: +n/-n} in one UPDATE.
+
+    Every right-hand side sees the pre-update row, so the new average is
+    derived from the old histogram plus the deltas and stays exact.
+    """
+    from .product import Product
+
+    histogram = {
+        star: getattr(Product, f'rating_{star}_count') + deltas.get(star, 0)
+        for star in range(1, 6)
+    }
+    count = sum(histogram.values())
+    total = sum(star * histogram[star] for star in range(1, 6))
+
+    values = {f'rating_{star}_count': histogram[star] for star in deltas}
+    values['rating_count'] = Product.rating_count + sum(deltas.values())
+    values['rating_avg'] = db.case((count > 0, db.func.round(total * 1.0 / count, 2)), else_=None)
+
+    connection.execute(
+        Product.__table__.update().where(Product.id == product_id).values(**values)
+    )
+
+
+def _queue_rating_refresh(target):
+    # The aggregates are written behind the ORM's back; expire the loaded
+    # Product (if any) once the flush is over
+    session = db.inspect(target).session
+    if session is not None:
+        session.info.setdefault('rating_refresh', set()).add(target.product_id)
+
+
+@db.event.listens_for(Review, 'after_insert')
+def review_inserted(mapper, connection, target):
+    apply_rating_delta(connection, target.product_id, {target.rating: 1})
+    _queue_rating_refresh(target)
+
+
+@db.event.listens_for(Review, 'after_delete')
+def review_deleted(mapper, connection, target):
+    apply_rating_delta(connection, target.product_id, {target.rating: -1})
+    _queue_rating_refresh(target)
+
+
+@db.event.listens_for(Review, 'after_update')
+def review_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.rating.history
+    if not history.has_changes() or not history.deleted:
+        return
+    old_rating, new_rating = history.deleted[0], target.rating
+    if old_rating != new_rating:
+        apply_rating_delta(connection, target.product_id, {old_rating: -1, new_rating: 1})
+        _queue_rating_refresh(target)
+
+
+@db.event.listens_for(Session, 'after_flush_postexec')
+def refresh_product_ratings(session, flush_context):
+    from .product import Product
+
+    for product_id in session.info.pop('rating_refresh', ()):
+        key = db.inspect(Product).identity_key_from_primary_key([product_id])
+        product = session.identity_map.get(key)
+        if product is not None:
+            session.expire(product, RATING_ATTRIBUTES)
@@ -0,0 +1,14 @@
+from ..extensions import db
+
+class StockHold(db.Model):
+    __tablename__ = 'stock_holds'
+    
+    # Stock taken for a PENDING order while its online payment runs; given
+    # back (and the order cancelled) if the payment has not succeeded by
+    # expires_at (see services/stock_hold_service.py)
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
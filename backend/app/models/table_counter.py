@@ -0,0 +1,45 @@
+from collections import Counter
+from sqlalchemy.orm import Session
+from ..extensions import db
+
+class TableCounter(db.Model):
+    __tablename__ = 'table_counters'
+
+    # Exact row counts of the tables in COUNTED_TABLES, so that admin views
+    # need no COUNT(*) (see services/counter_service.py)
+    name = db.Column(db.String(64), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    reconciled_at = db.Column(db.DateTime, nullable=True)
+
+COUNTED_TABLES = ('users', 'products', 'orders', 'reviews')
+
+
+def apply_counter_deltas(connection, deltas):
+    """Add {table name: +n/-n} to the counters with one executemany.
+
+    Counters that do not exist yet are left alone: they start from an
+    exact COUNT(*) the first time they are read.
+    """
+    deltas = [{'b_name': name, 'b_delta': delta} for name, delta in deltas.items() if delta]
+    if deltas:
+        table = TableCounter.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.name == db.bindparam('b_name'))
+            .values(count=table.c['count'] + db.bindparam('b_delta')),
+            deltas
+        )
+
+
+@db.event.listens_for(Session, 'after_flush')
+def count_flushed_rows(session, flush_context):
+    # Bulk Core statements do not pass through here; their callers use
+    # counter_service.adjust_counter(), and reconciliation catches the rest
+    deltas = Counter()
+    for instance in session.new:
+        if getattr(instance, '__tablename__', None) in COUNTED_TABLES:
+            deltas[instance.__tablename__] += 1
+    for instance in session.deleted:
+        if getattr(instance, '__tablename__', None) in COUNTED_TABLES:
+            deltas[instance.__tablename__] -= 1
+    apply_counter_deltas(session.connection(), deltas)
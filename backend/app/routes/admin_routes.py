@@ -1,5 +1,5 @@
 # routes/admin_routes.py
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from ..models.user import User
 from ..models.product import Product
@@ -9,10 +9,17 @@ from ..models.order_item import OrderItem
 from ..models.review import Review
 from app import db
 from ..utils.decorators import admin_required
+from ..utils.pagination import paginate_listing
+from ..services.cache_service import invalidate_products, bump_catalog_version
+from ..services.product_io_service import EXPORTERS, FORMATS_BY_MIMETYPE, READERS, bulk_update_products, import_products
+from ..services.sales_service import sales_summary
+from ..services.counter_service import table_count, table_counts
+from ..services.analytics_service import sales_by, sales_trend
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 from flask import current_app
 
 def allowed_file(filename):
@@ -25,48 +32,32 @@ admin_bp = Blueprint('admin', __name__)
 @login_required
 @admin_required
 def dashboard():
-    # Get statistics for the dashboard
-    total_users = User.query.count()
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
+    # Get statistics for the dashboard (kept in table_counters, no COUNT(*))
+    counts = table_counts('users', 'products')
+    
+    # Order and revenue totals and the last 7 days for the chart, all from
+    # the daily_sales rollup in one query
+    sales = sales_summary(days=7)
     
     # Recent orders
     recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
     
-    # Sales data for the chart (last 7 days)
-    sales_data = []
-    for i in range(6, -1, -1):
-        date = datetime.now() - timedelta(days=i)
-        day_start = datetime(date.year, date.month, date.day)
-        day_end = day_start + timedelta(days=1)
-        
-        day_sales = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.created_at >= day_start,
-            Order.created_at < day_end
-        ).scalar() or 0
-        
-        sales_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'sales': float(day_sales)
-        })
-    
     return render_template('admin/dashboard.html', 
-                         total_users=total_users,
-                         total_products=total_products,
-                         total_orders=total_orders,
-                         total_revenue=total_revenue,
+                         total_users=counts['users'],
+                         total_products=counts['products'],
+                         total_orders=sales['order_count'],
+                         total_revenue=sales['revenue'],
                          recent_orders=recent_orders,
-                         sales_data=sales_data)
+                         sales_data=sales['chart'])
 
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def users():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    users = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    users = paginate_listing(User.query, (User.created_at, User.id), per_page=per_page,
+                             total=table_count('users'))
     return render_template('admin/users.html', users=users)
 
 @admin_bp.route('/user/<int:user_id>')
@@ -92,10 +83,10 @@ def toggle_user(user_id):
 @login_required
 @admin_required
 def products():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    products = Product.query.order_by(Product.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    products = paginate_listing(Product.query, (Product.created_at, Product.id), per_page=per_page,
+                                total=table_count('products'))
     categories = Category.query.all()
     return render_template('admin/products.html', products=products, categories=categories)
 
@@ -111,8 +102,12 @@ def add_product():
         discount_price = float(request.form.get('discount_price')) if request.form.get('discount_price') else None
         stock = int(request.form.get('stock'))
         category_id = int(request.form.get('category_id'))
-        sku = request.form.get('sku')
+        sku = request.form.get('sku') or None
         is_featured = True if request.form.get('is_featured') else False
+        
+        if sku and Product.query.filter_by(sku=sku).first():
+            flash(f'SKU {sku} is already used by another product', 'danger')
+            return render_template('admin/product_form.html', categories=categories, product=None)
 
         # Generate slug
         slug = name.replace(' ', '-').lower()
@@ -145,6 +140,7 @@ def add_product():
         )
         db.session.add(product)
         db.session.commit()
+        invalidate_products()
         flash('Product added successfully', 'success')
         return redirect(url_for('admin.products'))
     return render_template('admin/product_form.html', categories=categories, product=None)
@@ -157,13 +153,18 @@ def edit_product(product_id):
     categories = Category.query.all()
     
     if request.method == 'POST':
+        sku = request.form.get('sku') or None
+        if sku and Product.query.filter(Product.sku == sku, Product.id != product.id).first():
+            flash(f'SKU {sku} is already used by another product', 'danger')
+            return render_template('admin/product_form.html', product=product, categories=categories)
+        
         product.name = request.form.get('name')
         product.description = request.form.get('description')
         product.price = float(request.form.get('price'))
         product.discount_price = float(request.form.get('discount_price')) if request.form.get('discount_price') else None
         product.stock = int(request.form.get('stock'))
         product.category_id = int(request.form.get('category_id'))
-        product.sku = request.form.get('sku')
+        product.sku = sku
         product.is_featured = True if request.form.get('is_featured') else False
         product.is_active = True if request.form.get('is_active') else False
         
@@ -188,6 +189,7 @@ def edit_product(product_id):
                 product.images = new_images
         
         db.session.commit()
+        invalidate_products(product.id)
         
         flash('Product updated successfully', 'success')
         return redirect(url_for('admin.products'))
@@ -208,24 +210,113 @@ def delete_product(product_id):
     
     db.session.delete(product)
     db.session.commit()
+    invalidate_products(product_id)
     
     flash('Product deleted successfully', 'success')
     return redirect(url_for('admin.products'))
 
+@admin_bp.route('/products/export')
+@login_required
+@admin_required
+def export_products():
+    file_format = request.args.get('format', 'csv')
+    if file_format not in EXPORTERS:
+        return jsonify({'error': f'Unsupported format: {file_format}'}), 400
+    
+    # Generated batch by batch while the response is sent
+    exporter, mimetype = EXPORTERS[file_format]
+    response = Response(stream_with_context(exporter()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=products.{file_format}'
+    return response
+
+def _product_file():
+    """(stream, format) of a product file posted to import or bulk update.
+
+    Either a file from the admin form, or the raw request body
+    (curl --data-binary @products.csv -H 'Content-Type: text/csv');
+    (None, None) if the form came without a file.
+    """
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return None, None
+        return upload.stream, upload.filename.rsplit('.', 1)[-1].lower()
+    # Read straight from the WSGI input under the import size limit
+    # rather than buffering the body under MAX_CONTENT_LENGTH
+    stream = get_input_stream(request.environ,
+                              max_content_length=current_app.config['PRODUCT_IMPORT_MAX_SIZE'])
+    return stream, request.args.get('format') or FORMATS_BY_MIMETYPE.get(request.mimetype)
+
+@admin_bp.route('/products/import', methods=['POST'])
+@login_required
+@admin_required
+def import_products_upload():
+    from_form = request.mimetype == 'multipart/form-data'
+    stream, file_format = _product_file()
+    if stream is None:
+        flash('Choose a CSV or NDJSON file to import', 'danger')
+        return redirect(url_for('admin.products'))
+    
+    try:
+        if file_format not in READERS:
+            raise ValueError(f'Unsupported format: {file_format}')
+        report = import_products(stream, file_format)
+    except Exception as e:
+        if from_form:
+            flash(f'Import failed: {e}', 'danger')
+            return redirect(url_for('admin.products'))
+        return jsonify({'error': str(e)}), 400
+    
+    if from_form:
+        category = 'warning' if report['failed'] else 'success'
+        flash(f"Imported {report['processed']} products, skipped {report['failed']} invalid rows", category)
+        return redirect(url_for('admin.products'))
+    return jsonify(report), 200
+
+@admin_bp.route('/products/bulk-update', methods=['POST'])
+@login_required
+@admin_required
+def bulk_update_products_upload():
+    # Rows of sku plus any of price, discount_price, stock, is_active
+    from_form = request.mimetype == 'multipart/form-data'
+    stream, file_format = _product_file()
+    if stream is None:
+        flash('Choose a CSV or NDJSON file of updates', 'danger')
+        return redirect(url_for('admin.products'))
+    
+    try:
+        if file_format not in READERS:
+            raise ValueError(f'Unsupported format: {file_format}')
+        report = bulk_update_products(stream, file_format)
+    except Exception as e:
+        if from_form:
+            flash(f'Bulk update failed: {e}', 'danger')
+            return redirect(url_for('admin.products'))
+        return jsonify({'error': str(e)}), 400
+    
+    if from_form:
+        category = 'warning' if report['failed'] else 'success'
+        flash(f"Updated {report['updated']} products, skipped {report['failed']} rows", category)
+        return redirect(url_for('admin.products'))
+    return jsonify(report), 200
+
 @admin_bp.route('/orders')
 @login_required
 @admin_required
 def orders():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     status = request.args.get('status', 'all')
     
     query = Order.query
+    total = None
     
     if status != 'all':
+        # Filtered listings still count the matching rows
         query = query.filter_by(status=status)
+    else:
+        total = table_count('orders')
     
-    orders = query.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    orders = paginate_listing(query, (Order.created_at, Order.id), per_page=per_page, total=total)
     return render_template('admin/orders.html', orders=orders, status=status)
 
 @admin_bp.route('/order/<int:order_id>')
@@ -252,12 +343,48 @@ def update_order_status(order_id):
     flash(f'Order status updated to {new_status}', 'success')
     return redirect(url_for('admin.order_detail', order_id=order_id))
 
+def _report_range():
+    # ?start=YYYY-MM-DD&end=YYYY-MM-DD, both days included
+    start = request.args.get('start')
+    end = request.args.get('end')
+    start = datetime.fromisoformat(start) if start else None
+    end = datetime.fromisoformat(end) + timedelta(days=1) if end else None
+    return start, end
+
+@admin_bp.route('/reports/sales')
+@login_required
+@admin_required
+def sales_report():
+    # Revenue by product, category or hour of the week, from the analytics
+    # snapshot rather than the orders tables
+    try:
+        start, end = _report_range()
+        limit = min(request.args.get('limit', 20, type=int), 500)
+        report = sales_by(request.args.get('by', 'product'), start, end, limit)
+        return jsonify(report), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@admin_bp.route('/reports/trend')
+@login_required
+@admin_required
+def sales_trend_report():
+    # Orders, revenue and average order value per day, week or month
+    try:
+        start, end = _report_range()
+        report = sales_trend(request.args.get('bucket', 'day'), start, end)
+        return jsonify(report), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
 @admin_bp.route('/categories')
 @login_required
 @admin_required
 def categories():
-    categories = Category.query.all()
-    return render_template('admin/categories.html', categories=categories)
+    categories = Category.query.order_by(Category.path).all()
+    edit_id = request.args.get('edit', type=int)
+    category = Category.query.get_or_404(edit_id) if edit_id else None
+    return render_template('admin/categories.html', categories=categories, category=category)
 
 @admin_bp.route('/category/new', methods=['POST'])
 @login_required
@@ -265,13 +392,15 @@ def categories():
 def add_category():
     name = request.form.get('name')
     description = request.form.get('description')
-    slug = name.replace(' ', '-').lower()  # Generate slug automatically
     if not name:
         flash('Category name is required', 'danger')
         return redirect(url_for('admin.categories'))
-    category = Category(name=name, slug=slug, description=description)
+    slug = name.replace(' ', '-').lower()  # Generate slug automatically
+    parent_id = request.form.get('parent_id', type=int)
+    category = Category(name=name, slug=slug, description=description, parent_id=parent_id)
     db.session.add(category)
     db.session.commit()
+    bump_catalog_version()
     flash('Category added successfully', 'success')
     return redirect(url_for('admin.categories'))
 
@@ -283,7 +412,27 @@ def edit_category(category_id):
     
     category.name = request.form.get('name')
     category.description = request.form.get('description')
+    
+    # Re-parent only when the form sends the field; an empty value is top level
+    parent_id = category.parent_id
+    if 'parent_id' in request.form:
+        value = request.form['parent_id'].strip()
+        if value and not value.isdigit():
+            flash('Invalid parent category', 'danger')
+            return redirect(url_for('admin.categories', edit=category_id))
+        parent_id = int(value) if value else None
+    if parent_id != category.parent_id:
+        parent = Category.query.get_or_404(parent_id) if parent_id else None
+        try:
+            category.move_to(parent)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.categories', edit=category_id))
+    
     db.session.commit()
+    # Subtree product filters depend on the hierarchy
+    invalidate_products()
     
     flash('Category updated successfully', 'success')
     return redirect(url_for('admin.categories'))
@@ -295,12 +444,17 @@ def delete_category(category_id):
     category = Category.query.get_or_404(category_id)
     
     # Check if category has products
-    if category.products.count() > 0:
+    if Product.query.filter_by(category_id=category.id).first():
         flash('Cannot delete category that has products', 'danger')
         return redirect(url_for('admin.categories'))
     
+    # Subcategories move up to the deleted category's parent
+    for child in list(category.children):
+        child.move_to(category.parent)
+    
     db.session.delete(category)
     db.session.commit()
+    invalidate_products()
     
     flash('Category deleted successfully', 'success')
     return redirect(url_for('admin.categories'))
@@ -309,10 +463,10 @@ def delete_category(category_id):
 @login_required
 @admin_required
 def reviews():
-    page = request.args.get('page', 1, type=int)
     per_page = 20
     
-    reviews = Review.query.order_by(Review.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    reviews = paginate_listing(Review.query, (Review.created_at, Review.id), per_page=per_page,
+                               total=table_count('reviews'))
     return render_template('admin/reviews.html', reviews=reviews)
 
 @admin_bp.route('/review/<int:review_id>/toggle', methods=['POST'])
@@ -331,8 +485,10 @@ def toggle_review(review_id):
 @admin_required
 def delete_review(review_id):
     review = Review.query.get_or_404(review_id)
+    product_id = review.product_id
     db.session.delete(review)
     db.session.commit()
+    invalidate_products(product_id)
     
     flash('Review deleted successfully', 'success')
     return redirect(url_for('admin.reviews'))
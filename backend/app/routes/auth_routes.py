@@ -3,8 +3,11 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from ..models.user import User
 from ..extensions import db
 from ..schemas.user_schema import UserSchema
+from ..services.cart_service import merge_guest_cart
+from ..utils.security import CART_TOKEN_HEADER, read_cart_token
 
 auth_bp = Blueprint('auth', __name__)
+user_schema = UserSchema()
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -23,7 +26,7 @@ def register():
         db.session.add(user)
         db.session.commit()
         
-        access_token = create_access_token(identity=user.id)
+        access_token = create_access_token(identity=str(user.id))
         return jsonify({
             'user': user_schema.dump(user),
             'token': access_token
@@ -39,7 +42,12 @@ def login():
         user = User.query.filter_by(email=data['email']).first()
         
         if user and user.check_password(data['password']):
-            access_token = create_access_token(identity=user.id)
+            # Bring along what the shopper put in their cart as a guest
+            guest_cart_id = read_cart_token(data.get('cart_token') or request.headers.get(CART_TOKEN_HEADER))
+            if guest_cart_id is not None:
+                merge_guest_cart(user.id, guest_cart_id)
+            
+            access_token = create_access_token(identity=str(user.id))
             return jsonify({
                 'user': user_schema.dump(user),
                 'token': access_token,
@@ -1,71 +1,74 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models.cart import Cart
-from ..models.cart_item import CartItem
+from marshmallow import ValidationError
 from ..models.product import Product
-from ..extensions import db
+from ..schemas.cart_schema import CartBatchSchema
+from ..services import cart_service
+from ..utils.decorators import idempotent
+from ..utils.security import CART_TOKEN_HEADER, make_cart_token, read_cart_token
 
 cart_bp = Blueprint('cart', __name__)
 
-def get_or_create_cart(user_id):
-    cart = Cart.query.filter_by(user_id=user_id).first()
-    if not cart:
-        cart = Cart(user_id=user_id)
-        db.session.add(cart)
-        db.session.commit()
-    return cart
+def _cart_owner():
+    """(user id, guest cart id): users have their own cart, guests send a cart token"""
+    user_id = get_jwt_identity()
+    if user_id is not None:
+        return user_id, None
+    return None, read_cart_token(request.headers.get(CART_TOKEN_HEADER))
+
+def _with_cart_token(payload, guest_cart_id):
+    """Hand guests the token for their cart"""
+    if guest_cart_id is not None:
+        payload['cart_token'] = make_cart_token(guest_cart_id)
+    return payload
 
 @cart_bp.route('/', methods=['GET'])
-@jwt_required()
+@jwt_required(optional=True)
 def get_cart():
     try:
-        user_id = get_jwt_identity()
-        cart = get_or_create_cart(user_id)
+        user_id, guest_cart_id = _cart_owner()
+        if user_id is not None:
+            return jsonify(cart_service.get_cart(user_id)), 200
         
-        return jsonify({
-            'id': cart.id,
-            'items': [{
-                'id': item.id,
-                'product_id': item.product_id,
-                'name': item.product.name,
-                'quantity': item.quantity,
-                'unit_price': float(item.unit_price),
-                'subtotal': float(item.get_subtotal()),
-                'image': item.product.images[0] if item.product.images else None
-            } for item in cart.items],
-            'total': float(cart.get_total())
-        }), 200
+        cart = cart_service.get_guest_cart(guest_cart_id)
+        return jsonify(_with_cart_token(cart, cart['id'])), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 @cart_bp.route('/items', methods=['POST'])
-@jwt_required()
+@jwt_required(optional=True)
+@idempotent
 def add_to_cart():
     try:
-        user_id = get_jwt_identity()
+        user_id, guest_cart_id = _cart_owner()
         data = request.get_json()
         
         product = Product.query.get_or_404(data['product_id'])
-        cart = get_or_create_cart(user_id)
+        guest_cart_id = cart_service.add_item(user_id, product, data.get('quantity', 1), guest_cart_id)
         
-        # Check if item already in cart
-        existing_item = next((item for item in cart.items if item.product_id == product.id), None)
+        return jsonify(_with_cart_token({'message': 'Item added to cart'}, guest_cart_id)), 200
         
-        if existing_item:
-            existing_item.quantity += data.get('quantity', 1)
-        else:
-            cart_item = CartItem(
-                cart_id=cart.id,
-                product_id=product.id,
-                quantity=data.get('quantity', 1),
-                unit_price=product.discount_price or product.price
-            )
-            db.session.add(cart_item)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@cart_bp.route('/batch', methods=['POST'])
+@jwt_required(optional=True)
+@idempotent
+def batch_update_cart():
+    try:
+        user_id, guest_cart_id = _cart_owner()
+        data = CartBatchSchema().load(request.get_json() or {})
         
-        db.session.commit()
+        guest_cart_id = cart_service.apply_batch(user_id, data['operations'], guest_cart_id)
         
-        return jsonify({'message': 'Item added to cart'}), 200
+        if user_id is not None:
+            return jsonify(cart_service.get_cart(user_id)), 200
+        return jsonify(_with_cart_token(cart_service.get_guest_cart(guest_cart_id), guest_cart_id)), 200
         
+    except ValidationError as e:
+        return jsonify({'error': e.messages}), 400
+    except cart_service.UnknownProducts as e:
+        return jsonify({'error': str(e), 'product_ids': e.product_ids}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 400
\ No newline at end of file
@@ -1,22 +1,43 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, request, jsonify
 from ..models.category import Category
+from ..utils.decorators import catalog_conditional
 
 categories_bp = Blueprint('categories', __name__)
 
+def build_category_tree(categories):
+    """Assemble nested dicts from categories sorted by path (parents first)"""
+    nodes = {}
+    roots = []
+    for category in categories:
+        node = {
+            'id': category.id,
+            'name': category.name,
+            'slug': category.slug,
+            'children': []
+        }
+        nodes[category.id] = node
+        parent = nodes.get(category.parent_id)
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
 @categories_bp.route('/', methods=['GET'])
+@catalog_conditional
 def get_categories():
     try:
-        categories = Category.query.filter(Category.parent_id == None).all()
-        
-        def build_category_tree(category):
-            return {
-                'id': category.id,
-                'name': category.name,
-                'slug': category.slug,
-                'children': [build_category_tree(child) for child in category.children]
-            }
-        
-        return jsonify([build_category_tree(cat) for cat in categories]), 200
-        
+        # The whole tree, or the subtree under ?root=<id>, in a single query
+        root_id = request.args.get('root', type=int)
+
+        if root_id:
+            query = Category.subtree_query(root_id)
+        else:
+            query = Category.query
+
+        categories = query.order_by(Category.path).all()
+
+        return jsonify(build_category_tree(categories)), 200
+
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        return jsonify({'error': str(e)}), 400
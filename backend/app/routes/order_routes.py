@@ -5,54 +5,79 @@ from ..models.order_item import OrderItem
 from ..models.cart import Cart
 from ..models.address import Address
 from ..extensions import db
+from ..services.coupon_service import CouponError
+from ..services.inventory_service import InsufficientStock
+from ..services.order_service import EmptyCart, create_order, order_history
+from ..utils.decorators import idempotent
+from ..utils.pagination import InvalidCursor
 
 orders_bp = Blueprint('orders', __name__)
 
+MAX_PER_PAGE = 50
+
+def serialize_order_summary(order, items):
+    return {
+        'id': order.id,
+        'status': order.status.value if order.status else None,
+        'total_amount': float(order.total_amount),
+        'shipping_amount': float(order.shipping_amount or 0),
+        'coupon_discount': float(order.coupon_discount) if order.coupon_discount is not None else None,
+        'payment_method': order.payment_method,
+        'created_at': order.created_at.isoformat() if order.created_at else None,
+        'item_count': order.item_count,
+        'unit_count': order.unit_count,
+        'items': [{
+            'product_id': item.product_id,
+            'name': item.name,
+            'quantity': item.quantity,
+            'unit_price': float(item.unit_price),
+            'total_price': float(item.total_price)
+        } for item in items]
+    }
+
+@orders_bp.route('/', methods=['GET'])
+@jwt_required()
+def list_orders():
+    try:
+        user_id = get_jwt_identity()
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        
+        # Newest first, by cursor: pass next_cursor back as ?after=
+        orders, items = order_history(user_id, after=request.args.get('after'), per_page=per_page)
+        
+        return jsonify({
+            'items': [serialize_order_summary(order, items[order.id]) for order in orders.items],
+            'per_page': orders.per_page,
+            'next_cursor': orders.next_cursor,
+            'has_next': orders.has_next
+        }), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @orders_bp.route('/checkout', methods=['POST'])
 @jwt_required()
+@idempotent
 def checkout():
     try:
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # Get user's cart
-        cart = Cart.query.filter_by(user_id=user_id).first_or_404()
-        
-        if not cart.items:
-            return jsonify({'error': 'Cart is empty'}), 400
-        
-        # Create order
-        order = Order(
-            user_id=user_id,
-            shipping_address_id=data['shipping_address_id'],
-            total_amount=cart.get_total(),
-            payment_method=data['payment_method']
+        order = create_order(
+            user_id,
+            data['shipping_address_id'],
+            data['payment_method'],
+            coupon_code=data.get('coupon_code')
         )
         
-        db.session.add(order)
-        
-        # Add order items
-        for cart_item in cart.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                unit_price=cart_item.unit_price,
-                total_price=cart_item.get_subtotal()
-            )
-            db.session.add(order_item)
-        
-        # Clear cart
-        db.session.query(CartItem).filter(CartItem.cart_id == cart.id).delete()
-        
-        db.session.commit()
-        
-        return jsonify({
-            'order_id': order.id,
-            'status': order.status.value,
-            'total_amount': float(order.total_amount)
-        }), 201
+        return jsonify(order), 201
         
+    except (EmptyCart, CouponError) as e:
+        return jsonify({'error': str(e)}), 400
+    except InsufficientStock as e:
+        return jsonify({'error': str(e), 'product_id': e.product_id}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
\ No newline at end of file
@@ -1,33 +1,110 @@
 from flask import Blueprint, request, jsonify
+from werkzeug.datastructures import MultiDict
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import or_
 from ..models.product import Product
 from ..models.category import Category
-from ..extensions import db
+from ..models.review import Review
+from ..models.user import User
+from ..extensions import db, cache
+from ..services.search_service import search_products
+from ..services.facet_service import compute_facets
+from ..utils.pagination import InvalidCursor, keyset_paginate
+from ..utils.decorators import catalog_conditional
+from ..services.cache_service import PRODUCT_LIST_TAG, make_cache_key, product_tag
 
 products_bp = Blueprint('products', __name__)
 
+# Sort orders available in cursor mode: (sort columns, descending).
+# Each ends in the primary key so the order is total.
+CURSOR_SORTS = {
+    'newest': ((Product.created_at, Product.id), True),
+    'price_asc': ((Product.price, Product.id), False),
+    'price_desc': ((Product.price, Product.id), True),
+}
+
+MAX_PER_PAGE = 100
+
+# Listing arguments that change the facet counts (paging and sort do not)
+FACET_FILTER_ARGS = ('q', 'category', 'include_descendants', 'min_price', 'max_price')
+
+# Reviews embedded in the product detail; the rest come from /<id>/reviews
+REVIEWS_PREVIEW_SIZE = 5
+REVIEW_SORT = (Review.created_at, Review.id)
+
+def serialize_product_summary(p):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'slug': p.slug,
+        'price': float(p.price),
+        'discount_price': float(p.discount_price) if p.discount_price else None,
+        'images': p.images,
+        'stock': p.stock,
+        'rating_avg': float(p.rating_avg) if p.rating_avg is not None else None,
+        'rating_count': p.rating_count
+    }
+
+def serialize_review(r):
+    return {
+        'id': r.id,
+        'rating': r.rating,
+        'comment': r.comment,
+        'user_name': r.user.full_name,
+        'created_at': r.created_at.isoformat()
+    }
+
+def reviews_query(product_id):
+    # Reviewer names come from the same joined SELECT
+    return Review.query.options(
+        db.joinedload(Review.user).load_only(User.full_name)
+    ).filter(Review.product_id == product_id)
+
+def get_facets(query):
+    # Shared by every page and sort of the same filter set
+    args = MultiDict([(key, value) for key, value in request.args.items(multi=True) if key in FACET_FILTER_ARGS])
+    cache_key = make_cache_key('products:facets', args)
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_facets(query)
+        cache.set(cache_key, facets, tags=[PRODUCT_LIST_TAG])
+    return facets
+
+def get_product_or_404(id_or_slug):
+    if id_or_slug.isdigit():
+        return Product.query.get_or_404(int(id_or_slug))
+    return Product.query.filter_by(slug=id_or_slug).first_or_404()
+
 @products_bp.route('/', methods=['GET'])
+@catalog_conditional
 def get_products():
     try:
+        # Listings are cached until the TTL expires or an admin product write
+        # invalidates PRODUCT_LIST_TAG
+        cache_key = make_cache_key('products:list', request.args)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached), 200
+        
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('q', '')
         category_id = request.args.get('category', type=int)
+        include_descendants = request.args.get('include_descendants', 'false').lower() == 'true'
         min_price = request.args.get('min_price', type=float)
         max_price = request.args.get('max_price', type=float)
+        include_total = request.args.get('include_total', 'true').lower() != 'false'
+        include_facets = request.args.get('facets', 'false').lower() == 'true'
         
         query = Product.query.filter(Product.is_active == True)
         
         if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
-            )
+            # Relevance-ranked full-text match (FTS5 on SQLite, tsvector on PostgreSQL)
+            query = search_products(query, search)
         
-        if category_id:
+        if category_id and include_descendants:
+            # Whole subtree via the materialized category path
+            query = query.filter(Product.category_id.in_(Category.subtree_ids(category_id)))
+        elif category_id:
             query = query.filter(Product.category_id == category_id)
         
         if min_price is not None:
@@ -36,35 +113,65 @@ def get_products():
         if max_price is not None:
             query = query.filter(Product.price <= max_price)
         
-        products = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Cursor mode: ?after=<token> (empty for the first page). Results follow
+        # the cursor sort rather than relevance; no OFFSET and no COUNT(*)
+        # unless include_total=true is passed explicitly.
+        if 'after' in request.args:
+            sort = request.args.get('sort', 'newest')
+            if sort not in CURSOR_SORTS:
+                return jsonify({'error': f'Invalid sort: {sort}'}), 400
+            columns, descending = CURSOR_SORTS[sort]
+            products = keyset_paginate(
+                query, columns,
+                after=request.args.get('after'),
+                per_page=min(max(per_page, 1), MAX_PER_PAGE),
+                descending=descending,
+                with_total=request.args.get('include_total', 'false').lower() == 'true'
+            )
+            
+            payload = {
+                'items': [serialize_product_summary(p) for p in products.items],
+                'per_page': products.per_page,
+                'next_cursor': products.next_cursor,
+                'has_next': products.has_next,
+                'total': products.total
+            }
+            if include_facets:
+                payload['facets'] = get_facets(query)
+            cache.set(cache_key, payload, tags=[PRODUCT_LIST_TAG])
+            return jsonify(payload), 200
         
-        return jsonify({
-            'items': [{
-                'id': p.id,
-                'name': p.name,
-                'slug': p.slug,
-                'price': float(p.price),
-                'discount_price': float(p.discount_price) if p.discount_price else None,
-                'images': p.images,
-                'stock': p.stock
-            } for p in products.items],
+        products = query.paginate(page=page, per_page=per_page, max_per_page=MAX_PER_PAGE,
+                                  error_out=False, count=include_total)
+        
+        payload = {
+            'items': [serialize_product_summary(p) for p in products.items],
             'page': products.page,
             'per_page': products.per_page,
             'total': products.total
-        }), 200
+        }
+        if include_facets:
+            # Counts for the whole filter set, not just this page
+            payload['facets'] = get_facets(query)
+        cache.set(cache_key, payload, tags=[PRODUCT_LIST_TAG])
+        return jsonify(payload), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 @products_bp.route('/<id_or_slug>', methods=['GET'])
+@catalog_conditional
 def get_product(id_or_slug):
     try:
-        if id_or_slug.isdigit():
-            product = Product.query.get_or_404(int(id_or_slug))
-        else:
-            product = Product.query.filter_by(slug=id_or_slug).first_or_404()
+        cache_key = make_cache_key(f'products:detail:{id_or_slug}')
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached), 200
         
-        return jsonify({
+        product = get_product_or_404(id_or_slug)
+        reviews = keyset_paginate(reviews_query(product.id), REVIEW_SORT, per_page=REVIEWS_PREVIEW_SIZE)
+        
+        payload = {
             'id': product.id,
             'name': product.name,
             'slug': product.slug,
@@ -75,13 +182,53 @@ def get_product(id_or_slug):
             'stock': product.stock,
             'images': product.images,
             'category_id': product.category_id,
-            'reviews': [{
-                'rating': r.rating,
-                'comment': r.comment,
-                'user_name': r.user.full_name,
-                'created_at': r.created_at.isoformat()
-            } for r in product.reviews]
+            'rating': {
+                'average': float(product.rating_avg) if product.rating_avg is not None else None,
+                'count': product.rating_count,
+                'histogram': product.rating_histogram()
+            },
+            'reviews': [serialize_review(r) for r in reviews.items],
+            'reviews_next_cursor': reviews.next_cursor
+        }
+        # Tagged by id so that both the /<id> and /<slug> entries are dropped
+        cache.set(cache_key, payload, tags=[product_tag(product.id)])
+        return jsonify(payload), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 404
+
+@products_bp.route('/<id_or_slug>/reviews', methods=['GET'])
+@catalog_conditional
+def get_product_reviews(id_or_slug):
+    try:
+        product = get_product_or_404(id_or_slug)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+        query = reviews_query(product.id)
+        
+        # Newest first, by cursor (?after=, as in reviews_next_cursor) or page
+        # number; the total is the denormalized rating_count, not a COUNT(*)
+        if 'after' in request.args:
+            reviews = keyset_paginate(query, REVIEW_SORT, after=request.args.get('after'), per_page=per_page)
+            return jsonify({
+                'items': [serialize_review(r) for r in reviews.items],
+                'per_page': reviews.per_page,
+                'next_cursor': reviews.next_cursor,
+                'has_next': reviews.has_next,
+                'total': product.rating_count
+            }), 200
+        
+        page = request.args.get('page', 1, type=int)
+        reviews = query.order_by(Review.created_at.desc(), Review.id.desc()).paginate(
+            page=page, per_page=per_page, max_per_page=MAX_PER_PAGE, error_out=False, count=False
+        )
+        return jsonify({
+            'items': [serialize_review(r) for r in reviews.items],
+            'page': reviews.page,
+            'per_page': reviews.per_page,
+            'total': product.rating_count
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': str(e)}), 404
\ No newline at end of file
+        return jsonify({'error': str(e)}), 404
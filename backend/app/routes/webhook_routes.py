@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
-from ..models.order import Order, OrderStatus
+from ..models.order import Order
 from ..extensions import db
+from ..services.email_service import send_order_confirmation
+from ..services.stock_hold_service import confirm_payment
 
 webhook_bp = Blueprint('webhook', __name__)
 
@@ -15,10 +17,17 @@ def stripe_webhook():
             order_id = payment_intent['metadata'].get('order_id')
             
             if order_id:
-                order = Order.query.get(order_id)
-                if order:
-                    order.status = OrderStatus.PAID
+                # Paid before the response, so the hold release can never
+                # cancel it; only the confirmation email waits for a job
+                # worker. A retried webhook finds the order paid already
+                try:
+                    if confirm_payment(int(order_id)):
+                        order = db.session.get(Order, int(order_id))
+                        send_order_confirmation(order, order.user)
                     db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
         
         return jsonify({'success': True}), 200
         
@@ -4,7 +4,7 @@ from .user_schema import UserSchema, UserUpdateSchema, LoginSchema
 from .product_schema import ProductSchema, ProductUpdateSchema
 from .category_schema import CategorySchema, CategoryTreeSchema
 from .address_schema import AddressSchema
-from .cart_schema import CartSchema, CartItemSchema
+from .cart_schema import CartSchema, CartItemSchema, CartOperationSchema, CartBatchSchema
 from .order_schema import OrderSchema, OrderItemSchema, CheckoutSchema
 
 __all__ = [
@@ -12,6 +12,6 @@ __all__ = [
     'ProductSchema', 'ProductUpdateSchema',
     'CategorySchema', 'CategoryTreeSchema',
     'AddressSchema',
-    'CartSchema', 'CartItemSchema',
+    'CartSchema', 'CartItemSchema', 'CartOperationSchema', 'CartBatchSchema',
     'OrderSchema', 'OrderItemSchema', 'CheckoutSchema'
 ]
\ No newline at end of file
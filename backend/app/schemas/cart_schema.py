@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, validate
+from marshmallow import Schema, fields, validate, validates_schema
 
 class CartItemSchema(Schema):
     id = fields.Int(dump_only=True)
@@ -15,4 +15,22 @@ class CartSchema(Schema):
     items = fields.List(fields.Nested(CartItemSchema))
     total = fields.Decimal(dump_only=True, places=2)
     created_at = fields.DateTime(dump_only=True)
-    updated_at = fields.DateTime(dump_only=True)
\ No newline at end of file
+    updated_at = fields.DateTime(dump_only=True)
+
+class CartOperationSchema(Schema):
+    op = fields.Str(required=True, validate=validate.OneOf(['add', 'update', 'remove']))
+    product_id = fields.Int(required=True)
+    quantity = fields.Int(validate=validate.Range(min=0))
+
+    @validates_schema
+    def validate_quantity(self, data, **kwargs):
+        # add: quantity to add (default 1); update: new quantity (0 removes)
+        if data.get('op') == 'add' and data.get('quantity', 1) < 1:
+            raise validate.ValidationError('Must be at least 1.', 'quantity')
+        if data.get('op') == 'update' and 'quantity' not in data:
+            raise validate.ValidationError('Missing data for required field.', 'quantity')
+
+class CartBatchSchema(Schema):
+    operations = fields.List(
+        fields.Nested(CartOperationSchema), required=True, validate=validate.Length(min=1, max=100)
+    )
\ No newline at end of file
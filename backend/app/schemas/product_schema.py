@@ -26,4 +26,12 @@ class ProductUpdateSchema(Schema):
     is_active = fields.Bool()
     is_featured = fields.Bool()
     category_id = fields.Int()
-    images = fields.List(fields.Str())
\ No newline at end of file
+    images = fields.List(fields.Str())
+
+class ProductBulkUpdateSchema(Schema):
+    # One row of a bulk price/stock update; products are found by SKU
+    sku = fields.Str(required=True, validate=validate.Length(min=1, max=50))
+    price = fields.Decimal(places=2, validate=validate.Range(min=0))
+    discount_price = fields.Decimal(places=2, validate=validate.Range(min=0))
+    stock = fields.Int(validate=validate.Range(min=0))
+    is_active = fields.Bool()
\ No newline at end of file
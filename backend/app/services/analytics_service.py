@@ -0,0 +1,465 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import AppGroup
+from ..extensions import db
+from ..models.category import Category
+from ..models.daily_sales import NON_REVENUE_STATUSES
+from ..models.order import Order, OrderStatus
+from ..models.order_item import OrderItem
+from ..models.product import Product
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+analytics_cli = AppGroup('analytics', help='Sales analytics snapshot commands.')
+
+# Bumped whenever the file layout changes; an older snapshot is rebuilt
+SNAPSHOT_VERSION = 1
+META_FILE = 'meta.json'
+LOCK_FILE = 'refresh.lock'
+
+# One file of fixed-width values per column. Orders are stored in id order
+# and each order line points at the position of its order in those files
+ORDER_COLUMNS = {'id': np.int64, 'created_at': np.int64, 'status': np.int8, 'total_cents': np.int64}
+ITEM_COLUMNS = {'order_pos': np.int64, 'product_id': np.int32, 'quantity': np.int32, 'total_cents': np.int64}
+
+# Stored status codes are positions in STATUSES; REVENUE_STATUS[code] tells
+# whether orders in that state bring in revenue
+STATUSES = tuple(OrderStatus)
+REVENUE_STATUS = np.array([status not in NON_REVENUE_STATUSES for status in STATUSES])
+
+DIMENSIONS = ('product', 'category', 'hour_of_week')
+BUCKETS = ('day', 'week', 'month')
+
+_refresh_lock = threading.Lock()
+
+
+def _lock_file(lock):
+    """Take an exclusive lock on an open file, waiting for other processes"""
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return
+    # msvcrt's blocking mode gives up after ten seconds, so poll instead
+    while True:
+        try:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+def _unlock_file(lock):
+    if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    else:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def snapshot_path():
+    return current_app.config.get('ANALYTICS_PATH') or os.path.join(current_app.instance_path, 'analytics')
+
+
+def _column_path(path, table, name):
+    return os.path.join(path, f'{table}.{name}.bin')
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == SNAPSHOT_VERSION else None
+
+
+def _write_meta(path, meta):
+    # Readers trust the row counts in meta.json, so it is replaced only once
+    # the column files hold at least that many rows
+    temp = os.path.join(path, META_FILE + '.tmp')
+    with open(temp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(temp, os.path.join(path, META_FILE))
+
+
+def _map_columns(path, table, columns, rows, mode='r'):
+    if not rows:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+    return {name: np.memmap(_column_path(path, table, name), dtype=dtype, mode=mode, shape=(rows,))
+            for name, dtype in columns.items()}
+
+
+def _append_columns(path, table, columns, rows, values):
+    """Write ``values`` ({column: array}) after the first ``rows`` rows of each file.
+
+    Anything past ``rows`` is left over from an interrupted refresh and
+    is overwritten. A file started over is a new file: workers may still
+    have the old one mapped, and shrinking it under them would crash them.
+    """
+    for name, dtype in columns.items():
+        if not rows and os.path.exists(_column_path(path, table, name)):
+            os.remove(_column_path(path, table, name))
+        fd = os.open(_column_path(path, table, name), os.O_RDWR | os.O_CREAT)
+        with open(fd, 'r+b') as f:
+            f.seek(rows * np.dtype(dtype).itemsize)
+            f.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _epoch_seconds(values):
+    """Naive datetimes as seconds since 1970-01-01 on the same clock"""
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def _cents(column):
+    return db.cast(db.func.round(column * 100), db.BigInteger)
+
+
+def _status_code():
+    return db.case(*[(Order.status == status, code) for code, status in enumerate(STATUSES)], else_=0)
+
+
+def _append_orders(path, meta, settled_before, batch_size):
+    """Append orders past the id watermark, and their lines; returns the orders added.
+
+    Stops at the first order created after ``settled_before``: ids are
+    handed out before commit, so a younger order with a lower id may
+    still be in flight, and the watermark must not pass it.
+    """
+    added = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Order.id, Order.created_at, _status_code(), _cents(Order.total_amount))
+            .where(Order.id > meta['order_watermark'])
+            .order_by(Order.id)
+            .limit(batch_size)
+        ).all()
+        settled = []
+        for row in rows:
+            if row[1] is not None and row[1] > settled_before:
+                break
+            settled.append(row)
+        if not settled:
+            return added
+
+        ids, created_at, statuses, totals = zip(*settled)
+        order_ids = np.array(ids, dtype=np.int64)
+        _append_columns(path, 'orders', ORDER_COLUMNS, meta['order_rows'], {
+            'id': order_ids,
+            'created_at': _epoch_seconds([value or settled_before for value in created_at]),
+            'status': statuses,
+            'total_cents': totals,
+        })
+
+        # Lines are written in the same transaction as their order, so every
+        # line of a settled order is visible by now
+        lines = db.session.execute(
+            db.select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, _cents(OrderItem.total_price))
+            .where(OrderItem.order_id > meta['order_watermark'], OrderItem.order_id <= ids[-1])
+            .order_by(OrderItem.order_id, OrderItem.id)
+        ).all()
+        if lines:
+            line_orders, product_ids, quantities, line_totals = zip(*lines)
+            _append_columns(path, 'items', ITEM_COLUMNS, meta['item_rows'], {
+                'order_pos': meta['order_rows'] + np.searchsorted(order_ids, np.array(line_orders, dtype=np.int64)),
+                'product_id': product_ids,
+                'quantity': quantities,
+                'total_cents': line_totals,
+            })
+
+        meta['order_rows'] += len(settled)
+        meta['item_rows'] += len(lines)
+        meta['order_watermark'] = ids[-1]
+        _write_meta(path, meta)
+        added += len(settled)
+        if len(settled) < len(rows) or len(rows) < batch_size:
+            return added
+
+
+def _patch_orders(path, meta, changed_since):
+    """Copy status and total changes made since ``changed_since`` into the snapshot"""
+    if not meta['order_rows']:
+        return 0
+    rows = db.session.execute(
+        db.select(Order.id, _status_code(), _cents(Order.total_amount))
+        .where(Order.updated_at >= changed_since, Order.id <= meta['order_watermark'])
+    ).all()
+    if not rows:
+        return 0
+
+    ids, statuses, totals = (np.array(values, dtype=np.int64) for values in zip(*rows))
+    orders = _map_columns(path, 'orders', ORDER_COLUMNS, meta['order_rows'], mode='r+')
+    positions = np.minimum(np.searchsorted(orders['id'], ids), meta['order_rows'] - 1)
+    found = orders['id'][positions] == ids
+    orders['status'][positions[found]] = statuses[found]
+    orders['total_cents'][positions[found]] = totals[found]
+    for column in orders.values():
+        column.flush()
+    return int(found.sum())
+
+
+def _write_categories(path):
+    """Rewrite the product id -> category id lookup (-1: none)"""
+    rows = db.session.execute(db.select(Product.id, Product.category_id)).all()
+    categories = np.full(max((row[0] for row in rows), default=0) + 1, -1, dtype=np.int32)
+    if rows:
+        product_ids, category_ids = zip(*rows)
+        categories[list(product_ids)] = [-1 if value is None else value for value in category_ids]
+    temp = os.path.join(path, 'products.category_id.bin.tmp')
+    categories.tofile(temp)
+    os.replace(temp, os.path.join(path, 'products.category_id.bin'))
+
+
+def refresh_snapshot(rebuild=False):
+    """Bring the analytics snapshot up to date; returns (orders added, orders patched).
+
+    Orders past the id watermark are appended with their lines, and
+    orders changed since the last refresh (per updated_at) get their
+    status and total rewritten in place, so nothing already copied is
+    read again. ``rebuild`` starts from an empty snapshot. One process
+    refreshes at a time; the others wait on a file lock.
+    """
+    config = current_app.config
+    path = snapshot_path()
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILE), 'w') as lock:
+        _lock_file(lock)
+        try:
+            meta = None if rebuild else _read_meta(path)
+            # Timestamps come from the database clock, like created_at/updated_at
+            now = db.session.execute(db.select(db.func.now(type_=db.DateTime))).scalar().replace(tzinfo=None)
+            settled_before = now - timedelta(seconds=config['ANALYTICS_SETTLE_TIME'])
+
+            patched = 0
+            if meta is None:
+                meta = {'version': SNAPSHOT_VERSION, 'order_watermark': 0, 'order_rows': 0, 'item_rows': 0,
+                        'changed_since': settled_before.isoformat()}
+            else:
+                patched = _patch_orders(path, meta, datetime.fromisoformat(meta['changed_since']))
+            added = _append_orders(path, meta, settled_before, config['ANALYTICS_BATCH_SIZE'])
+            _write_categories(path)
+
+            meta['changed_since'] = settled_before.isoformat()
+            meta['refreshed_at'] = time.time()
+            _write_meta(path, meta)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            _unlock_file(lock)
+    return added, patched
+
+
+def _refresh_in_background(app):
+    with app.app_context():
+        try:
+            refresh_snapshot()
+        except Exception:
+            logger.exception('Analytics snapshot refresh failed')
+        finally:
+            db.session.remove()
+            _refresh_lock.release()
+
+
+def schedule_refresh():
+    """Start a background refresh unless this process is already refreshing"""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_refresh_in_background, args=(app,), daemon=True).start()
+
+
+class SalesSnapshot:
+    """The snapshot as read-only memory-mapped columns.
+
+    ``orders`` and ``items`` map column names to arrays; ``categories``
+    maps product ids to category ids (-1: none).
+    """
+
+    def __init__(self, path, meta):
+        self.meta = meta
+        self.orders = _map_columns(path, 'orders', ORDER_COLUMNS, meta['order_rows'])
+        self.items = _map_columns(path, 'items', ITEM_COLUMNS, meta['item_rows'])
+        self.categories = np.fromfile(os.path.join(path, 'products.category_id.bin'), dtype=np.int32)
+
+    @property
+    def refreshed_at(self):
+        return datetime.fromtimestamp(self.meta['refreshed_at'])
+
+
+def current_snapshot():
+    """The latest snapshot, refreshed in the background once older than ANALYTICS_REFRESH_INTERVAL.
+
+    Only a missing snapshot makes the caller build it; large catalogs
+    should run `flask analytics refresh` once before the first report.
+    """
+    path = snapshot_path()
+    meta = _read_meta(path)
+    if meta is None:
+        refresh_snapshot()
+        meta = _read_meta(path)
+    elif time.time() - meta['refreshed_at'] > current_app.config['ANALYTICS_REFRESH_INTERVAL']:
+        schedule_refresh()
+    return SalesSnapshot(path, meta)
+
+
+def _in_range(created_at, start, end):
+    keep = np.ones(len(created_at), dtype=bool)
+    if start is not None:
+        keep &= created_at >= _epoch_seconds([start])[0]
+    if end is not None:
+        keep &= created_at < _epoch_seconds([end])[0]
+    return keep
+
+
+def _hour_of_week(created_at):
+    # 1970-01-01 was a Thursday: day 0 is weekday 3 counting from Monday
+    days, seconds = np.divmod(created_at, 86400)
+    return (days + 3) % 7 * 24 + seconds // 3600
+
+
+def _top(values, limit):
+    """Indexes of the ``limit`` largest non-zero values, largest first"""
+    limit = min(limit, int(np.count_nonzero(values)))
+    if limit <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-values, limit - 1)[:limit]
+    return top[np.argsort(-values[top], kind='stable')]
+
+
+def _names(model, ids):
+    if not ids:
+        return {}
+    return dict(db.session.execute(db.select(model.id, model.name).where(model.id.in_(ids))).all())
+
+
+def sales_by(dimension, start=None, end=None, limit=20):
+    """Revenue, units and order lines per product, category or hour of the week.
+
+    Only lines of orders that bring in revenue count (not cancelled or
+    refunded), at their line totals, i.e. before coupons and shipping.
+    ``start``/``end`` bound the order time (end exclusive). Products and
+    categories come back as the ``limit`` best by revenue; hour_of_week
+    gives all 168 hours, Monday 00:00 first.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f'Unknown dimension: {dimension}')
+
+    snapshot = current_snapshot()
+    items, orders = snapshot.items, snapshot.orders
+    order_pos = items['order_pos']
+    keep = REVENUE_STATUS[orders['status'][order_pos]]
+    if start is not None or end is not None or dimension == 'hour_of_week':
+        created_at = orders['created_at'][order_pos]
+        keep &= _in_range(created_at, start, end)
+
+    # bincount wants non-negative keys: shift so that -1 (no category) is 0
+    offset = 0
+    if dimension == 'product':
+        keys = items['product_id'][keep]
+    elif dimension == 'category':
+        product_ids = items['product_id'][keep]
+        categories = np.append(snapshot.categories, -1)  # products created since the last refresh
+        keys = categories[np.minimum(product_ids, len(categories) - 1)] + 1
+        offset = 1
+    else:
+        keys = _hour_of_week(created_at[keep])
+
+    size = 168 if dimension == 'hour_of_week' else None
+    revenue = np.bincount(keys, weights=items['total_cents'][keep], minlength=size or 0)
+    units = np.bincount(keys, weights=items['quantity'][keep], minlength=size or 0)
+    lines = np.bincount(keys, minlength=size or 0)
+
+    if dimension == 'hour_of_week':
+        positions = np.arange(168)
+        names = {}
+    else:
+        positions = _top(revenue, limit)
+        ids = [int(position) - offset for position in positions]
+        names = _names(Product if dimension == 'product' else Category, [id_ for id_ in ids if id_ >= 0])
+
+    rows = []
+    for position in positions:
+        key = int(position) - offset
+        row = {'revenue': round(revenue[position] / 100, 2), 'units': int(units[position]), 'lines': int(lines[position])}
+        if dimension == 'hour_of_week':
+            row.update(weekday=key // 24, hour=key % 24)
+        else:
+            row.update(id=key if key >= 0 else None, name=names.get(key))
+        rows.append(row)
+    return {'by': dimension, 'as_of': snapshot.refreshed_at.isoformat(), 'rows': rows}
+
+
+def _bucket_starts(days, bucket):
+    """The day, week (its Monday) or month (its 1st) each datetime64[D] day falls in"""
+    if bucket == 'day':
+        return days
+    if bucket == 'week':
+        return days - ((days.astype(np.int64) + 3) % 7)
+    return days.astype('datetime64[M]').astype('datetime64[D]')
+
+
+def sales_trend(bucket='day', start=None, end=None):
+    """Orders, revenue and average order value per day, week or month.
+
+    Counted like the daily_sales rollup: every order counts, revenue is
+    order totals of orders not cancelled or refunded, and the average is
+    over those orders only.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f'Unknown bucket: {bucket}')
+
+    snapshot = current_snapshot()
+    orders = snapshot.orders
+    keep = _in_range(orders['created_at'], start, end)
+    days = orders['created_at'][keep] // 86400
+    if not len(days):
+        return {'bucket': bucket, 'as_of': snapshot.refreshed_at.isoformat(), 'rows': []}
+
+    # Totals per day first, then the few distinct days are grouped into
+    # weeks or months: no sort over the orders themselves
+    first = days.min()
+    day_keys = days - first
+    paying = REVENUE_STATUS[orders['status'][keep]]
+    per_day = [
+        np.bincount(day_keys),
+        np.bincount(day_keys, weights=paying),
+        np.bincount(day_keys, weights=np.where(paying, orders['total_cents'][keep], 0)),
+    ]
+    starts = _bucket_starts((first + np.arange(len(per_day[0]))).astype('datetime64[D]'), bucket)
+    buckets, keys = np.unique(starts, return_inverse=True)
+    order_count, paid_count, revenue = (np.bincount(keys, weights=totals, minlength=len(buckets)) for totals in per_day)
+    placed = order_count > 0
+    buckets, order_count, paid_count, revenue = buckets[placed], order_count[placed], paid_count[placed], revenue[placed]
+
+    rows = [{
+        'start': str(day),
+        'order_count': int(order_count[i]),
+        'revenue': round(revenue[i] / 100, 2),
+        'average_order_value': round(revenue[i] / paid_count[i] / 100, 2) if paid_count[i] else 0,
+    } for i, day in enumerate(buckets)]
+    return {'bucket': bucket, 'as_of': snapshot.refreshed_at.isoformat(), 'rows': rows}
+
+
+@analytics_cli.command('refresh')
+@click.option('--rebuild', is_flag=True, help='Start over from an empty snapshot.')
+def refresh_command(rebuild):
+    """Bring the sales analytics snapshot up to date."""
+    added, patched = refresh_snapshot(rebuild=rebuild)
+    print(f'Added {added} order(s), updated {patched}.')
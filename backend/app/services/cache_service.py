@@ -0,0 +1,439 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """Key/value store with per-entry TTL, LRU eviction and tag invalidation"""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None, tags=()):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def invalidate_tags(self, tags):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    """Caching disabled: every lookup is a miss"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None, tags=()):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def invalidate_tags(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache. Only suitable for a single worker process."""
+
+    def __init__(self, max_entries=5000, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None, tags=()):
+        expires_at = time.time() + (ttl or self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SQLiteCache(CacheBackend):
+    """Cache stored in a local SQLite file (WAL mode).
+
+    All gunicorn workers on a host open the same file, so an invalidation
+    issued by one worker is seen by the others. Values must be JSON
+    serializable. Errors are logged and treated as cache misses.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)",
+        """CREATE TABLE IF NOT EXISTS cache_tags (
+            tag TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (tag, key)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS ix_cache_tags_key ON cache_tags (key)",
+    ]
+
+    # Tags per DELETE in invalidate_tags()
+    TAG_CHUNK_SIZE = 500
+
+    # A hit records its access time only when the stored one is older
+    # than this (seconds): the UPDATE takes the file's write lock, and LRU
+    # eviction does not need finer recency than that
+    TOUCH_INTERVAL = 10
+
+    def __init__(self, path, max_entries=5000, default_ttl=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def _conn(self):
+        # One connection per thread, re-opened after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key):
+        try:
+            now = time.time()
+            row = self._conn.execute(
+                'SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self.delete(key)
+                return None
+            if now - row[2] >= self.TOUCH_INTERVAL:
+                self._conn.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error:
+            logger.warning('Cache read failed for %s', key, exc_info=True)
+            return None
+
+    def set(self, key, value, ttl=None, tags=()):
+        now = time.time()
+        try:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM cache_tags WHERE key = ?', (key,))
+                conn.execute(
+                    'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value), now + (ttl or self.default_ttl), now)
+                )
+                conn.executemany(
+                    'INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)',
+                    [(tag, key) for tag in tags]
+                )
+                self._evict(conn, now)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            logger.warning('Cache write failed for %s', key, exc_info=True)
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then least-recently-used ones over the limit"""
+        changes = conn.total_changes
+        conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,))
+        overflow = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)',
+                (overflow,)
+            )
+        if conn.total_changes != changes:
+            conn.execute('DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)')
+
+    def delete(self, key):
+        try:
+            self._conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            self._conn.execute('DELETE FROM cache_tags WHERE key = ?', (key,))
+        except sqlite3.Error:
+            logger.warning('Cache delete failed for %s', key, exc_info=True)
+
+    def invalidate_tags(self, tags):
+        tags = list(tags)
+        if not tags:
+            return
+        try:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            for start in range(0, len(tags), self.TAG_CHUNK_SIZE):
+                chunk = tags[start:start + self.TAG_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                conn.execute(
+                    f'DELETE FROM cache_entries WHERE key IN '
+                    f'(SELECT key FROM cache_tags WHERE tag IN ({placeholders}))',
+                    chunk
+                )
+                conn.execute(
+                    f'DELETE FROM cache_tags WHERE key IN '
+                    f'(SELECT key FROM cache_tags WHERE tag IN ({placeholders}))',
+                    chunk
+                )
+            conn.execute('COMMIT')
+        except sqlite3.Error:
+            logger.warning('Cache invalidation failed for %s', tags, exc_info=True)
+            try:
+                self._conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        self._conn.execute('DELETE FROM cache_entries')
+        self._conn.execute('DELETE FROM cache_tags')
+
+
+class ResponseCache:
+    """Flask extension wrapping the configured CacheBackend.
+
+    CACHE_BACKEND selects 'memory', 'sqlite' (shared between worker
+    processes through CACHE_PATH) or 'null'.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 5000)
+        default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+
+        if backend == 'memory':
+            store = MemoryCache(max_entries=max_entries, default_ttl=default_ttl)
+        elif backend == 'sqlite':
+            path = app.config.get('CACHE_PATH') or os.path.join(app.instance_path, 'cache.db')
+            store = SQLiteCache(path, max_entries=max_entries, default_ttl=default_ttl)
+        elif backend == 'null':
+            store = NullCache()
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+
+        app.extensions['cache'] = store
+
+    @property
+    def backend(self):
+        from flask import current_app
+        return current_app.extensions['cache']
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None, tags=()):
+        self.backend.set(key, value, ttl=ttl, tags=tags)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def invalidate_tags(self, tags):
+        self.backend.invalidate_tags(tags)
+
+    def clear(self):
+        self.backend.clear()
+
+
+# Cache tags for catalog responses
+PRODUCT_LIST_TAG = 'products'
+
+
+def product_tag(product_id):
+    return f'product:{product_id}'
+
+
+def make_cache_key(prefix, args=None):
+    """Build a cache key from a prefix and normalized query parameters.
+
+    Parameters are sorted and stripped so that equivalent URLs share one
+    entry (a blank value is kept: ``?after=`` selects cursor mode). Long
+    keys are hashed.
+    """
+    parts = []
+    if args:
+        for name in sorted(set(args.keys())):
+            values = sorted(set(v.strip() for v in args.getlist(name)))
+            if name == 'q':
+                values = [' '.join(v.lower().split()) for v in values]
+            parts.extend(f'{name}={value}' for value in values)
+    key = f'{prefix}?' + '&'.join(parts)
+    if len(key) > 200:
+        key = f'{prefix}#' + hashlib.sha1(key.encode()).hexdigest()
+    return key
+
+
+def _read_version(connection):
+    from ..extensions import db
+    from ..models.catalog_version import CatalogVersion
+    row = connection.execute(
+        db.select(CatalogVersion.token, CatalogVersion.changed_at, CatalogVersion.stock_generation)
+        .where(CatalogVersion.id == 1)
+    ).first()
+    if row is None:
+        return None
+    return {
+        'id': row.token,
+        'changed_at': row.changed_at.replace(tzinfo=timezone.utc).timestamp(),
+        'stock_generation': row.stock_generation,
+    }
+
+
+def catalog_version():
+    """Current catalog version: {'id': token, 'changed_at': unix time,
+    'stock_generation': n}.
+
+    The token changes on every catalog write; derived caches and HTTP
+    validators compare against it. The stock generation counts stock
+    changes, which leave the token alone (see invalidate_stock). Both
+    are read from the catalog_version row rather than the response
+    cache, which may be per-process, evict them or be disabled.
+    """
+    from ..extensions import db
+    version = _read_version(db.session)
+    if version is None:
+        return bump_catalog_version()
+    return version
+
+
+def bump_catalog_version():
+    """Start a new catalog version; call after the catalog write commits.
+
+    Runs in a transaction of its own, leaving the caller's session alone.
+    """
+    from ..extensions import db
+    from ..models.catalog_version import CatalogVersion
+    table = CatalogVersion.__table__
+    token = uuid.uuid4().hex
+    changed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    update = table.update().where(table.c.id == 1).values(token=token, changed_at=changed_at)
+    with db.engine.begin() as connection:
+        if not connection.execute(update).rowcount:
+            # First bump: create the row
+            dialect = connection.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                insert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table)
+                inserted = connection.execute(
+                    insert.values(id=1, token=token, changed_at=changed_at).on_conflict_do_nothing()
+                ).rowcount
+                if not inserted:
+                    # Another process created it meanwhile
+                    connection.execute(update)
+            else:
+                connection.execute(table.insert().values(id=1, token=token, changed_at=changed_at))
+        return _read_version(connection)
+
+
+def bump_stock_generation():
+    """Count a stock change; call after it commits (own transaction)"""
+    from ..extensions import db
+    from ..models.catalog_version import CatalogVersion
+    table = CatalogVersion.__table__
+    with db.engine.begin() as connection:
+        bumped = connection.execute(
+            table.update().where(table.c.id == 1)
+            .values(stock_generation=table.c.stock_generation + 1)
+        ).rowcount
+    if not bumped:
+        bump_catalog_version()
+
+
+def invalidate_products(*product_ids):
+    """Drop cached listings, plus the detail entries of the given products"""
+    from ..extensions import cache
+    cache.invalidate_tags([PRODUCT_LIST_TAG] + [product_tag(pid) for pid in product_ids])
+    bump_catalog_version()
+
+
+def invalidate_stock(*product_ids):
+    """Drop the cached details of products whose stock changed.
+
+    Listings show stock too, but are left to expire (CACHE_DEFAULT_TTL)
+    and the catalog version is not bumped: checkouts would otherwise
+    empty every catalog cache, and under sale load most of all. The
+    stock generation is bumped instead, so that HTTP validators change
+    and clients do not keep a copy with the old stock on a 304.
+    """
+    from ..extensions import cache
+    if product_ids:
+        cache.invalidate_tags([product_tag(pid) for pid in product_ids])
+        bump_stock_generation()
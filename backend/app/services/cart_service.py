@@ -0,0 +1,497 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from flask import current_app
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam
+from sqlalchemy.orm import joinedload
+from ..extensions import carts, db
+from ..models.cart import Cart
+from ..models.cart_item import CartItem
+from ..models.product import Product
+
+logger = logging.getLogger(__name__)
+
+carts_cli = AppGroup('carts', help='Cart store commands.')
+
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def get_or_create_cart(user_id):
+    """Return the user's cart, creating it on first use"""
+    cart = Cart.query.filter_by(user_id=user_id).first()
+    if not cart:
+        cart = Cart(user_id=user_id)
+        db.session.add(cart)
+        db.session.commit()
+    return cart
+
+
+def _cart_query(*criteria):
+    """The cart with its items and their products joined into one query,
+    so reading it issues no further SQL however many items it holds"""
+    return Cart.query.filter(*criteria).options(
+        joinedload(Cart.items)
+        .joinedload(CartItem.product)
+        .load_only(Product.id, Product.name, Product.images)
+    )
+
+
+def serialize_cart(cart):
+    """Cart payload with per-item subtotals and the total, in one pass over the items"""
+    items = []
+    total = Decimal('0')
+    for item in cart.items if cart else ():
+        subtotal = item.get_subtotal()
+        total += subtotal
+        product = item.product
+        items.append({
+            'id': item.id,
+            'product_id': item.product_id,
+            'name': product.name,
+            'quantity': item.quantity,
+            'unit_price': float(item.unit_price),
+            'subtotal': float(subtotal),
+            'image': product.images[0] if product.images else None
+        })
+    return {'id': cart.id if cart else None, 'items': items, 'total': float(total)}
+
+
+def _state_from_cart(cart):
+    if cart is None:
+        return {'cart_id': None, 'version': 0, 'items': {}}
+    return {
+        'cart_id': cart.id,
+        'version': cart.version,
+        'items': {
+            str(item.product_id): {'quantity': item.quantity, 'unit_price': str(item.unit_price)}
+            for item in cart.items
+        },
+    }
+
+
+def _load_state(store, user_id):
+    """The user's cart from the store, read from the database on a miss"""
+    state = store.get(user_id)
+    if state is None:
+        cart = Cart.query.filter_by(user_id=user_id).options(joinedload(Cart.items)).first()
+        state = store.load(user_id, _state_from_cart(cart))
+    return state
+
+
+def get_cart(user_id):
+    """Cart payload for the cart view. Never writes: a user without a cart gets an empty one."""
+    user_id = int(user_id)
+    store = carts.backend
+    if store is None:
+        return serialize_cart(_cart_query(Cart.user_id == user_id).first())
+
+    state = _load_state(store, user_id)
+    product_ids = [int(product_id) for product_id in state['items']]
+    products = {}
+    if product_ids:
+        products = {
+            product.id: product for product in db.session.query(
+                Product.id, Product.name, Product.images
+            ).filter(Product.id.in_(product_ids))
+        }
+
+    # Items are keyed by product in the store, so the product id doubles as the item id
+    items = []
+    total = Decimal('0')
+    for product_id in product_ids:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        item = state['items'][str(product_id)]
+        unit_price = Decimal(item['unit_price'])
+        subtotal = unit_price * item['quantity']
+        total += subtotal
+        items.append({
+            'id': product_id,
+            'product_id': product_id,
+            'name': product.name,
+            'quantity': item['quantity'],
+            'unit_price': float(unit_price),
+            'subtotal': float(subtotal),
+            'image': product.images[0] if product.images else None
+        })
+    return {'id': state['cart_id'], 'items': items, 'total': float(total)}
+
+
+def get_guest_cart(cart_id):
+    """Cart payload for a guest cart (empty once it has been merged or swept)"""
+    cart = None
+    if cart_id is not None:
+        cart = _cart_query(Cart.id == cart_id, Cart.user_id.is_(None)).first()
+    return serialize_cart(cart)
+
+
+class UnknownProducts(Exception):
+    """Cart operations referenced products that do not exist"""
+
+    def __init__(self, product_ids):
+        super().__init__(f"Unknown products: {', '.join(map(str, product_ids))}")
+        self.product_ids = product_ids
+
+
+def _apply_operations(items, operations, prices):
+    """Apply add/update/remove operations to a {'<product id>': item} dict, in order"""
+    for operation in operations:
+        key = str(operation['product_id'])
+        quantity = operation.get('quantity', 1)
+        if operation['op'] == 'remove' or (operation['op'] == 'update' and quantity == 0):
+            items.pop(key, None)
+            continue
+        item = items.setdefault(key, {
+            'quantity': 0, 'unit_price': str(prices[operation['product_id']])
+        })
+        item['quantity'] = item['quantity'] + quantity if operation['op'] == 'add' else quantity
+    return items
+
+
+def _write_cart(cart, operations, prices):
+    """Apply cart operations to a cart's rows and commit"""
+    existing = {item.product_id: item for item in cart.items}
+    items = _apply_operations(_state_from_cart(cart)['items'], operations, prices)
+
+    for product_id, item in existing.items():
+        if str(product_id) not in items:
+            db.session.delete(item)
+        elif item.quantity != items[str(product_id)]['quantity']:
+            item.quantity = items[str(product_id)]['quantity']
+    for key, item in items.items():
+        if int(key) not in existing:
+            cart.items.append(CartItem(
+                product_id=int(key),
+                quantity=item['quantity'],
+                unit_price=Decimal(item['unit_price'])
+            ))
+    db.session.commit()
+
+
+def update_cart(user_id, operations, prices, guest_cart_id=None):
+    """Apply cart operations to the user's cart as one change.
+
+    ``prices`` maps the product ids being added to their current price,
+    snapshotted as the unit price of new cart lines. Without a user the
+    operations go to the guest cart ``guest_cart_id`` (a new one if it
+    is None or gone), whose id is returned; guest carts are always
+    written to the database, never to the cart store.
+    """
+    if user_id is None:
+        cart = None
+        if guest_cart_id is not None:
+            cart = Cart.query.filter_by(id=guest_cart_id, user_id=None).options(joinedload(Cart.items)).first()
+        if cart is None:
+            cart = Cart(user_id=None, items=[])
+            db.session.add(cart)
+        cart.updated_at = db.func.now()  # guest carts are swept by age (database clock)
+        _write_cart(cart, operations, prices)
+        return cart.id
+
+    user_id = int(user_id)
+    store = carts.backend
+
+    if store is None:
+        cart = Cart.query.filter_by(user_id=user_id).options(joinedload(Cart.items)).first()
+        if cart is None:
+            cart = Cart(user_id=user_id, items=[])
+            db.session.add(cart)
+        _write_cart(cart, operations, prices)
+        return
+
+    state = _load_state(store, user_id)
+    if state['cart_id'] is None:
+        # The carts row is created once, so that flushes only ever update it
+        cart_id = get_or_create_cart(user_id).id
+        store.update(user_id, lambda state: dict(state, cart_id=cart_id))
+
+    store.update(user_id, lambda state: dict(
+        state, items=_apply_operations(state['items'], operations, prices)
+    ))
+    schedule_flush()
+
+
+def add_item(user_id, product, quantity=1, guest_cart_id=None):
+    """Add ``quantity`` of ``product`` to the user's (or guest's) cart at its current price"""
+    return update_cart(
+        user_id,
+        [{'op': 'add', 'product_id': product.id, 'quantity': quantity}],
+        {product.id: product.discount_price or product.price},
+        guest_cart_id
+    )
+
+
+def apply_batch(user_id, operations, guest_cart_id=None):
+    """Apply a validated list of cart operations in one transaction.
+
+    Every referenced product is loaded with a single IN query; if any
+    is missing, nothing is applied.
+    """
+    product_ids = {operation['product_id'] for operation in operations}
+    products = db.session.query(Product.id, Product.price, Product.discount_price).filter(
+        Product.id.in_(product_ids)
+    ).all()
+    prices = {product.id: product.discount_price or product.price for product in products}
+
+    missing = sorted(
+        {operation['product_id'] for operation in operations if operation['op'] != 'remove'} - set(prices)
+    )
+    if missing:
+        raise UnknownProducts(missing)
+    return update_cart(user_id, operations, prices, guest_cart_id)
+
+
+def merge_guest_cart(user_id, guest_cart_id):
+    """Move a guest cart into the user's cart with set-based statements.
+
+    Quantities are summed per product: the user's lines for products the
+    guest also has are topped up by one correlated UPDATE, the remaining
+    guest lines are copied by one INSERT ... SELECT, and the guest cart
+    is deleted, all in one transaction whatever the number of lines.
+    Returns False if ``guest_cart_id`` is not (or no longer) a guest cart.
+    """
+    user_id = int(user_id)
+    flushed_version = flush_cart(user_id)  # merge into what the user last saw
+    cart_id = get_or_create_cart(user_id).id
+
+    carts_table = Cart.__table__
+    items = CartItem.__table__
+    guest = items.alias('guest')
+    mine = items.alias('mine')
+    try:
+        # Also locks the guest cart, so that it is merged at most once
+        claimed = db.session.execute(
+            carts_table.update()
+            .where(carts_table.c.id == guest_cart_id, carts_table.c.user_id.is_(None))
+            .values(updated_at=db.func.now())
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return False
+
+        guest_quantity = (
+            db.select(db.func.sum(guest.c.quantity))
+            .where(guest.c.cart_id == guest_cart_id, guest.c.product_id == items.c.product_id)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            items.update()
+            .where(
+                items.c.cart_id == cart_id,
+                items.c.product_id.in_(db.select(guest.c.product_id).where(guest.c.cart_id == guest_cart_id))
+            )
+            .values(quantity=items.c.quantity + guest_quantity)
+        )
+        db.session.execute(items.insert().from_select(
+            ['cart_id', 'product_id', 'quantity', 'unit_price'],
+            db.select(
+                db.literal(cart_id), guest.c.product_id,
+                db.func.sum(guest.c.quantity), db.func.max(guest.c.unit_price)
+            )
+            .where(
+                guest.c.cart_id == guest_cart_id,
+                ~db.exists().where(mine.c.cart_id == cart_id, mine.c.product_id == guest.c.product_id)
+            )
+            .group_by(guest.c.product_id)
+        ))
+        db.session.execute(items.delete().where(items.c.cart_id == guest_cart_id))
+        db.session.execute(carts_table.delete().where(carts_table.c.id == guest_cart_id))
+        db.session.execute(
+            carts_table.update().where(carts_table.c.id == cart_id)
+            .values(version=carts_table.c.version + 1, updated_at=db.func.now())
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    store = carts.backend
+    if store is not None:
+        cart = Cart.query.filter_by(id=cart_id).options(joinedload(Cart.items)).first()
+        store.reset(user_id, _state_from_cart(cart), flushed_version)
+    return True
+
+
+def sweep_guest_carts(max_age=None, batch_size=None):
+    """Delete guest carts not written to for ``max_age`` seconds.
+
+    Works through them ``batch_size`` carts per transaction (ids first,
+    then one DELETE for their items and one for the carts), so a large
+    backlog never holds long locks. Returns the number of carts deleted.
+    """
+    config = current_app.config
+    # updated_at is written by the database clock (UTC on SQLite), so the
+    # cutoff must come from it too, not from the local time
+    db_now = db.session.execute(db.select(db.func.now())).scalar()
+    cutoff = db_now - timedelta(seconds=max_age or config['GUEST_CART_TTL'])
+    batch_size = batch_size or config['GUEST_CART_SWEEP_BATCH_SIZE']
+
+    carts_table = Cart.__table__
+    items = CartItem.__table__
+    deleted = 0
+    while True:
+        cart_ids = db.session.execute(
+            db.select(carts_table.c.id)
+            .where(carts_table.c.user_id.is_(None), carts_table.c.updated_at < cutoff)
+            .limit(batch_size)
+        ).scalars().all()
+        if not cart_ids:
+            break
+        try:
+            db.session.execute(items.delete().where(items.c.cart_id.in_(cart_ids)))
+            db.session.execute(carts_table.delete().where(carts_table.c.id.in_(cart_ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted += len(cart_ids)
+    return deleted
+
+
+def _persist(entries):
+    """Write cart states to carts/cart_items in one transaction.
+
+    A cart is only written if its stored version is older, so a slow
+    flush can never overwrite a newer state (or a cart emptied by checkout).
+    """
+    entries = [(user_id, state) for user_id, state in entries if state['cart_id'] is not None]
+    if not entries:
+        return
+
+    carts_table = Cart.__table__
+    db.session.execute(
+        carts_table.update()
+        .where(carts_table.c.id == bindparam('b_cart_id'), carts_table.c.version < bindparam('b_version'))
+        .values(version=bindparam('b_version'), updated_at=db.func.now()),
+        [{'b_cart_id': state['cart_id'], 'b_version': state['version']} for _, state in entries]
+    )
+    stored = dict(db.session.execute(
+        db.select(carts_table.c.id, carts_table.c.version)
+        .where(carts_table.c.id.in_([state['cart_id'] for _, state in entries]))
+    ).all())
+    current = [state for _, state in entries if stored.get(state['cart_id']) == state['version']]
+
+    if current:
+        db.session.execute(
+            CartItem.__table__.delete().where(CartItem.cart_id.in_([state['cart_id'] for state in current]))
+        )
+        rows = [
+            {'cart_id': state['cart_id'], 'product_id': int(product_id),
+             'quantity': item['quantity'], 'unit_price': Decimal(item['unit_price'])}
+            for state in current for product_id, item in state['items'].items()
+        ]
+        if rows:
+            db.session.execute(db.insert(CartItem), rows)
+    db.session.commit()
+
+
+def flush_carts(batch_size=None):
+    """Persist every dirty cart in the store, in batches. Returns the number written."""
+    store = carts.backend
+    if store is None:
+        return 0
+    config = current_app.config
+    batch_size = batch_size or config['CART_FLUSH_BATCH_SIZE']
+
+    flushed = 0
+    while True:
+        entries = store.claim_dirty(batch_size, config['CART_FLUSH_LEASE'])
+        if not entries:
+            break
+        try:
+            _persist(entries)
+        except Exception:
+            db.session.rollback()
+            raise
+        for user_id, state in entries:
+            store.mark_clean(user_id, state['version'])
+        flushed += len(entries)
+
+    store.prune(config['CART_STORE_IDLE_TTL'])
+    return flushed
+
+
+def flush_cart(user_id):
+    """Persist one user's cart now (checkout and merges read the cart from the database).
+
+    Claims the cart with the same lease as flush_carts, waiting while a
+    background flush holds it, and writes nothing if it is clean.
+    Returns the store version the database now matches (None without a
+    cart store), for reset_cart.
+    """
+    store = carts.backend
+    if store is None:
+        return None
+    user_id = int(user_id)
+    while True:
+        status, state = store.claim(user_id, current_app.config['CART_FLUSH_LEASE'])
+        if status != 'busy':
+            break
+        time.sleep(0.05)
+
+    if status == 'claimed':
+        try:
+            _persist([(user_id, state)])
+        except Exception:
+            db.session.rollback()
+            store.mark_clean(user_id, None)  # gives up the lease, leaves the cart dirty
+            raise
+        store.mark_clean(user_id, state['version'])
+    elif state is None:
+        state = _load_state(store, user_id)
+    return state['version']
+
+
+def reset_cart(user_id, cart_id, version, flushed_version):
+    """Point the store at the emptied cart once checkout has committed.
+
+    Left alone if the cart changed in the store after flush_cart wrote
+    ``flushed_version``: it stays dirty, and that change is flushed
+    later instead of being lost.
+    """
+    store = carts.backend
+    if store is not None:
+        store.reset(int(user_id), {'cart_id': cart_id, 'version': version, 'items': {}}, flushed_version)
+
+
+def _flush_in_background(app):
+    global _last_flush
+    with app.app_context():
+        try:
+            flush_carts()
+        except Exception:
+            logger.exception('Cart flush failed')
+        finally:
+            _last_flush = time.time()
+            db.session.remove()
+            _flush_lock.release()
+
+
+def schedule_flush():
+    """Start a background flush once CART_FLUSH_INTERVAL has passed since the last one"""
+    if time.time() - _last_flush < current_app.config['CART_FLUSH_INTERVAL']:
+        return
+    if not _flush_lock.acquire(blocking=False):
+        return  # a flush is already running in this process
+    app = current_app._get_current_object()
+    threading.Thread(target=_flush_in_background, args=(app,), daemon=True).start()
+
+
+@carts_cli.command('flush')
+def flush_command():
+    """Write all pending cart changes to the database."""
+    print(f'Flushed {flush_carts()} cart(s).')
+
+
+@carts_cli.command('sweep')
+@click.option('--max-age', type=int, default=None, help='Seconds since the last write (default GUEST_CART_TTL).')
+@click.option('--batch-size', type=int, default=None, help='Carts deleted per transaction.')
+def sweep_command(max_age, batch_size):
+    """Delete abandoned guest carts."""
+    print(f'Deleted {sweep_guest_carts(max_age, batch_size)} guest cart(s).')
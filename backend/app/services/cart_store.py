@@ -0,0 +1,331 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CartStore:
+    """Key/value store for active carts, keyed by user id.
+
+    A cart state is a JSON-serializable dict::
+
+        {'cart_id': 12, 'version': 7,
+         'items': {'<product id>': {'quantity': 2, 'unit_price': '19.99'}}}
+
+    Every update bumps ``version`` and marks the cart dirty until a
+    flush has written that version to the carts/cart_items tables.
+    Flushers claim dirty carts with a lease, so that carts are not
+    written twice at once by concurrent flushes.
+    """
+
+    def get(self, user_id):
+        raise NotImplementedError
+
+    def load(self, user_id, state):
+        """Store ``state`` (read from the database) unless the cart is already present"""
+        raise NotImplementedError
+
+    def update(self, user_id, change):
+        """Apply ``change(state) -> state`` atomically to a present cart and mark it dirty"""
+        raise NotImplementedError
+
+    def reset(self, user_id, state, version):
+        """Replace a cart with a clean state (after checkout or a merge
+        rewrote it in the database) unless it changed after ``version``.
+        Returns whether it was replaced; a cart not in the store is added."""
+        raise NotImplementedError
+
+    def claim_dirty(self, limit, lease):
+        """Claim up to ``limit`` dirty carts for ``lease`` seconds: [(user_id, state)]"""
+        raise NotImplementedError
+
+    def claim(self, user_id, lease):
+        """Claim one user's cart for ``lease`` seconds if it is dirty: (status, state).
+
+        ``status`` is 'claimed', 'clean' (nothing to write; ``state`` is
+        None if the cart is not in the store) or 'busy' (another flush
+        holds its lease).
+        """
+        raise NotImplementedError
+
+    def mark_clean(self, user_id, version):
+        """Clear the dirty flag unless the cart changed after ``version`` was flushed"""
+        raise NotImplementedError
+
+    def prune(self, idle_seconds):
+        """Drop clean carts not touched for ``idle_seconds`` (they reload from the database)"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCartStore(CartStore):
+    """In-process cart store. Only suitable for a single worker process;
+    dirty carts are lost if the process exits before they are flushed."""
+
+    def __init__(self):
+        self._carts = {}  # user_id -> {'state', 'dirty', 'claimed_until', 'touched_at'}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._carts.get(user_id)
+            if entry is None:
+                return None
+            entry['touched_at'] = time.time()
+            return copy.deepcopy(entry['state'])
+
+    def load(self, user_id, state):
+        with self._lock:
+            entry = self._carts.setdefault(user_id, {
+                'state': copy.deepcopy(state), 'dirty': False, 'claimed_until': 0,
+            })
+            entry['touched_at'] = time.time()
+            return copy.deepcopy(entry['state'])
+
+    def update(self, user_id, change):
+        with self._lock:
+            entry = self._carts[user_id]
+            state = change(copy.deepcopy(entry['state']))
+            state['version'] = entry['state']['version'] + 1
+            entry.update(state=state, dirty=True, touched_at=time.time())
+            return copy.deepcopy(state)
+
+    def reset(self, user_id, state, version):
+        with self._lock:
+            entry = self._carts.get(user_id)
+            if entry is not None and entry['state']['version'] != version:
+                return False
+            self._carts[user_id] = {
+                'state': copy.deepcopy(state), 'dirty': False, 'claimed_until': 0,
+                'touched_at': time.time(),
+            }
+            return True
+
+    def claim_dirty(self, limit, lease):
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for user_id, entry in self._carts.items():
+                if len(claimed) >= limit:
+                    break
+                if entry['dirty'] and entry['claimed_until'] <= now:
+                    entry['claimed_until'] = now + lease
+                    claimed.append((user_id, copy.deepcopy(entry['state'])))
+        return claimed
+
+    def claim(self, user_id, lease):
+        now = time.time()
+        with self._lock:
+            entry = self._carts.get(user_id)
+            if entry is None:
+                return 'clean', None
+            if not entry['dirty']:
+                return 'clean', copy.deepcopy(entry['state'])
+            if entry['claimed_until'] > now:
+                return 'busy', None
+            entry['claimed_until'] = now + lease
+            return 'claimed', copy.deepcopy(entry['state'])
+
+    def mark_clean(self, user_id, version):
+        with self._lock:
+            entry = self._carts.get(user_id)
+            if entry is None:
+                return
+            entry['claimed_until'] = 0
+            if entry['state']['version'] == version:
+                entry['dirty'] = False
+
+    def prune(self, idle_seconds):
+        cutoff = time.time() - idle_seconds
+        with self._lock:
+            for user_id in [
+                user_id for user_id, entry in self._carts.items()
+                if not entry['dirty'] and entry['touched_at'] < cutoff
+            ]:
+                del self._carts[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._carts.clear()
+
+
+class SQLiteCartStore(CartStore):
+    """Cart store in a local SQLite file (WAL mode), shared by all workers
+    on a host. Dirty carts survive a restart and are flushed afterwards."""
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS cart_states (
+            user_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            dirty INTEGER NOT NULL DEFAULT 0,
+            claimed_until REAL NOT NULL DEFAULT 0,
+            touched_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS ix_cart_states_dirty ON cart_states (claimed_until) WHERE dirty = 1",
+        "CREATE INDEX IF NOT EXISTS ix_cart_states_touched_at ON cart_states (touched_at) WHERE dirty = 0",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def _conn(self):
+        # One connection per thread, re-opened after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _write(self, work):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(conn)
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, user_id):
+        row = self._conn.execute('SELECT state FROM cart_states WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE cart_states SET touched_at = ? WHERE user_id = ?', (time.time(), user_id))
+        return json.loads(row[0])
+
+    def load(self, user_id, state):
+        def work(conn):
+            conn.execute(
+                'INSERT OR IGNORE INTO cart_states (user_id, state, version, touched_at) VALUES (?, ?, ?, ?)',
+                (user_id, json.dumps(state), state['version'], time.time())
+            )
+            return json.loads(conn.execute(
+                'SELECT state FROM cart_states WHERE user_id = ?', (user_id,)
+            ).fetchone()[0])
+        return self._write(work)
+
+    def update(self, user_id, change):
+        def work(conn):
+            row = conn.execute('SELECT state FROM cart_states WHERE user_id = ?', (user_id,)).fetchone()
+            if row is None:
+                raise KeyError(user_id)
+            current = json.loads(row[0])
+            state = change(current)
+            state['version'] = current['version'] + 1
+            conn.execute(
+                'UPDATE cart_states SET state = ?, version = ?, dirty = 1, touched_at = ? WHERE user_id = ?',
+                (json.dumps(state), state['version'], time.time(), user_id)
+            )
+            return state
+        return self._write(work)
+
+    def reset(self, user_id, state, version):
+        return self._conn.execute(
+            'INSERT INTO cart_states (user_id, state, version, dirty, claimed_until, touched_at) '
+            'VALUES (?, ?, ?, 0, 0, ?) '
+            'ON CONFLICT (user_id) DO UPDATE SET state = excluded.state, version = excluded.version, '
+            'dirty = 0, claimed_until = 0, touched_at = excluded.touched_at '
+            'WHERE cart_states.version = ?',
+            (user_id, json.dumps(state), state['version'], time.time(), version)
+        ).rowcount > 0
+
+    def claim_dirty(self, limit, lease):
+        def work(conn):
+            now = time.time()
+            rows = conn.execute(
+                'SELECT user_id, state FROM cart_states WHERE dirty = 1 AND claimed_until <= ? LIMIT ?',
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE cart_states SET claimed_until = ? WHERE user_id = ?',
+                [(now + lease, user_id) for user_id, _ in rows]
+            )
+            return [(user_id, json.loads(state)) for user_id, state in rows]
+        return self._write(work)
+
+    def claim(self, user_id, lease):
+        def work(conn):
+            now = time.time()
+            row = conn.execute(
+                'SELECT state, dirty, claimed_until FROM cart_states WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            if row is None:
+                return 'clean', None
+            state, dirty, claimed_until = row
+            if not dirty:
+                return 'clean', json.loads(state)
+            if claimed_until > now:
+                return 'busy', None
+            conn.execute('UPDATE cart_states SET claimed_until = ? WHERE user_id = ?', (now + lease, user_id))
+            return 'claimed', json.loads(state)
+        return self._write(work)
+
+    def mark_clean(self, user_id, version):
+        self._conn.execute(
+            'UPDATE cart_states SET claimed_until = 0, dirty = CASE WHEN version = ? THEN 0 ELSE dirty END '
+            'WHERE user_id = ?',
+            (version, user_id)
+        )
+
+    def prune(self, idle_seconds):
+        self._conn.execute(
+            'DELETE FROM cart_states WHERE dirty = 0 AND touched_at < ?', (time.time() - idle_seconds,)
+        )
+
+    def clear(self):
+        self._conn.execute('DELETE FROM cart_states')
+
+
+class CartStorage:
+    """Flask extension holding the configured CartStore.
+
+    CART_STORE selects 'database' (no store: every change is written to
+    carts/cart_items), 'memory' or 'sqlite' (shared by the worker
+    processes on a host through CART_STORE_PATH).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CART_STORE', 'database')
+
+        if backend == 'memory':
+            store = MemoryCartStore()
+        elif backend == 'sqlite':
+            path = app.config.get('CART_STORE_PATH') or os.path.join(app.instance_path, 'carts.db')
+            store = SQLiteCartStore(path)
+        elif backend == 'database':
+            store = None
+        else:
+            raise ValueError(f'Unknown CART_STORE: {backend}')
+
+        app.extensions['cart_store'] = store
+
+    @property
+    def backend(self):
+        """The active CartStore, or None when carts live in the database only"""
+        from flask import current_app
+        return current_app.extensions['cart_store']
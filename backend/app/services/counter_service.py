@@ -0,0 +1,146 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql, sqlite
+from ..extensions import db
+from ..models.table_counter import COUNTED_TABLES, TableCounter, apply_counter_deltas
+
+logger = logging.getLogger(__name__)
+
+counters_cli = AppGroup('counters', help='Table counter commands.')
+
+_reconcile_lock = threading.Lock()
+
+
+def _create_counter(name, count):
+    table = TableCounter.__table__
+    now = datetime.now()
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # Another process creating it first is fine: its count is as good
+        insert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(table)
+        db.session.execute(insert.values(name=name, count=count, reconciled_at=now).on_conflict_do_nothing())
+    else:
+        db.session.execute(table.insert().values(name=name, count=count, reconciled_at=now))
+
+
+def reconcile_counter(name):
+    """Correct a counter against the exact COUNT(*) of its table; returns the count.
+
+    The count and the counter are read by one statement, so they come
+    from the same snapshot and their difference is exactly the drift
+    (writers change rows and counter in one transaction). The drift is
+    then added as a delta rather than the count written over the
+    counter, so nothing is locked while counting and deltas committed
+    meanwhile are kept.
+    """
+    table = db.metadata.tables[name]
+    try:
+        exact, counted = db.session.execute(db.select(
+            db.select(db.func.count()).select_from(table).scalar_subquery(),
+            db.select(TableCounter.count).where(TableCounter.name == name).scalar_subquery()
+        )).one()
+        if counted is None:
+            _create_counter(name, exact)
+        else:
+            counters = TableCounter.__table__
+            db.session.execute(
+                counters.update().where(counters.c.name == name)
+                .values(count=counters.c['count'] + (exact - counted), reconciled_at=datetime.now())
+            )
+            if exact != counted:
+                logger.info('Counter %s was off by %d', name, counted - exact)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return exact
+
+
+def reconcile_counters(names=COUNTED_TABLES):
+    """Recount every counted table, one short transaction each"""
+    return {name: reconcile_counter(name) for name in names}
+
+
+def adjust_counter(name, delta):
+    """Count rows written with bulk Core statements (part of the caller's transaction)"""
+    apply_counter_deltas(db.session.connection(), {name: delta})
+
+
+def _estimated_counts(names):
+    """The planner's row estimates (pg_class.reltuples) for PostgreSQL tables.
+
+    Tables never analyzed or vacuumed have no estimate and are left out.
+    """
+    rows = db.session.execute(
+        db.text('SELECT relname, reltuples::bigint FROM pg_class WHERE oid = ANY(CAST(:oids AS regclass[]))'),
+        {'oids': list(names)}
+    ).all()
+    return {name: estimate for name, estimate in rows if estimate > 0}
+
+
+def table_counts(*names):
+    """Row counts of counted tables as {name: count}, in one query.
+
+    Read from table_counters; a counter that does not exist yet is
+    created from an exact COUNT(*), and counters older than
+    COUNTER_RECONCILE_INTERVAL are recounted in the background. With
+    TABLE_COUNT_MODE = 'estimate' PostgreSQL answers from the planner's
+    statistics instead (approximate, but never touches the tables).
+    """
+    config = current_app.config
+    counts = {}
+    if config['TABLE_COUNT_MODE'] == 'estimate' and db.session.get_bind().dialect.name == 'postgresql':
+        counts = _estimated_counts(names)
+    missing = [name for name in names if name not in counts]
+    if not missing:
+        return counts
+
+    rows = db.session.execute(
+        db.select(TableCounter.name, TableCounter.count, TableCounter.reconciled_at)
+        .where(TableCounter.name.in_(missing))
+    ).all()
+    stale_before = datetime.now() - timedelta(seconds=config['COUNTER_RECONCILE_INTERVAL'])
+    stale = []
+    for name, count, reconciled_at in rows:
+        counts[name] = count
+        if reconciled_at is None or reconciled_at < stale_before:
+            stale.append(name)
+    for name in missing:
+        if name not in counts:
+            counts[name] = reconcile_counter(name)
+    if stale:
+        schedule_reconcile(stale)
+    return counts
+
+
+def table_count(name):
+    return table_counts(name)[name]
+
+
+def _reconcile_in_background(app, names):
+    with app.app_context():
+        try:
+            reconcile_counters(names)
+        except Exception:
+            logger.exception('Counter reconciliation failed')
+        finally:
+            db.session.remove()
+            _reconcile_lock.release()
+
+
+def schedule_reconcile(names):
+    """Recount ``names`` in a background thread unless this process is already recounting"""
+    if not _reconcile_lock.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_reconcile_in_background, args=(app, list(names)), daemon=True).start()
+
+
+@counters_cli.command('reconcile')
+def reconcile_command():
+    """Recount every counted table exactly."""
+    for name, count in reconcile_counters().items():
+        print(f'{name}: {count}')
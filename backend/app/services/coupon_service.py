@@ -0,0 +1,98 @@
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from flask import current_app
+from ..extensions import cache, db
+from ..models.coupon import Coupon
+
+COUPON_KEY = 'coupon:{}'
+
+CENT = Decimal('0.01')
+
+
+class CouponError(Exception):
+    """The coupon cannot be applied to this order"""
+
+
+def _coupon_key(code):
+    return COUPON_KEY.format(code)
+
+
+def get_coupon(code):
+    """Coupon terms by code, cached for COUPON_CACHE_TTL seconds (None if unknown).
+
+    The cached copy carries everything needed to validate and price
+    the coupon except ``uses_count``, which is only ever checked by the
+    conditional increment in redeem_coupon(). Unknown codes are cached
+    too, so a mistyped or guessed code does not reach the database on
+    every checkout either.
+    """
+    key = _coupon_key(code)
+    cached = cache.get(key)
+    if cached is None:
+        coupon = Coupon.query.filter_by(code=code).first()
+        cached = {'exists': False}
+        if coupon is not None:
+            cached = {
+                'exists': True,
+                'exhausted': coupon.max_uses is not None and (coupon.uses_count or 0) >= coupon.max_uses,
+                'id': coupon.id,
+                'discount_type': coupon.discount_type,
+                'value': str(coupon.value),
+                'valid_from': coupon.valid_from.isoformat(),
+                'valid_to': coupon.valid_to.isoformat(),
+                'active': bool(coupon.active),
+            }
+        cache.set(key, cached, ttl=current_app.config['COUPON_CACHE_TTL'])
+    return cached if cached['exists'] else None
+
+
+def validate_coupon(code, now=None):
+    """The cached terms of a usable coupon, or CouponError"""
+    coupon = get_coupon(code)
+    if coupon is None:
+        raise CouponError('Invalid coupon code')
+    now = (now or datetime.now()).isoformat()
+    if not coupon['active'] or not coupon['valid_from'] <= now <= coupon['valid_to']:
+        raise CouponError('Coupon is not valid')
+    if coupon['exhausted']:
+        raise CouponError('Coupon has reached its usage limit')
+    return coupon
+
+
+def coupon_discount(coupon, amount):
+    """Discount a coupon gives on ``amount``, never more than the amount itself"""
+    value = Decimal(coupon['value'])
+    if coupon['discount_type'] == 'percent':
+        discount = (amount * value / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    else:
+        discount = value
+    return min(discount, amount)
+
+
+def redeem_coupon(code, coupon):
+    """Count one use of the coupon with a conditional increment.
+
+    ``uses_count < max_uses`` is checked by the UPDATE itself, so
+    concurrent checkouts can never redeem the coupon more than
+    ``max_uses`` times. Part of the caller's transaction: a rolled-back
+    checkout gives its use back. Once the limit is reached the cached
+    terms are marked exhausted, so later checkouts fail without a write.
+    """
+    now = datetime.now()
+    uses_count = db.func.coalesce(Coupon.uses_count, 0)
+    result = db.session.execute(
+        db.update(Coupon)
+        .where(
+            Coupon.id == coupon['id'],
+            Coupon.active == True,
+            Coupon.valid_from <= now,
+            Coupon.valid_to >= now,
+            db.or_(Coupon.max_uses.is_(None), uses_count < Coupon.max_uses),
+        )
+        .values(uses_count=uses_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        cache.set(_coupon_key(code), dict(coupon, exists=True, exhausted=True),
+                  ttl=current_app.config['COUPON_CACHE_TTL'])
+        raise CouponError('Coupon is no longer available')
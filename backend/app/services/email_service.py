@@ -1,25 +1,20 @@
 from flask_mail import Message
 from ..extensions import mail
-from threading import Thread
+from .job_service import enqueue
 
-def send_async_email(app, msg):
-    """Send email asynchronously"""
-    with app.app_context():
-        mail.send(msg)
-
-def send_email(subject, recipients, body, html=None):
-    """Send email with optional HTML content"""
-    from flask import current_app
-    
+def deliver_email(subject, recipients, body, html=None):
+    """Send one email (run by a job worker; a failure is retried)"""
     msg = Message(
         subject=subject,
         recipients=recipients,
         body=body,
         html=html
     )
-    
-    # Send email asynchronously
-    Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
+    mail.send(msg)
+
+def send_email(subject, recipients, body, html=None):
+    """Queue an email with optional HTML content (sent once the caller commits)"""
+    enqueue(deliver_email, subject, recipients, body, html)
 
 def send_welcome_email(user):
     """Send welcome email to new user"""
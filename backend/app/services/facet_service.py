@@ -0,0 +1,48 @@
+from flask import current_app
+from sqlalchemy import func
+from ..models.product import Product
+
+
+def compute_facets(query):
+    """Category, price-bucket and stock counts for the products matched by ``query``.
+
+    One aggregate query grouped by category only: each row carries the
+    category's count, its cumulative counts below every price bound and
+    its in-stock count, so the filter set is evaluated once and the
+    (index-ordered) scan needs no sort. Price and stock facets are the
+    sums over categories.
+    """
+    bounds = current_app.config['FACET_PRICE_BUCKETS']
+
+    rows = (
+        query.order_by(None)
+        .with_entities(
+            Product.category_id,
+            func.count(),
+            func.count().filter(Product.stock > 0),
+            *[func.count().filter(Product.price < bound) for bound in bounds]
+        )
+        .group_by(Product.category_id)
+        .all()
+    )
+
+    categories = []
+    total = in_stock = 0
+    below = [0] * len(bounds)
+    for category_id, count, available, *cumulative in rows:
+        categories.append({'id': category_id, 'count': count})
+        total += count
+        in_stock += available
+        below = [running + n for running, n in zip(below, cumulative)]
+
+    # Cumulative counts below each bound -> counts per [lower, upper) bucket
+    edges = [None] + list(bounds) + [None]
+    cumulative = [0] + below + [total]
+    return {
+        'categories': sorted(categories, key=lambda facet: -facet['count']),
+        'price': [
+            {'min': edges[i], 'max': edges[i + 1], 'count': cumulative[i + 1] - cumulative[i]}
+            for i in range(len(bounds) + 1)
+        ],
+        'availability': {'in_stock': in_stock, 'out_of_stock': total - in_stock}
+    }
@@ -0,0 +1,93 @@
+import hashlib
+from datetime import datetime, timedelta
+from flask import current_app, request
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from ..models.idempotency_key import IdempotencyKey
+
+idempotency_cli = AppGroup('idempotency', help='Idempotency key commands.')
+
+
+def key_hash(scope, key):
+    return hashlib.sha256(f'{scope}\0{key}'.encode()).hexdigest()
+
+
+def request_fingerprint():
+    """sha256 of the current request's method, path, query string and body"""
+    digest = hashlib.sha256(f'{request.method}\0{request.full_path}\0'.encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def claim(hashed_key, fingerprint):
+    """Record the start of a request under ``hashed_key``.
+
+    Returns (record, owned). ``owned`` is True when this request must run
+    the handler: the key is new, or its previous entry expired, or its
+    first request never finished within IDEMPOTENCY_LOCK_TIMEOUT. The
+    unique key_hash makes the claim atomic across workers. A key released
+    or purged between the failed INSERT and the re-read is claimed again,
+    so the record is never None. Commits.
+    """
+    while True:
+        now = datetime.now()
+        ttl = timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+        stale = now - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+
+        record = IdempotencyKey(key_hash=hashed_key, fingerprint=fingerprint, locked_at=now, expires_at=now + ttl)
+        db.session.add(record)
+        try:
+            db.session.commit()
+            return record, True
+        except IntegrityError:
+            db.session.rollback()
+
+        taken = db.session.execute(
+            db.update(IdempotencyKey)
+            .where(
+                IdempotencyKey.key_hash == hashed_key,
+                db.or_(
+                    IdempotencyKey.expires_at <= now,
+                    db.and_(IdempotencyKey.response_status.is_(None), IdempotencyKey.locked_at <= stale),
+                )
+            )
+            .values(fingerprint=fingerprint, response_status=None, response_body=None,
+                    locked_at=now, expires_at=now + ttl)
+        ).rowcount
+        db.session.commit()
+        record = IdempotencyKey.query.filter_by(key_hash=hashed_key).first()
+        if record is not None:
+            return record, bool(taken)
+        # Released or purged since the INSERT failed: try again
+
+
+def complete(record_id, status, body):
+    """Store the response of the request that owns the key. Commits."""
+    db.session.rollback()  # anything the handler left uncommitted is not part of its response
+    db.session.execute(
+        db.update(IdempotencyKey).where(IdempotencyKey.id == record_id)
+        .values(response_status=status, response_body=body)
+    )
+    db.session.commit()
+
+
+def release(record_id):
+    """Forget an unfinished key so that a retry runs the handler again. Commits."""
+    db.session.rollback()
+    db.session.execute(
+        db.delete(IdempotencyKey).where(IdempotencyKey.id == record_id, IdempotencyKey.response_status.is_(None))
+    )
+    db.session.commit()
+
+
+def purge_expired():
+    result = db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.now()))
+    db.session.commit()
+    return result.rowcount
+
+
+@idempotency_cli.command('purge')
+def purge_command():
+    """Delete expired idempotency keys."""
+    print(f'Deleted {purge_expired()} expired idempotency key(s).')
@@ -5,6 +5,15 @@ from werkzeug.utils import secure_filename
 from PIL import Image
 import boto3
 from botocore.exceptions import ClientError
+from .job_service import enqueue
+
+# Sizes every product image is resized to
+IMAGE_SIZES = {
+    'original': (1200, 1200),
+    'large': (800, 800),
+    'medium': (400, 400),
+    'thumbnail': (150, 150)
+}
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -47,8 +56,30 @@ def upload_to_s3(file_path, bucket_name, object_name=None):
         print(f"Error uploading to S3: {e}")
         return None
 
+def process_product_image(file_path):
+    """Resize an uploaded image and upload the sizes to S3 if configured (run by a job worker)"""
+    if not os.path.exists(file_path):
+        return  # done by an earlier attempt
+    
+    resized_paths = resize_image(file_path, IMAGE_SIZES)
+    
+    bucket_name = current_app.config.get('S3_BUCKET')
+    if bucket_name:
+        for path in resized_paths.values():
+            # Raising keeps the original for the retry
+            if not upload_to_s3(path, bucket_name):
+                raise RuntimeError(f'Could not upload {path} to S3')
+            os.remove(path)
+    
+    # Clean up original file
+    os.remove(file_path)
+
 def save_product_image(file):
-    """Save product image and return URLs for different sizes"""
+    """Save product image, queue its resizing and return the URLs the sizes will have.
+
+    The resizing job is queued when the caller commits, with the product
+    that uses the image.
+    """
     if not file or not allowed_file(file.filename):
         return None
     
@@ -65,35 +96,15 @@ def save_product_image(file):
     file_path = os.path.join(upload_dir, unique_filename)
     file.save(file_path)
     
-    # Define sizes for resizing
-    sizes = {
-        'original': (1200, 1200),
-        'large': (800, 800),
-        'medium': (400, 400),
-        'thumbnail': (150, 150)
-    }
-    
-    # Resize images
-    resized_paths = resize_image(file_path, sizes)
+    # Resized (and uploaded) by a job worker, under the names resize_image()
+    # and upload_to_s3() give them
+    enqueue(process_product_image, file_path)
     
-    # Upload to S3 if configured
-    image_urls = {}
     bucket_name = current_app.config.get('S3_BUCKET')
-    
     if bucket_name:
-        for size_name, path in resized_paths.items():
-            s3_url = upload_to_s3(path, bucket_name)
-            if s3_url:
-                image_urls[size_name] = s3_url
-            # Clean up local file
-            os.remove(path)
+        base_url = f"https://{bucket_name}.s3.amazonaws.com"
     else:
-        # Return local paths for development
-        base_url = current_app.config.get('BASE_URL', 'http://localhost:5000')
-        for size_name, path in resized_paths.items():
-            image_urls[size_name] = f"{base_url}/uploads/{os.path.basename(path)}"
-    
-    # Clean up original file
-    os.remove(file_path)
-    
-    return image_urls
\ No newline at end of file
+        # Local paths for development
+        base_url = f"{current_app.config.get('BASE_URL', 'http://localhost:5000')}/uploads"
+    name, ext = os.path.splitext(unique_filename)
+    return {size_name: f"{base_url}/{name}_{size_name}{ext}" for size_name in IMAGE_SIZES}
\ No newline at end of file
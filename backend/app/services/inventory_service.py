@@ -0,0 +1,96 @@
+from collections import Counter
+from sqlalchemy import bindparam, case
+from ..extensions import db
+from ..models.product import Product
+
+
+class InsufficientStock(Exception):
+    """A product in the reservation does not have enough stock left"""
+
+    def __init__(self, product_id, requested):
+        super().__init__(f'Insufficient stock for product {product_id}')
+        self.product_id = product_id
+        self.requested = requested
+
+
+_table = Product.__table__
+
+_decrement = (
+    _table.update()
+    .where(_table.c.id == bindparam('b_id'), _table.c.stock >= bindparam('b_quantity'))
+    .values(stock=_table.c.stock - bindparam('b_quantity'))
+)
+
+
+def reserve_stock(quantities):
+    """Take stock for every (product_id, quantity) pair, all or nothing.
+
+    Stock is checked and taken by conditional UPDATEs (``stock >= n``),
+    so two checkouts can never both take the last unit and no row is
+    read before it is locked. Rows are locked in product id order, so
+    that concurrent multi-item reservations cannot deadlock. Raises
+    InsufficientStock on a product that cannot be covered; the caller
+    rolls back its transaction, which returns the stock already taken
+    for the other products.
+
+    With UPDATE ... RETURNING the whole reservation is one statement
+    (after the ordered row locks where the database has them) however
+    many products it covers. Does not commit: the decrements belong to
+    the caller's transaction (the order insert at checkout).
+    """
+    totals = Counter()
+    for product_id, quantity in quantities:
+        totals[product_id] += quantity
+    product_ids = sorted(totals)
+    if not product_ids:
+        return
+
+    dialect = db.session.get_bind().dialect
+    if not dialect.update_returning:
+        for product_id in product_ids:
+            result = db.session.execute(_decrement, {'b_id': product_id, 'b_quantity': totals[product_id]})
+            if result.rowcount != 1:
+                raise InsufficientStock(product_id, totals[product_id])
+        return
+
+    if dialect.name != 'sqlite':
+        # SQLite locks the whole database on the first write instead
+        db.session.execute(
+            db.select(Product.id).where(Product.id.in_(product_ids)).order_by(Product.id).with_for_update()
+        )
+
+    requested = case(totals, value=_table.c.id)
+    taken = set(db.session.execute(
+        _table.update()
+        .where(_table.c.id.in_(product_ids), _table.c.stock >= requested)
+        .values(stock=_table.c.stock - requested)
+        .returning(_table.c.id)
+    ).scalars())
+
+    for product_id in product_ids:
+        if product_id not in taken:
+            raise InsufficientStock(product_id, totals[product_id])
+
+
+def restore_stock(quantities):
+    """Give back stock for every (product_id, quantity) pair in one UPDATE.
+
+    Locks the rows in product id order first where the database has row
+    locks, like reserve_stock(). Does not commit.
+    """
+    totals = Counter()
+    for product_id, quantity in quantities:
+        totals[product_id] += quantity
+    product_ids = sorted(totals)
+    if not product_ids:
+        return
+
+    if db.session.get_bind().dialect.name != 'sqlite':
+        db.session.execute(
+            db.select(Product.id).where(Product.id.in_(product_ids)).order_by(Product.id).with_for_update()
+        )
+    db.session.execute(
+        _table.update()
+        .where(_table.c.id.in_(product_ids))
+        .values(stock=_table.c.stock + case(totals, value=_table.c.id))
+    )
@@ -0,0 +1,238 @@
+import importlib
+import logging
+import random
+import signal
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from ..extensions import db
+from ..models.job import Job
+
+logger = logging.getLogger(__name__)
+
+jobs_cli = AppGroup('jobs', help='Background job commands.')
+
+
+def enqueue(func, *args, **kwargs):
+    """Queue ``func(*args, **kwargs)`` for a job worker and return the Job.
+
+    ``func`` must be a module-level function and its arguments JSON
+    serializable. The job is only added to the session: it is queued
+    when the caller commits, together with the work that asked for it.
+    """
+    if '<locals>' in func.__qualname__:
+        raise ValueError(f'{func.__qualname__} is not a module-level function')
+    job = Job(
+        task=f'{func.__module__}:{func.__qualname__}',
+        payload={'args': list(args), 'kwargs': kwargs},
+        max_attempts=current_app.config['JOBS_MAX_ATTEMPTS'],
+        run_at=datetime.now(),
+    )
+    db.session.add(job)
+    return job
+
+
+def _resolve(task):
+    module, name = task.split(':')
+    func = importlib.import_module(module)
+    for attribute in name.split('.'):
+        func = getattr(func, attribute)
+    return func
+
+
+def _claim(limit):
+    """Mark up to ``limit`` due jobs running and return them (does not commit).
+
+    Claiming moves run_at to the end of the job's lease, so a job whose
+    worker died is due again once JOBS_LEASE has passed. Jobs another
+    worker is claiming are skipped (SKIP LOCKED); SQLite leaves the
+    clause out but serializes the UPDATE on its write lock.
+    """
+    now = datetime.now()
+    table = Job.__table__
+    due = (
+        db.select(table.c.id)
+        .where(table.c.status.in_(('queued', 'running')), table.c.run_at <= now)
+        .order_by(table.c.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claim = table.update().values(
+        status='running',
+        attempts=table.c.attempts + 1,
+        run_at=now + timedelta(seconds=current_app.config['JOBS_LEASE']),
+    )
+    columns = (table.c.id, table.c.task, table.c.payload, table.c.attempts, table.c.max_attempts)
+
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(claim.where(table.c.id.in_(due)).returning(*columns)).all()
+    job_ids = db.session.execute(due).scalars().all()
+    if not job_ids:
+        return []
+    db.session.execute(claim.where(table.c.id.in_(job_ids)))
+    return db.session.execute(db.select(*columns).where(table.c.id.in_(job_ids))).all()
+
+
+def _retry_delay(attempts):
+    """JOBS_RETRY_BACKOFF doubled per failed attempt, capped, with jitter"""
+    config = current_app.config
+    delay = min(config['JOBS_RETRY_BACKOFF'] * 2 ** (attempts - 1), config['JOBS_RETRY_BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _record(outcomes, unstarted=()):
+    """Write back finished jobs and hand back claimed ones never started (does not commit).
+
+    ``outcomes`` are (job, traceback or None) pairs. Succeeded jobs are
+    deleted; failed ones are queued again after a backoff, or left dead
+    once out of attempts. Each kind is one executemany, and a job is
+    only touched if no other worker has claimed it since (its lease ran
+    out in between).
+    """
+    table = Job.__table__
+    mine = (
+        (table.c.id == db.bindparam('b_id'))
+        & (table.c.attempts == db.bindparam('b_attempts'))
+        & (table.c.status == 'running')
+    )
+    now = datetime.now()
+    done, failed = [], []
+    for job, error in outcomes:
+        if error is None:
+            done.append({'b_id': job.id, 'b_attempts': job.attempts})
+        else:
+            last = job.attempts >= job.max_attempts
+            failed.append({
+                'b_id': job.id, 'b_attempts': job.attempts, 'b_error': error,
+                'b_status': 'dead' if last else 'queued',
+                'b_run_at': now if last else now + timedelta(seconds=_retry_delay(job.attempts)),
+            })
+    unstarted = [{'b_id': job.id, 'b_attempts': job.attempts} for job in unstarted]
+
+    if done:
+        db.session.execute(table.delete().where(mine), done)
+    if failed:
+        db.session.execute(
+            table.update().where(mine).values(
+                status=db.bindparam('b_status'), run_at=db.bindparam('b_run_at'), last_error=db.bindparam('b_error')
+            ),
+            failed
+        )
+    if unstarted:
+        db.session.execute(
+            table.update().where(mine).values(status='queued', attempts=table.c.attempts - 1, run_at=now),
+            unstarted
+        )
+
+
+def _run(app, job):
+    """Run one claimed job in its own app context; returns (job, traceback or None).
+
+    Whatever the task left uncommitted is committed once it returns.
+    Jobs run at least once: one whose worker dies before recording it
+    runs again, so tasks must be safe to repeat.
+    """
+    with app.app_context():
+        try:
+            _resolve(job.task)(*job.payload.get('args', ()), **job.payload.get('kwargs', {}))
+            db.session.commit()
+            return job, None
+        except Exception:
+            db.session.rollback()
+            logger.warning('Job %s (%s) failed on attempt %d of %d', job.id, job.task,
+                           job.attempts, job.max_attempts, exc_info=True)
+            return job, traceback.format_exc()
+        finally:
+            db.session.remove()
+
+
+def work(concurrency=None, burst=False, stop=None):
+    """Run due jobs, ``concurrency`` at a time, until ``stop`` is set.
+
+    Only this loop writes to the jobs table: each pass records the jobs
+    that finished and claims more in one transaction, keeping a batch
+    claimed ahead so the threads never wait on it. With nothing due it
+    polls every JOBS_POLL_INTERVAL seconds, or with ``burst`` returns
+    once nothing is due or running. On stop, running jobs are finished
+    and claimed ones handed back. Returns (succeeded, failed).
+    """
+    app = current_app._get_current_object()
+    concurrency = concurrency or app.config['JOBS_CONCURRENCY']
+    poll_interval = app.config['JOBS_POLL_INTERVAL']
+    stop = stop or threading.Event()
+    claimed = deque()
+    running = set()
+    finished = []
+    succeeded = failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job') as pool:
+        while True:
+            stopping = stop.is_set()
+            wanted = 0 if stopping else 2 * concurrency - len(running) - len(claimed)
+            try:
+                _record(finished, claimed if stopping else ())
+                new_jobs = _claim(wanted) if wanted > 0 else []
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            succeeded += sum(1 for _, error in finished if error is None)
+            failed += sum(1 for _, error in finished if error is not None)
+            finished = []
+            if stopping:
+                claimed.clear()
+                if not running:
+                    break
+            claimed.extend(new_jobs)
+
+            while claimed and len(running) < concurrency:
+                running.add(pool.submit(_run, app, claimed.popleft()))
+            if not running:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            finished.extend(future.result() for future in done)
+
+    return succeeded, failed
+
+
+@jobs_cli.command('work')
+@click.option('--concurrency', type=int, default=None, help='Jobs run at the same time.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def work_command(concurrency, burst):
+    """Run queued jobs until interrupted (SIGINT/SIGTERM finish the running ones first)."""
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    succeeded, failed = work(concurrency, burst, stop)
+    print(f'{succeeded} job(s) succeeded, {failed} failed.')
+
+
+@jobs_cli.command('status')
+def status_command():
+    """Show how many jobs are queued, running and dead, and the latest dead ones."""
+    counts = dict(db.session.query(Job.status, db.func.count()).group_by(Job.status).all())
+    for status in ('queued', 'running', 'dead'):
+        print(f'{status}: {counts.get(status, 0)}')
+    for job in Job.query.filter_by(status='dead').order_by(Job.id.desc()).limit(20):
+        error = (job.last_error or '').strip().splitlines()[-1:] or ['']
+        print(f'  #{job.id} {job.task} after {job.attempts} attempt(s): {error[0]}')
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', type=int, nargs=-1)
+def retry_command(job_ids):
+    """Queue dead jobs again (all of them unless JOB_IDS are given)."""
+    query = db.update(Job).where(Job.status == 'dead')
+    if job_ids:
+        query = query.where(Job.id.in_(job_ids))
+    retried = db.session.execute(query.values(status='queued', attempts=0, run_at=datetime.now())).rowcount
+    db.session.commit()
+    print(f'Queued {retried} dead job(s) again.')
@@ -0,0 +1,148 @@
+from decimal import Decimal
+from ..extensions import db
+from ..models.cart import Cart
+from ..models.cart_item import CartItem
+from ..models.order import Order
+from ..models.order_item import OrderItem
+from ..models.product import Product
+from ..utils.pagination import keyset_paginate
+from .cache_service import invalidate_stock
+from .cart_service import flush_cart, reset_cart
+from .coupon_service import coupon_discount, redeem_coupon, validate_coupon
+from .inventory_service import reserve_stock
+from .stock_hold_service import ONLINE_PAYMENT_METHODS, hold_stock
+
+
+class EmptyCart(Exception):
+    """The user has no cart, or nothing in it"""
+
+    def __init__(self):
+        super().__init__('Cart is empty')
+
+
+def _cart_lines(user_id):
+    """(cart id, [(product_id, quantity, unit_price)]) for the user's cart, in one query"""
+    rows = db.session.execute(
+        db.select(Cart.id, CartItem.product_id, CartItem.quantity, CartItem.unit_price)
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .where(Cart.user_id == user_id)
+        .order_by(CartItem.id)
+    ).all()
+    if not rows or rows[0].product_id is None:
+        raise EmptyCart()
+    return rows[0].id, [(row.product_id, row.quantity, row.unit_price) for row in rows]
+
+
+def create_order(user_id, shipping_address_id, payment_method, coupon_code=None):
+    """Turn the user's cart into an order in one transaction.
+
+    The cart lines are read and priced once, stock is reserved for them
+    (InsufficientStock rolls everything back), the order row is
+    inserted, all of its items go in with one executemany, and the cart
+    is emptied, all before a single commit. A coupon is validated from
+    its cached terms up front and its use counted last, to keep the
+    hot coupon row locked for as short a time as possible. Orders paid
+    online hold their stock until the payment webhook (or the hold expires).
+    """
+    user_id = int(user_id)
+    flushed_version = flush_cart(user_id)  # the cart store may hold changes not yet written back
+
+    try:
+        coupon = validate_coupon(coupon_code) if coupon_code else None
+        cart_id, lines = _cart_lines(user_id)
+        subtotals = [unit_price * quantity for _, quantity, unit_price in lines]
+        total = sum(subtotals, Decimal('0'))
+        discount = coupon_discount(coupon, total) if coupon else None
+        reserve_stock((product_id, quantity) for product_id, quantity, _ in lines)
+
+        order = Order(
+            user_id=user_id,
+            shipping_address_id=shipping_address_id,
+            total_amount=total - (discount or 0),
+            coupon_id=coupon['id'] if coupon else None,
+            coupon_discount=discount,
+            payment_method=payment_method
+        )
+        db.session.add(order)
+        db.session.flush()
+
+        db.session.execute(db.insert(OrderItem), [
+            {'order_id': order.id, 'product_id': product_id, 'quantity': quantity,
+             'unit_price': unit_price, 'total_price': subtotal}
+            for (product_id, quantity, unit_price), subtotal in zip(lines, subtotals)
+        ])
+
+        hold_expires_at = None
+        if payment_method in ONLINE_PAYMENT_METHODS:
+            hold_expires_at = hold_stock(order.id, [(product_id, quantity) for product_id, quantity, _ in lines])
+
+        db.session.execute(db.delete(CartItem).where(CartItem.cart_id == cart_id))
+        bump = db.update(Cart).where(Cart.id == cart_id).values(version=Cart.version + 1)
+        if db.session.get_bind().dialect.update_returning:
+            cart_version = db.session.execute(bump.returning(Cart.version)).scalar_one()
+        else:
+            # No RETURNING (MySQL, SQLite before 3.35): read it back in the same transaction
+            db.session.execute(bump)
+            cart_version = db.session.execute(db.select(Cart.version).where(Cart.id == cart_id)).scalar_one()
+        if coupon:
+            redeem_coupon(coupon_code, coupon)
+        result = {
+            'order_id': order.id,
+            'status': order.status.value,
+            'total_amount': float(order.total_amount)
+        }
+        if hold_expires_at:
+            result['payment_due_by'] = hold_expires_at.isoformat()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    reset_cart(user_id, cart_id, cart_version, flushed_version)
+    invalidate_stock(*{product_id for product_id, _, _ in lines})
+    return result
+
+
+# Newest first; ends in the primary key so the order is total
+ORDER_HISTORY_SORT = (Order.created_at, Order.id)
+
+
+def order_history(user_id, after=None, per_page=20):
+    """One page of the user's orders, newest first, with their items.
+
+    Two queries whatever the page size: the orders, with their line and
+    unit counts from correlated subqueries, then the lines of those
+    orders with product names joined in. Returns (KeysetPage of order
+    rows, {order_id: [item rows]}).
+    """
+    item_count = (
+        db.select(db.func.count(OrderItem.id))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+    unit_count = (
+        db.select(db.func.coalesce(db.func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+    )
+    query = db.session.query(
+        Order.id, Order.status, Order.total_amount, Order.shipping_amount, Order.coupon_discount,
+        Order.payment_method, Order.created_at,
+        item_count.label('item_count'), unit_count.label('unit_count')
+    ).filter(Order.user_id == int(user_id))
+    page = keyset_paginate(query, ORDER_HISTORY_SORT, after=after, per_page=per_page)
+
+    items = {order.id: [] for order in page.items}
+    if items:
+        rows = db.session.execute(
+            db.select(
+                OrderItem.order_id, OrderItem.product_id, OrderItem.quantity,
+                OrderItem.unit_price, OrderItem.total_price, Product.name
+            )
+            .outerjoin(Product, Product.id == OrderItem.product_id)
+            .where(OrderItem.order_id.in_(list(items)))
+            .order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for row in rows:
+            items[row.order_id].append(row)
+    return page, items
@@ -0,0 +1,455 @@
+import csv
+import io
+import json
+import re
+from marshmallow import ValidationError
+from sqlalchemy.schema import CreateTable
+from ..extensions import db
+from ..models.category import Category
+from ..models.product import Product
+from ..schemas.product_schema import ProductBulkUpdateSchema, ProductSchema
+from .cache_service import invalidate_products
+from .counter_service import adjust_counter
+
+# Columns of an import/export file, in CSV column order
+PRODUCT_FIELDS = [
+    'sku', 'slug', 'name', 'description', 'price', 'discount_price', 'stock',
+    'category_id', 'is_active', 'is_featured', 'images',
+]
+
+# Columns an import overwrites on existing products, which are matched on
+# SKU, else on slug (a product keeps its slug)
+UPSERT_COLUMNS = [
+    'name', 'description', 'price', 'discount_price', 'sku', 'stock',
+    'category_id', 'is_active', 'is_featured', 'images',
+]
+
+# Rows per import batch (and per commit)
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+# Columns a bulk update can change on the products it finds by SKU; a
+# missing value leaves the column as it is
+BULK_UPDATE_COLUMNS = ['price', 'discount_price', 'stock', 'is_active']
+
+# Rows per UPDATE ... FROM statement (and per commit)
+BULK_UPDATE_BATCH_SIZE = 1000
+
+# Validation errors echoed back in the import report
+MAX_REPORTED_ERRORS = 100
+
+# Image URLs are joined with '|' in CSV files (NDJSON keeps the list)
+CSV_LIST_SEPARATOR = '|'
+
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+_schema = ProductSchema()
+_bulk_update_schema = ProductBulkUpdateSchema()
+
+# Per-connection scratch table holding one batch of a bulk update. No
+# key on purpose: the UPDATE then scans the batch and looks each SKU up
+# in ix_products_sku, instead of scanning products
+_bulk_updates = db.Table(
+    'bulk_product_updates', db.MetaData(),
+    db.Column('sku', db.String(50)),
+    *(db.Column(name, Product.__table__.c[name].type) for name in BULK_UPDATE_COLUMNS),
+    prefixes=['TEMPORARY'],
+)
+
+
+def slugify(value):
+    return _SLUG_RE.sub('-', value.lower()).strip('-')
+
+
+def read_csv(stream):
+    """Yield one dict per CSV row, reading the byte stream incrementally"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(text):
+        # Blank cells are missing values, except for the (required) description
+        record = {
+            key: value for key, value in row.items()
+            if key and (value not in (None, '') or key == 'description')
+        }
+        if 'images' in record:
+            record['images'] = [url for url in record['images'].split(CSV_LIST_SEPARATOR) if url]
+        yield record
+
+
+def read_ndjson(stream):
+    """Yield one dict per non-blank NDJSON line (None for unparsable lines)"""
+    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        # null is a missing value, as a blank cell is in CSV
+        if isinstance(record, dict):
+            record = {key: value for key, value in record.items() if value is not None}
+        yield record
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+FORMATS_BY_MIMETYPE = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+}
+
+
+def validate_row(record, category_ids):
+    """Return (row values for the products table, None) or (None, errors)"""
+    if not isinstance(record, dict):
+        return None, {'_schema': ['Expected a JSON object']}
+
+    record = dict(record)
+    slug = record.pop('slug', None)
+    try:
+        data = _schema.load(record)
+    except ValidationError as e:
+        return None, e.messages
+
+    if data['category_id'] not in category_ids:
+        return None, {'category_id': ['Unknown category']}
+    if data.get('discount_price') and data['discount_price'] >= data['price']:
+        return None, {'discount_price': ['Must be lower than the price']}
+
+    # Slug of a new product: explicit, else derived from the SKU, else the name
+    slug = slugify(slug or data.get('sku') or data['name'])
+    if not slug:
+        return None, {'slug': ['Could not derive a slug']}
+
+    return {
+        'slug': slug,
+        'name': data['name'],
+        'description': data['description'],
+        'price': data['price'],
+        'discount_price': data.get('discount_price'),
+        'sku': data.get('sku') or None,
+        'stock': data['stock'],
+        'category_id': data['category_id'],
+        'is_active': data.get('is_active', True),
+        'is_featured': data.get('is_featured', False),
+        'images': data.get('images', []),
+    }, None
+
+
+def _upsert_batch(rows):
+    """Update the products the rows match (on SKU, else slug) and insert the rest"""
+    table = Product.__table__
+    skus = [row['sku'] for row in rows if row['sku']]
+    slugs = [row['slug'] for row in rows]
+    by_sku, by_slug = {}, {}
+    for product_id, sku, slug in db.session.execute(
+        db.select(table.c.id, table.c.sku, table.c.slug)
+        .where(db.or_(table.c.sku.in_(skus), table.c.slug.in_(slugs)))
+    ):
+        by_sku[sku] = by_slug[slug] = product_id
+
+    updates, inserts = [], []
+    for row in rows:
+        product_id = by_sku.get(row['sku']) if row['sku'] else None
+        if product_id is None:
+            product_id = by_slug.get(row['slug'])
+        if product_id is None:
+            inserts.append(row)
+        else:
+            updates.append({'b_id': product_id, **{f'b_{name}': row[name] for name in UPSERT_COLUMNS}})
+
+    # One executemany each: compiled once, and inserts sent as multi-row
+    # VALUES where the driver supports it. A row without a SKU leaves the
+    # product's SKU as it is
+    if updates:
+        values = {name: db.bindparam(f'b_{name}') for name in UPSERT_COLUMNS}
+        values['sku'] = db.func.coalesce(values['sku'], table.c.sku)
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('b_id')).values(**values, updated_at=db.func.now()),
+            updates
+        )
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+        # Core statements skip the session's counter bookkeeping
+        adjust_counter('products', len(inserts))
+    db.session.commit()
+
+
+def import_products(stream, file_format, batch_size=IMPORT_BATCH_SIZE):
+    """Validate and upsert products from a CSV/NDJSON byte stream.
+
+    Existing products are matched on SKU, then on slug (both unique).
+    Rows are read one at a time and written in batches of ``batch_size``,
+    each committed on its own, so memory stays flat however large the file.
+    Invalid rows are skipped and reported; the catalog caches are
+    invalidated once at the end.
+    """
+    category_ids = {category_id for (category_id,) in db.session.query(Category.id)}
+    report = {'processed': 0, 'failed': 0, 'errors': []}
+    batch = {}
+    # SKUs and slugs of the batch's rows, to their row's key
+    batch_skus, batch_slugs = {}, {}
+
+    def flush():
+        _upsert_batch(list(batch.values()))
+        report['processed'] += len(batch)
+        batch.clear()
+        batch_skus.clear()
+        batch_slugs.clear()
+
+    try:
+        for line, record in enumerate(READERS[file_format](stream), start=1):
+            row, errors = validate_row(record, category_ids)
+            if errors:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'row': line, 'errors': errors})
+                continue
+
+            # A product repeated within a batch keeps its last row. A row
+            # sharing only its SKU or slug with a pending one waits for the
+            # next batch, where it finds that row's product in the table
+            key = ('sku', row['sku']) if row['sku'] else ('slug', row['slug'])
+            if batch_skus.get(row['sku'], key) != key or batch_slugs.get(row['slug'], key) != key:
+                flush()
+            batch[key] = row
+            if row['sku']:
+                batch_skus[row['sku']] = key
+            batch_slugs[row['slug']] = key
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if report['processed']:
+            invalidate_products()
+
+    return report
+
+
+def validate_update_row(record):
+    """Return (bulk update row, None) or (None, errors).
+
+    Columns left out of the record are None in the row (unchanged); a
+    discount_price of 0 removes the discount.
+    """
+    if not isinstance(record, dict):
+        return None, {'_schema': ['Expected a JSON object']}
+    try:
+        data = _bulk_update_schema.load(record)
+    except ValidationError as e:
+        return None, e.messages
+
+    if not any(name in data for name in BULK_UPDATE_COLUMNS):
+        return None, {'_schema': [f"Nothing to update: give one of {', '.join(BULK_UPDATE_COLUMNS)}"]}
+    price, discount_price = data.get('price'), data.get('discount_price')
+    if price is not None and discount_price and discount_price >= price:
+        return None, {'discount_price': ['Must be lower than the price']}
+
+    return {'sku': data['sku'], **{name: data.get(name) for name in BULK_UPDATE_COLUMNS}}, None
+
+
+def _discount_errors(rows):
+    """Rows whose discount would not stay below the price: {sku: errors}.
+
+    validate_update_row checks rows that give both; a row giving only one
+    of them is checked here against the other as the product has it, in
+    one query per batch.
+    """
+    partial = {
+        row['sku']: row for row in rows
+        if (row['price'] is None) != (row['discount_price'] is None) and row['discount_price'] != 0
+    }
+    if not partial:
+        return {}
+    table = Product.__table__
+    errors = {}
+    for sku, price, discount_price in db.session.execute(
+        db.select(table.c.sku, table.c.price, table.c.discount_price).where(table.c.sku.in_(partial))
+    ):
+        row = partial[sku]
+        if row['price'] is not None:
+            price = row['price']
+        else:
+            discount_price = row['discount_price']
+        if discount_price and price is not None and discount_price >= price:
+            if row['price'] is None:
+                errors[sku] = {'discount_price': ['Must be lower than the price']}
+            else:
+                errors[sku] = {'price': ['Must be higher than the discount price']}
+    return errors
+
+
+def _update_batch(rows):
+    """Apply bulk update rows (one per SKU).
+
+    Returns the (id, sku) of every product changed and the set of SKUs
+    found. With UPDATE ... FROM, products the rows leave as they are
+    are not written.
+    """
+    table = Product.__table__
+    bind = db.session.get_bind()
+
+    if bind.dialect.name in ('sqlite', 'postgresql') and bind.dialect.update_returning:
+        # The batch goes into a temporary table (one executemany), then one
+        # UPDATE ... FROM joins it to products. Both statements have a fixed
+        # shape, so they are compiled once rather than once per batch
+        db.session.execute(CreateTable(_bulk_updates, if_not_exists=True))
+        db.session.execute(_bulk_updates.insert(), rows)
+        changes = _bulk_updates.c
+        new = {name: db.func.coalesce(changes[name], table.c[name]) for name in BULK_UPDATE_COLUMNS}
+        new['discount_price'] = db.func.nullif(new['discount_price'], 0)
+        changed = db.session.execute(
+            table.update()
+            .where(table.c.sku == changes.sku)
+            .where(db.or_(*(table.c[name].is_distinct_from(value) for name, value in new.items())))
+            .values(**new, updated_at=db.func.now())
+            .returning(table.c.id, table.c.sku)
+        ).all()
+        found = set(db.session.execute(
+            db.select(changes.sku).where(db.exists().where(table.c.sku == changes.sku))
+        ).scalars())
+        db.session.execute(_bulk_updates.delete())
+    else:
+        # No UPDATE ... FROM: look the SKUs up and update by primary key
+        by_sku = {row['sku']: row for row in rows}
+        changed = db.session.execute(
+            db.select(table.c.id, table.c.sku).where(table.c.sku.in_(by_sku))
+        ).all()
+        updates = []
+        for product_id, sku in changed:
+            values = {name: value for name, value in by_sku[sku].items() if name != 'sku' and value is not None}
+            if 'discount_price' in values and not values['discount_price']:
+                values['discount_price'] = None
+            updates.append(dict(values, id=product_id))
+        if updates:
+            db.session.execute(db.update(Product), updates)
+        found = {sku for _, sku in changed}
+    db.session.commit()
+    return changed, found
+
+
+def bulk_update_products(stream, file_format, batch_size=BULK_UPDATE_BATCH_SIZE):
+    """Update price, discount, stock and active flag of products by SKU.
+
+    Reads (sku, price, discount_price, stock, is_active) rows from a
+    CSV/NDJSON byte stream and applies them ``batch_size`` at a time,
+    one UPDATE and commit per batch. Invalid rows and unknown SKUs are
+    skipped and reported, as are rows that would leave a product's
+    discount at or above its price. ``updated`` counts the products actually changed; the catalog
+    caches (listings, and those products' details) are invalidated once
+    at the end.
+    """
+    report = {'processed': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    product_ids = set()
+    batch = {}
+
+    def fail(line, errors):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': line, 'errors': errors})
+
+    def flush():
+        for sku, errors in _discount_errors([row for _, row in batch.values()]).items():
+            fail(batch.pop(sku)[0], errors)
+        if not batch:
+            return
+        changed, found = _update_batch([row for _, row in batch.values()])
+        for sku, (line, _) in batch.items():
+            if sku not in found:
+                fail(line, {'sku': ['Unknown SKU']})
+        report['processed'] += len(found)
+        report['updated'] += len(changed)
+        product_ids.update(product_id for product_id, _ in changed)
+        batch.clear()
+
+    try:
+        for line, record in enumerate(READERS[file_format](stream), start=1):
+            row, errors = validate_update_row(record)
+            if errors:
+                fail(line, errors)
+                continue
+
+            # A SKU repeated within a batch keeps its last row
+            batch[row['sku']] = (line, row)
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if product_ids:
+            invalidate_products(*product_ids)
+
+    return report
+
+
+def _export_batches(batch_size):
+    table = Product.__table__
+    columns = [table.c.id] + [table.c[name] for name in PRODUCT_FIELDS]
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(*columns).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _export_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return ''
+    return str(value)
+
+
+def export_csv(batch_size=EXPORT_BATCH_SIZE):
+    """Yield the catalog as CSV text chunks, one chunk per id-ordered batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_FIELDS)
+    for rows in _export_batches(batch_size):
+        for row in rows:
+            values = row._mapping
+            writer.writerow([
+                CSV_LIST_SEPARATOR.join(values['images'] or []) if name == 'images'
+                else _export_value(values[name])
+                for name in PRODUCT_FIELDS
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(batch_size=EXPORT_BATCH_SIZE):
+    """Yield the catalog as NDJSON text chunks, one chunk per id-ordered batch"""
+    for rows in _export_batches(batch_size):
+        lines = []
+        for row in rows:
+            values = row._mapping
+            record = {name: values[name] for name in PRODUCT_FIELDS}
+            record['price'] = str(record['price'])
+            record['description'] = record['description'] or ''
+            if record['discount_price'] is not None:
+                record['discount_price'] = str(record['discount_price'])
+            record['images'] = record['images'] or []
+            lines.append(json.dumps(record, separators=(',', ':')))
+        yield '\n'.join(lines) + '\n'
+
+
+EXPORTERS = {
+    'csv': (export_csv, 'text/csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+}
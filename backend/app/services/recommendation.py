@@ -1,6 +1,7 @@
 from ..extensions import db
 from ..models.product import Product
-from ..models.order import Order, OrderItem
+from ..models.order import Order
+from ..models.order_item import OrderItem
 from sqlalchemy import func
 
 def get_frequently_bought_together(product_id, limit=4):
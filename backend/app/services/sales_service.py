@@ -0,0 +1,98 @@
+from datetime import datetime, time, timedelta
+import click
+from flask.cli import AppGroup
+from ..extensions import db
+from ..models.daily_sales import NON_REVENUE_STATUSES, DailySales
+from ..models.order import Order
+
+sales_cli = AppGroup('sales', help='Sales rollup commands.')
+
+
+def sales_summary(days=7, today=None):
+    """Lifetime order count and revenue, and the last ``days`` days for the chart.
+
+    One query over the daily_sales rollup: days before the chart window
+    are folded into a single group, so at most ``days + 1`` rows come
+    back however many orders there are. ``today`` defaults to the
+    database's current date: days are those of orders.created_at, which
+    the database clock writes (UTC on SQLite), not the local date.
+    """
+    today = today or db.session.execute(db.select(db.func.current_date())).scalar()
+    start = today - timedelta(days=days - 1)
+    rows = db.select(
+        db.case((DailySales.day >= start, DailySales.day), else_=None).label('day'),
+        DailySales.order_count,
+        DailySales.revenue,
+    ).subquery()
+    grouped = db.session.execute(
+        db.select(rows.c.day, db.func.sum(rows.c.order_count), db.func.sum(rows.c.revenue))
+        .group_by(rows.c.day)
+    ).all()
+
+    by_day = {day: revenue for day, _, revenue in grouped if day is not None}
+    chart = []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        chart.append({'date': day.strftime('%Y-%m-%d'), 'sales': float(by_day.get(day) or 0)})
+    return {
+        'order_count': sum(count or 0 for _, count, _ in grouped),
+        'revenue': sum((revenue or 0 for _, _, revenue in grouped), 0),
+        'chart': chart,
+    }
+
+
+def _day_boundary(day):
+    # SQLite compares the stored text, where '2024-01-01' sorts before
+    # every timestamp of that day whatever its precision
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.literal(day.isoformat(), db.String)
+    return datetime.combine(day, time.min)
+
+
+def backfill_daily_sales(start=None, end=None, days_per_batch=31):
+    """Rebuild daily_sales from the orders table for ``start``..``end`` (inclusive).
+
+    Defaults to every day that has orders. Each batch of days is
+    recomputed by one INSERT ... SELECT ... GROUP BY over its created_at
+    range, in its own transaction. Orders placed on a day while it is
+    being rebuilt can be missed, so rebuild today's row off-peak.
+    Returns the number of days written.
+    """
+    if start is None or end is None:
+        first, last = db.session.query(db.func.min(Order.created_at), db.func.max(Order.created_at)).one()
+        if first is None:
+            return 0
+        start = start or first.date()
+        end = end or last.date()
+
+    day = db.func.date(Order.created_at)
+    revenue = db.func.sum(db.case((Order.status.in_(NON_REVENUE_STATUSES), 0), else_=Order.total_amount))
+    written = 0
+    batch_start = start
+    while batch_start <= end:
+        batch_end = min(batch_start + timedelta(days=days_per_batch), end + timedelta(days=1))
+        try:
+            db.session.execute(
+                db.delete(DailySales).where(DailySales.day >= batch_start, DailySales.day < batch_end)
+            )
+            written += db.session.execute(db.insert(DailySales).from_select(
+                ['day', 'order_count', 'revenue'],
+                db.select(day, db.func.count(), db.func.coalesce(revenue, 0))
+                .where(Order.created_at >= _day_boundary(batch_start), Order.created_at < _day_boundary(batch_end))
+                .group_by(day)
+            )).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        batch_start = batch_end
+    return written
+
+
+@sales_cli.command('backfill')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), default=None, help='First day (default: first order).')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), default=None, help='Last day (default: last order).')
+def backfill_command(start, end):
+    """Rebuild the daily sales rollup from the orders table."""
+    days = backfill_daily_sales(start.date() if start else None, end.date() if end else None)
+    print(f'Rebuilt {days} day(s) of sales.')
@@ -0,0 +1,150 @@
+import re
+from flask.cli import AppGroup
+from sqlalchemy import DDL, event, func, literal_column, text
+from ..extensions import db
+from ..models.product import Product
+
+# SQLite: FTS5 external-content table over products(name, description).
+# The triggers keep it in step with every INSERT/UPDATE/DELETE on products,
+# so admin writes (or any other write path) never have to touch it directly.
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+SQLITE_SEARCH_DROP = [
+    "DROP TRIGGER IF EXISTS products_fts_au",
+    "DROP TRIGGER IF EXISTS products_fts_ad",
+    "DROP TRIGGER IF EXISTS products_fts_ai",
+    "DROP TABLE IF EXISTS products_fts",
+]
+
+# PostgreSQL: a stored generated tsvector column (name weighted above
+# description) with a GIN index; the database maintains it on every write.
+POSTGRES_SEARCH_DDL = [
+    """ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+]
+
+POSTGRES_SEARCH_DROP = [
+    "DROP INDEX IF EXISTS ix_products_search_vector",
+    "ALTER TABLE products DROP COLUMN IF EXISTS search_vector",
+]
+
+# Name matches count ten times as much as description matches in bm25()
+SQLITE_NAME_WEIGHT = 10.0
+SQLITE_DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+search_cli = AppGroup('search', help='Product search index commands.')
+
+# Built once, so that registering them again (every create_app) is a no-op
+_SEARCH_DDL_LISTENERS = (
+    [('after_create', DDL(statement).execute_if(dialect='sqlite')) for statement in SQLITE_SEARCH_DDL]
+    + [('after_create', DDL(statement).execute_if(dialect='postgresql')) for statement in POSTGRES_SEARCH_DDL]
+    + [('before_drop', DDL(statement).execute_if(dialect='sqlite')) for statement in SQLITE_SEARCH_DROP]
+)
+
+
+def register_search_ddl():
+    """Create the search index alongside the products table (db.create_all)"""
+    table = Product.__table__
+    for identifier, ddl in _SEARCH_DDL_LISTENERS:
+        if not event.contains(table, identifier, ddl):
+            event.listen(table, identifier, ddl)
+
+
+def tokenize(search):
+    """Split free text into search terms, dropping query-syntax characters"""
+    return [token.lower() for token in _TOKEN_RE.findall(search or '')]
+
+
+def build_fts5_query(tokens):
+    """Build an FTS5 MATCH expression: every term must match, as a prefix"""
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def build_tsquery(tokens):
+    """Build a to_tsquery() expression: every term must match, as a prefix"""
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def search_products(query, search):
+    """Restrict a Product query to full-text matches, ordered by relevance"""
+    tokens = tokenize(search)
+    if not tokens:
+        return query
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        fts = db.table('products_fts', db.column('rowid'), db.column('products_fts'))
+        rank = func.bm25(literal_column('products_fts'), SQLITE_NAME_WEIGHT, SQLITE_DESCRIPTION_WEIGHT)
+        # Materialized so the planner always starts from the (small) match set;
+        # otherwise an index on a filtered column such as category_id can win
+        # and probe the full-text index once per product row
+        matches = db.select(
+            fts.c.rowid.label('product_id'), rank.label('rank')
+        ).where(
+            fts.c.products_fts.match(build_fts5_query(tokens))
+        ).cte('search_matches').prefix_with('MATERIALIZED')
+        return query.join(matches, matches.c.product_id == Product.id).order_by(
+            matches.c.rank, Product.id
+        )
+
+    if dialect == 'postgresql':
+        vector = literal_column('products.search_vector')
+        tsquery = func.to_tsquery('english', build_tsquery(tokens))
+        return query.filter(vector.op('@@')(tsquery)).order_by(
+            func.ts_rank_cd(vector, tsquery).desc(), Product.id
+        )
+
+    # Databases without a full-text index fall back to substring matching
+    conditions = [
+        db.or_(Product.name.ilike(f'%{token}%'), Product.description.ilike(f'%{token}%'))
+        for token in tokens
+    ]
+    return query.filter(*conditions).order_by(Product.id)
+
+
+def rebuild_search_index():
+    """Rebuild the full-text index from the products table"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_SEARCH_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_SEARCH_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text('REINDEX INDEX ix_products_search_vector'))
+    db.session.commit()
+
+
+@search_cli.command('reindex')
+def reindex_command():
+    """Rebuild the product full-text search index."""
+    rebuild_search_index()
+    print('Search index rebuilt.')
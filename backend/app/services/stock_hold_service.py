@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from ..extensions import db
+from ..models.daily_sales import apply_sales_delta
+from ..models.order import Order, OrderStatus
+from ..models.stock_hold import StockHold
+from .cache_service import invalidate_stock
+from .inventory_service import restore_stock
+
+logger = logging.getLogger(__name__)
+
+holds_cli = AppGroup('holds', help='Stock hold commands.')
+
+# Orders paid through these wait for a payment webhook with their stock held
+ONLINE_PAYMENT_METHODS = ('stripe', 'razorpay')
+
+_release_lock = threading.Lock()
+_last_release = 0.0
+
+
+def hold_stock(order_id, lines):
+    """Hold the stock already reserved for an order for STOCK_HOLD_TTL seconds.
+
+    ``lines`` are (product_id, quantity) pairs, inserted with one
+    executemany. Does not commit. Returns the expiry time.
+    """
+    expires_at = datetime.now() + timedelta(seconds=current_app.config['STOCK_HOLD_TTL'])
+    db.session.execute(db.insert(StockHold), [
+        {'order_id': order_id, 'product_id': product_id, 'quantity': quantity, 'expires_at': expires_at}
+        for product_id, quantity in lines
+    ])
+    return expires_at
+
+
+def confirm_payment(order_id):
+    """Mark a PENDING order paid and drop its holds, keeping the stock sold.
+
+    Does not commit. The holds are deleted before the order is updated,
+    the same lock order as the release, so the two cannot deadlock.
+    Returns False if the order was not pending (already paid, or
+    cancelled because its holds expired before the payment arrived).
+    """
+    db.session.execute(db.delete(StockHold).where(StockHold.order_id == order_id))
+    paid = db.session.execute(
+        db.update(Order)
+        .where(Order.id == order_id, Order.status == OrderStatus.PENDING)
+        .values(status=OrderStatus.PAID)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    if not paid and db.session.query(Order.status).filter_by(id=order_id).scalar() == OrderStatus.CANCELLED:
+        logger.warning('Payment succeeded for order %s after its stock hold expired', order_id)
+    return bool(paid)
+
+
+def _claim_expired(now, batch_size):
+    """Delete up to ``batch_size`` expired holds and return them.
+
+    Holds another transaction has locked are skipped (SKIP LOCKED), so
+    concurrent releases from several workers claim disjoint batches.
+    SQLite has no row locks (the clause is left out) but the DELETE
+    takes the database write lock until commit, which serializes the
+    claims just the same.
+    """
+    table = StockHold.__table__
+    expired = (
+        db.select(table.c.id)
+        .where(table.c.expires_at <= now)
+        .order_by(table.c.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    columns = (table.c.order_id, table.c.product_id, table.c.quantity)
+
+    if db.session.get_bind().dialect.delete_returning:
+        return db.session.execute(table.delete().where(table.c.id.in_(expired)).returning(*columns)).all()
+
+    hold_ids = db.session.execute(expired).scalars().all()
+    if not hold_ids:
+        return []
+    holds = db.session.execute(db.select(*columns).where(table.c.id.in_(hold_ids))).all()
+    db.session.execute(table.delete().where(table.c.id.in_(hold_ids)))
+    return holds
+
+
+def _release_batch(now, batch_size):
+    """Release one batch in one transaction: (holds claimed, product ids restocked)"""
+    holds = _claim_expired(now, batch_size)
+    if not holds:
+        db.session.commit()
+        return 0, set()
+
+    # Orders that were paid in the meantime keep their stock
+    order_ids = sorted({hold.order_id for hold in holds})
+    pending = db.session.execute(
+        db.select(Order.id, Order.created_at, Order.total_amount)
+        .where(Order.id.in_(order_ids), Order.status == OrderStatus.PENDING)
+        .order_by(Order.id)
+        .with_for_update()
+    ).all()
+    cancelled = {order.id for order in pending}
+    restocked = [(hold.product_id, hold.quantity) for hold in holds if hold.order_id in cancelled]
+    if cancelled:
+        db.session.execute(
+            db.update(Order).where(Order.id.in_(cancelled))
+            .values(status=OrderStatus.CANCELLED)
+            .execution_options(synchronize_session=False)
+        )
+        restore_stock(restocked)
+        # A bulk UPDATE skips the Order mapper events that keep daily_sales current
+        lost_revenue = defaultdict(int)
+        for order in pending:
+            lost_revenue[order.created_at.date()] += order.total_amount
+        for day, revenue in lost_revenue.items():
+            apply_sales_delta(db.session.connection(), day, revenue=-revenue)
+    db.session.commit()
+    return len(holds), {product_id for product_id, _ in restocked}
+
+
+def release_expired_holds(batch_size=None, now=None):
+    """Give back the stock of expired holds and cancel their orders.
+
+    Works in batches of ``batch_size`` holds (STOCK_HOLD_RELEASE_BATCH_SIZE),
+    one transaction each, until no expired hold is left. Safe to run
+    from several processes at once. Returns the number of holds released.
+    """
+    batch_size = batch_size or current_app.config['STOCK_HOLD_RELEASE_BATCH_SIZE']
+    now = now or datetime.now()
+
+    released = 0
+    while True:
+        try:
+            claimed, product_ids = _release_batch(now, batch_size)
+        except Exception:
+            db.session.rollback()
+            raise
+        if product_ids:
+            invalidate_stock(*product_ids)
+        released += claimed
+        if claimed < batch_size:
+            return released
+
+
+def _release_in_background(app):
+    global _last_release
+    with app.app_context():
+        try:
+            release_expired_holds()
+        except Exception:
+            logger.exception('Stock hold release failed')
+        finally:
+            _last_release = time.time()
+            db.session.remove()
+            _release_lock.release()
+
+
+def schedule_release():
+    """Start a background release once STOCK_HOLD_RELEASE_INTERVAL has passed since the last one.
+
+    Runs before every request, so each worker sweeps now and then while
+    the site has traffic. An interval of 0 turns this off (run
+    `flask holds release` from cron instead).
+    """
+    interval = current_app.config['STOCK_HOLD_RELEASE_INTERVAL']
+    if not interval or time.time() - _last_release < interval:
+        return
+    if not _release_lock.acquire(blocking=False):
+        return  # a release is already running in this process
+    app = current_app._get_current_object()
+    threading.Thread(target=_release_in_background, args=(app,), daemon=True).start()
+
+
+@holds_cli.command('release')
+@click.option('--batch-size', type=int, default=None, help='Holds released per transaction.')
+def release_command(batch_size):
+    """Release expired stock holds and cancel their unpaid orders."""
+    print(f'Released {release_expired_holds(batch_size)} expired stock hold(s).')
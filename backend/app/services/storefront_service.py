@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from flask import current_app, render_template
+from ..extensions import cache
+from ..models.product import Product
+from ..models.category import Category
+from .cache_service import catalog_version
+
+logger = logging.getLogger(__name__)
+
+HOME_PAGE_KEY = 'storefront:home'
+HOME_REBUILD_KEY = 'storefront:home:rebuilding'
+
+_rebuild_lock = threading.Lock()
+
+
+def build_home_page():
+    """Run the home-page queries and render its product fragments"""
+    version = catalog_version()
+
+    featured_products = Product.query.filter_by(is_featured=True, is_active=True).limit(8).all()
+    categories = Category.query.order_by(Category.path).limit(8).all()
+    recent_products = Product.query.filter_by(is_active=True).order_by(
+        Product.created_at.desc(), Product.id.desc()
+    ).limit(4).all()
+
+    return {
+        'version': version['id'],
+        'built_at': time.time(),
+        'categories': [{'id': c.id, 'name': c.name, 'slug': c.slug} for c in categories],
+        'fragments': {
+            'featured_products': render_template(
+                'partials/featured_products.html',
+                products=featured_products
+            ),
+            'recent_products': render_template(
+                'partials/recent_products.html',
+                products=recent_products
+            ),
+        }
+    }
+
+
+def store_home_page():
+    page = build_home_page()
+    cache.set(HOME_PAGE_KEY, page, ttl=current_app.config['HOME_PAGE_MAX_AGE'])
+    return page
+
+
+def _rebuild_in_background(app):
+    with app.app_context():
+        try:
+            store_home_page()
+        except Exception:
+            logger.exception('Home page rebuild failed')
+        finally:
+            cache.delete(HOME_REBUILD_KEY)
+            _rebuild_lock.release()
+
+
+def schedule_rebuild():
+    """Start a background rebuild unless one is already running"""
+    if not _rebuild_lock.acquire(blocking=False):
+        return
+    # Best-effort guard against every worker rebuilding at the same moment
+    if cache.get(HOME_REBUILD_KEY) is not None:
+        _rebuild_lock.release()
+        return
+    cache.set(HOME_REBUILD_KEY, True, ttl=30)
+    app = current_app._get_current_object()
+    threading.Thread(target=_rebuild_in_background, args=(app,), daemon=True).start()
+
+
+def get_home_page():
+    """Return the precomputed home page, refreshing it in the background.
+
+    A page older than HOME_PAGE_TTL, or built from an older catalog
+    version, is still served while a fresh one is built. Only a cold
+    cache makes the request build the page itself.
+    """
+    page = cache.get(HOME_PAGE_KEY)
+    if page is None:
+        return store_home_page()
+
+    expired = time.time() - page['built_at'] > current_app.config['HOME_PAGE_TTL']
+    if expired or page['version'] != catalog_version()['id']:
+        schedule_rebuild()
+    return page
@@ -1,6 +1,14 @@
+import hashlib
+import math
+import time
+from datetime import datetime, timezone
 from functools import wraps
-from flask import flash, redirect, url_for
+from flask import Response, current_app, flash, jsonify, make_response, redirect, request, url_for
+from flask_jwt_extended import get_jwt_identity
 from flask_login import current_user
+from ..services import idempotency_service
+from ..services.cache_service import catalog_version, make_cache_key
+from .security import CART_TOKEN_HEADER
 
 def admin_required(f):
     @wraps(f)
@@ -9,4 +17,99 @@ def admin_required(f):
             flash('You need to be an admin to access this page.', 'danger')
             return redirect(url_for('admin.login'))
         return f(*args, **kwargs)
+    return decorated_function
+
+def catalog_conditional(f):
+    """Strong ETag / Last-Modified validators for public catalog reads.
+
+    Both come from the catalog version token, which changes on every
+    catalog write, so a matching If-None-Match is answered with 304
+    before the view runs any query or serializes. Stock changes leave the
+    token alone (invalidate_stock) but bump its stock generation, which
+    is part of the ETag too; as cached listings keep the old stock until
+    they expire, the validators also roll over every CACHE_DEFAULT_TTL
+    seconds.
+    If-Modified-Since is not honoured: HTTP dates have whole seconds,
+    too coarse to tell apart two writes within one second.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        version = catalog_version()
+        window = current_app.config['CACHE_DEFAULT_TTL']
+        window_start = time.time() // window * window
+        request_key = make_cache_key(request.path, request.args)
+        etag = hashlib.sha1(
+            f'{version["id"]}|{version["stock_generation"]}|{window_start:.0f}|{request_key}'.encode()
+        ).hexdigest()
+        changed_at = max(version['changed_at'], window_start)
+        last_modified = datetime.fromtimestamp(math.ceil(changed_at), tz=timezone.utc)
+
+        not_modified = request.if_none_match.contains(etag)
+        response = make_response('', 304) if not_modified else make_response(f(*args, **kwargs))
+        if response.status_code in (200, 304):
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Caches may store the body but must revalidate before reuse
+            response.cache_control.public = True
+            response.cache_control.no_cache = True
+        return response
+    return decorated_function
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+def idempotent(f):
+    """Replay the stored response for a repeated ``Idempotency-Key``.
+
+    Apply inside ``jwt_required``: keys are scoped to the caller (the
+    user, or a guest's cart token) and the endpoint. The first request with a key runs the view and, if
+    it succeeds (2xx), its response is stored for IDEMPOTENCY_KEY_TTL;
+    repeats get that response without running the view, a repeat that
+    arrives while the first is still running gets 409, and reusing a key
+    for a different request body gets 422. Error responses are not
+    stored (the views answer unexpected failures with 400 too, so a
+    transient one cannot be told apart): a retry runs the view again.
+    Requests without the header, or from a guest who has no cart yet,
+    are not affected.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return f(*args, **kwargs)
+        if not key or len(key) > 255:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be 1-255 characters'}), 400
+
+        caller = get_jwt_identity()
+        if caller is None:
+            cart_token = request.headers.get(CART_TOKEN_HEADER)
+            if not cart_token:
+                return f(*args, **kwargs)
+            caller = f'guest:{cart_token}'
+
+        hashed_key = idempotency_service.key_hash(f'{caller}|{request.endpoint}', key)
+        fingerprint = idempotency_service.request_fingerprint()
+        record, owned = idempotency_service.claim(hashed_key, fingerprint)
+
+        if not owned:
+            if record.fingerprint != fingerprint:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+            if record.response_status is None:
+                response = jsonify({'error': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            response = Response(record.response_body, status=record.response_status, mimetype='application/json')
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            idempotency_service.release(record.id)
+            raise
+        if 200 <= response.status_code < 300:
+            idempotency_service.complete(record.id, response.status_code, response.get_data(as_text=True))
+        else:
+            idempotency_service.release(record.id)
+        return response
     return decorated_function
\ No newline at end of file
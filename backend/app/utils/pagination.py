@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import abort, request
+from sqlalchemy import String, and_, literal, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of a keyset (cursor) listing.
+
+    Mirrors the parts of Flask-SQLAlchemy's Pagination that the views and
+    templates use, but carries an opaque ``next_cursor`` instead of page
+    numbers and only knows ``total`` when it was asked for.
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load_value(column, value):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(columns, row):
+    """Encode the sort-key values of the last row on a page as an opaque token"""
+    values = [_dump_value(getattr(row, column.key)) for column in columns]
+    payload = json.dumps([column.key for column in columns] + values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(columns, token):
+    """Decode a token produced by encode_cursor() for the same sort columns"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        keys, values = payload[:len(columns)], payload[len(columns):]
+        if keys != [column.key for column in columns] or len(values) != len(columns):
+            raise InvalidCursor('Cursor does not match the requested sort order')
+        return [_load_value(column, value) for column, value in zip(columns, values)]
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _bind_value(value, dialect_name):
+    # SQLite keeps timestamps as text and CURRENT_TIMESTAMP defaults have no
+    # fractional part, while SQLAlchemy binds '.ffffff'; compare against the
+    # stored form so that rows from the same second still match on equality
+    if dialect_name == 'sqlite' and isinstance(value, datetime):
+        text = value.strftime('%Y-%m-%d %H:%M:%S')
+        if value.microsecond:
+            text += f'.{value.microsecond:06d}'
+        return literal(text, String)
+    return value
+
+
+def _after_condition(columns, values, descending, dialect_name=None):
+    # (a, b) < (x, y) expanded as a < x OR (a = x AND b < y) so that a
+    # composite index on the sort columns can serve it on every backend
+    values = [_bind_value(value, dialect_name) for value in values]
+    clauses = []
+    for i, column in enumerate(columns):
+        boundary = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], boundary))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, after=None, per_page=20, descending=True, with_total=False):
+    """Return the page of ``query`` that follows the ``after`` cursor.
+
+    ``columns`` is the sort key and must end in a unique column (normally the
+    primary key) so that the order is total. No OFFSET is used and COUNT(*)
+    only runs when ``with_total`` is set.
+    """
+    total = query.order_by(None).count() if with_total else None
+
+    if after:
+        values = decode_cursor(columns, after)
+        dialect_name = query.session.get_bind().dialect.name
+        query = query.filter(_after_condition(columns, values, descending, dialect_name))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(columns, rows[-1])
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, total=total)
+
+
+def paginate_listing(query, columns, per_page=20, descending=True, total=None):
+    """Paginate an admin listing by page number, or by cursor when ``after`` is given.
+
+    A ``total`` known from elsewhere (see counter_service) saves the
+    COUNT(*) that page-number pagination would otherwise run. A malformed
+    ``after`` aborts with 400.
+    """
+    if 'after' in request.args:
+        try:
+            page = keyset_paginate(query, columns, after=request.args.get('after'),
+                                   per_page=per_page, descending=descending)
+        except InvalidCursor as e:
+            abort(400, description=str(e))
+        page.total = total
+        return page
+
+    page = request.args.get('page', 1, type=int)
+    order = [column.desc() if descending else column.asc() for column in columns]
+    if total is None:
+        return query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False)
+    pagination = query.order_by(*order).paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = total
+    return pagination
@@ -1,7 +1,29 @@
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
 from werkzeug.security import generate_password_hash, check_password_hash
 
+# Guests identify their cart with this header (or a cart_token field at login)
+CART_TOKEN_HEADER = 'X-Cart-Token'
+
 def hash_password(password):
     return generate_password_hash(password)
 
 def check_password(hashed_password, password):
-    return check_password_hash(hashed_password, password)
\ No newline at end of file
+    return check_password_hash(hashed_password, password)
+
+def _cart_token_serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='guest-cart')
+
+def make_cart_token(cart_id):
+    """Signed token naming a guest cart"""
+    return _cart_token_serializer().dumps(cart_id)
+
+def read_cart_token(token):
+    """Guest cart id from a cart token, or None if missing or tampered with"""
+    if not token:
+        return None
+    try:
+        cart_id = _cart_token_serializer().loads(token)
+    except BadSignature:
+        return None
+    return cart_id if isinstance(cart_id, int) else None
@@ -0,0 +1,157 @@
+"""Admin page latency with table_counters against COUNT(*), by table size.
+
+    python -m benchmarks.bench_admin_counts --sizes 100000 1000000
+
+First checks that the counters stay exact: after ORM inserts and
+deletes, a product import (new and existing slugs), and rows written
+behind their back followed by reconcile_counters(), table_counts() must
+equal COUNT(*) for every counted table.
+
+Then, for each size (users, products and orders each bulk-inserted up
+to it), times the dashboard and the users/products/orders listings,
+next to the COUNT(*) queries those pages used to run. Exits non-zero if
+any counter disagrees with COUNT(*).
+"""
+import argparse
+import io
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+
+from .common import SEED_BATCH_SIZE, db, make_app, seed_categories, seed_products, summarize, time_calls
+
+
+def exact_counts():
+    from app.models.table_counter import COUNTED_TABLES
+    return {name: db.session.execute(db.select(db.func.count()).select_from(db.metadata.tables[name])).scalar()
+            for name in COUNTED_TABLES}
+
+
+def compare(label):
+    from app.models.table_counter import COUNTED_TABLES
+    from app.services.counter_service import table_counts
+    db.session.expire_all()
+    counted, exact = table_counts(*COUNTED_TABLES), exact_counts()
+    ok = counted == exact
+    print(f'{label:<40} counters {counted} vs COUNT(*) {exact}: {"ok" if ok else "FAIL"}')
+    return ok
+
+
+def check_counters():
+    """Counters == COUNT(*) after ORM writes, an import and a reconcile"""
+    from app.models import Address, Order, Product, Review, User
+    from app.services.counter_service import reconcile_counters
+    from app.services.product_io_service import import_products
+
+    ok = compare('freshly created')
+
+    user = User(email='counted@example.com', password_hash='x', full_name='Counted')
+    db.session.add(user)
+    db.session.flush()
+    address = Address(user_id=user.id, label='Home', line1='1 Street', city='City',
+                      state='State', postal_code='000', country='IN')
+    db.session.add(address)
+    db.session.flush()
+    product = db.session.get(Product, 1)
+    db.session.add_all([
+        Order(user_id=user.id, shipping_address_id=address.id, total_amount=10, payment_method='cod'),
+        Review(user_id=user.id, product_id=product.id, rating=5, comment='Counted'),
+    ])
+    db.session.delete(db.session.get(Product, 2))
+    db.session.commit()
+    ok &= compare('after ORM inserts and a delete')
+
+    # Two existing slugs and three new ones
+    category_id = product.category_id
+    records = [{'slug': slug, 'sku': sku, 'name': 'Imported', 'description': 'Imported product',
+                'price': '9.99', 'stock': 5, 'category_id': category_id}
+               for slug, sku in [('product-3', 'SKU-00000003'), ('product-4', 'SKU-00000004'),
+                                 ('imported-1', 'IMP-1'), ('imported-2', 'IMP-2'), ('imported-3', 'IMP-3')]]
+    stream = io.BytesIO(''.join(json.dumps(record) + '\n' for record in records).encode())
+    report = import_products(stream, 'ndjson', batch_size=2)
+    ok &= report['failed'] == 0
+    ok &= compare('after a product import')
+
+    # Rows the counters never heard of, then a recount
+    db.session.execute(db.insert(User), [
+        {'email': f'unseen{i}@example.com', 'password_hash': 'x', 'full_name': 'Unseen'} for i in range(7)
+    ])
+    db.session.commit()
+    reconcile_counters()
+    ok &= compare('after out-of-band rows and reconcile')
+    return ok
+
+
+def seed_table(model, size, make_row):
+    """Bulk-insert rows of ``model`` until it has ``size`` rows, then recount"""
+    from app.services.counter_service import reconcile_counters
+    start = db.session.query(db.func.count()).select_from(model).scalar()
+    for first in range(start, size, SEED_BATCH_SIZE):
+        db.session.execute(db.insert(model), [make_row(i) for i in range(first, min(first + SEED_BATCH_SIZE, size))])
+        db.session.commit()
+    reconcile_counters([model.__tablename__])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    ok = True
+    with app.app_context():
+        from app.models import Address, Order, Product, User
+        from app.services.counter_service import reconcile_counters
+        category_ids = seed_categories()
+        seed_products(10, category_ids)
+        admin = User(email='admin@example.com', full_name='Admin', is_admin=True)
+        admin.set_password('password1')
+        # The seeded orders belong to a customer older than every listed
+        # user, so the users page does not load them all
+        customer = User(email='customer@example.com', password_hash='x', full_name='Customer',
+                        created_at=datetime(2000, 1, 1))
+        db.session.add_all([admin, customer])
+        db.session.flush()
+        address = Address(user_id=customer.id, label='Home', line1='1 Street', city='City',
+                          state='State', postal_code='000', country='IN')
+        db.session.add(address)
+        db.session.commit()
+        customer_id, address_id = customer.id, address.id
+
+        ok = check_counters()
+
+        client = app.test_client()
+        client.post('/api/v1/admin/login', data={'email': 'admin@example.com', 'password': 'password1'})
+        pages = ['/api/v1/admin/', '/api/v1/admin/users', '/api/v1/admin/products',
+                 '/api/v1/admin/orders', '/api/v1/admin/orders?page=50']
+        for url in pages:
+            assert client.get(url).status_code == 200, url
+
+        now = datetime.now()
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            seed_table(User, size, lambda i: {'email': f'user{i}@example.com', 'password_hash': 'x',
+                                              'full_name': f'User {i}', 'created_at': now - timedelta(seconds=i)})
+            seed_products(max(0, size - db.session.query(db.func.count(Product.id)).scalar()), category_ids)
+            seed_table(Order, size, lambda i: {'user_id': customer_id, 'shipping_address_id': address_id,
+                                               'total_amount': 10, 'payment_method': 'cod',
+                                               'created_at': now - timedelta(seconds=i)})
+            reconcile_counters(['products'])
+            print(f'--- {size:,} users/products/orders (seeded in {time.perf_counter() - started:.0f}s)')
+
+            for url in pages:
+                summarize(url, time_calls(lambda: client.get(url), [()] * args.requests))
+            for model in (User, Product, Order):
+                summarize(f'COUNT(*) {model.__tablename__}',
+                          time_calls(lambda: model.query.count(), [()] * args.requests))
+            ok &= compare(f'{size:,} rows')
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Sales reports from the columnar snapshot against the equivalent SQL.
+
+    python -m benchmarks.bench_analytics --sizes 100000 1000000
+
+Orders of 1-4 lines are bulk-inserted over the last year (one in ten
+cancelled, a few refunded) until each size is reached. For each size the
+snapshot is extended (timed), then every report (revenue by product,
+category and hour of the week; orders/revenue/AOV per day and month) is
+timed next to the GROUP BY that answers it from orders, order_items and
+products, and the two answers are compared.
+
+Before each comparison some already snapshotted orders are cancelled or
+refunded, so the in-place status patching is checked as well. Exits
+non-zero if any report disagrees with SQL. The SQL side speaks SQLite
+and PostgreSQL.
+"""
+import argparse
+import atexit
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from .common import SEED_BATCH_SIZE, db, make_app, seed_categories, seed_products, summarize, time_calls
+
+HISTORY_DAYS = 365
+
+
+def seed_orders(first, last, user_id, address_id, product_ids, rng):
+    """Insert orders number ``first``..``last - 1`` with their lines"""
+    from app.models import Order, OrderItem
+    from app.models.order import OrderStatus
+    now = datetime.now() - timedelta(hours=2)
+    statuses = [OrderStatus.PAID] * 5 + [OrderStatus.SHIPPED, OrderStatus.COMPLETED, OrderStatus.PENDING,
+                                         OrderStatus.REFUNDED, OrderStatus.CANCELLED]
+    for start in range(first, last, SEED_BATCH_SIZE):
+        count = min(start + SEED_BATCH_SIZE, last) - start
+        lines = [[(rng.choice(product_ids), rng.randint(1, 3), Decimal(rng.randint(100, 20000)) / 100)
+                  for _ in range(rng.randint(1, 4))] for _ in range(count)]
+        result = db.session.execute(db.insert(Order).returning(Order.id, sort_by_parameter_order=True), [
+            {'user_id': user_id, 'shipping_address_id': address_id, 'payment_method': 'cod',
+             'total_amount': sum(quantity * price for _, quantity, price in order_lines),
+             'status': rng.choice(statuses),
+             'created_at': now - timedelta(days=rng.randint(0, HISTORY_DAYS - 1), seconds=rng.randint(0, 86399))}
+            for order_lines in lines
+        ])
+        db.session.execute(db.insert(OrderItem), [
+            {'order_id': order_id, 'product_id': product_id, 'quantity': quantity, 'unit_price': price,
+             'total_price': quantity * price}
+            for order_id, order_lines in zip(result.scalars(), lines)
+            for product_id, quantity, price in order_lines
+        ])
+        db.session.commit()
+
+
+def change_statuses(rng, n):
+    """Cancel or refund ``n`` random orders (updated_at moves with them)"""
+    from app.models import Order
+    from app.models.order import OrderStatus
+    top = db.session.query(db.func.max(Order.id)).scalar()
+    for status in (OrderStatus.CANCELLED, OrderStatus.REFUNDED):
+        ids = [rng.randint(1, top) for _ in range(n // 2)]
+        db.session.execute(db.update(Order).where(Order.id.in_(ids)).values(status=status))
+    db.session.commit()
+
+
+def _revenue_lines():
+    from app.models import Order, OrderItem
+    from app.models.daily_sales import NON_REVENUE_STATUSES
+    return (db.select(OrderItem).join(Order, Order.id == OrderItem.order_id)
+            .where(Order.status.notin_(NON_REVENUE_STATUSES)).subquery())
+
+
+def _hour_of_week(column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return (db.func.extract('isodow', column) - 1) * 24 + db.func.extract('hour', column)
+    weekday = db.cast(db.func.strftime('%w', column), db.Integer)
+    return (weekday + 6) % 7 * 24 + db.cast(db.func.strftime('%H', column), db.Integer)
+
+
+def _day(column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.cast(column, db.Date)
+    return db.func.date(column)
+
+
+def _month(column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc('month', column), db.Date)
+    return db.func.strftime('%Y-%m-01', column)
+
+
+def sql_sales_by(dimension):
+    """{key: (revenue, units, lines)} for every product, category or hour"""
+    from app.models import Order, OrderItem, Product
+    from app.models.daily_sales import NON_REVENUE_STATUSES
+    if dimension == 'product':
+        key, joins = OrderItem.product_id, []
+    elif dimension == 'category':
+        key, joins = Product.category_id, [(Product, Product.id == OrderItem.product_id)]
+    else:
+        key, joins = _hour_of_week(Order.created_at), []
+    query = db.select(key, db.func.sum(OrderItem.total_price), db.func.sum(OrderItem.quantity), db.func.count()) \
+        .select_from(OrderItem).join(Order, Order.id == OrderItem.order_id)
+    for model, condition in joins:
+        query = query.join(model, condition)
+    query = query.where(Order.status.notin_(NON_REVENUE_STATUSES)).group_by(key)
+    return {None if row[0] is None else int(row[0]): (float(row[1]), int(row[2]), int(row[3]))
+            for row in db.session.execute(query)}
+
+
+def sql_sales_trend(bucket):
+    """{bucket start: (orders, revenue)}"""
+    from app.models import Order
+    from app.models.daily_sales import NON_REVENUE_STATUSES
+    key = _day(Order.created_at) if bucket == 'day' else _month(Order.created_at)
+    revenue = db.case((Order.status.in_(NON_REVENUE_STATUSES), 0), else_=Order.total_amount)
+    query = db.select(key, db.func.count(), db.func.sum(revenue)).group_by(key)
+    return {str(row[0]): (int(row[1]), float(row[2] or 0)) for row in db.session.execute(query)}
+
+
+def close(a, b):
+    return abs(a - b) < 0.01
+
+
+def compare_sales_by(dimension, report, expected, limit):
+    rows = report['rows']
+    for row in rows:
+        key = row['weekday'] * 24 + row['hour'] if dimension == 'hour_of_week' else row['id']
+        revenue, units, lines = expected.get(key, (0, 0, 0))
+        if not (close(row['revenue'], revenue) and row['units'] == units and row['lines'] == lines):
+            print(f'FAIL: {dimension} {key}: {row} vs SQL {expected.get(key)}')
+            return False
+    if dimension != 'hour_of_week':
+        # Nothing left out earns more than the last row kept
+        kept = {row['id'] for row in rows}
+        floor = rows[-1]['revenue'] if len(rows) == limit else 0
+        missed = [key for key, value in expected.items() if key not in kept and value[0] > floor + 0.01]
+        if missed:
+            print(f'FAIL: {dimension} top {limit} misses {missed[:5]}')
+            return False
+    return True
+
+
+def compare_trend(bucket, report, expected):
+    got = {row['start']: (row['order_count'], row['revenue']) for row in report['rows']}
+    if set(got) != set(expected):
+        print(f'FAIL: {bucket} buckets {len(got)} vs SQL {len(expected)}')
+        return False
+    for key, (orders, revenue) in expected.items():
+        if got[key][0] != orders or not close(got[key][1], revenue):
+            print(f'FAIL: {bucket} {key}: {got[key]} vs SQL {(orders, revenue)}')
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--sql-requests', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix='bench_analytics_')
+    atexit.register(shutil.rmtree, path, True)
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0, ANALYTICS_PATH=path, ANALYTICS_SETTLE_TIME=0,
+                   ANALYTICS_REFRESH_INTERVAL=10 ** 9)
+    rng = random.Random(23)
+    ok = True
+    with app.app_context():
+        from app.models import Address, Order, Product, User
+        from app.services.analytics_service import refresh_snapshot, sales_by, sales_trend
+        seed_products(2000, seed_categories(30))
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+        user = User(email='analytics@example.com', password_hash='x', full_name='Analytics')
+        db.session.add(user)
+        db.session.flush()
+        address = Address(user_id=user.id, label='Home', line1='1 Street', city='City',
+                          state='State', postal_code='000', country='IN')
+        db.session.add(address)
+        db.session.commit()
+
+        seeded = 0
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            seed_orders(seeded, size, user.id, address.id, product_ids, rng)
+            seeded = max(seeded, size)
+            seed_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            added, _ = refresh_snapshot()
+            refresh_time = time.perf_counter() - started
+            change_statuses(rng, max(10, size // 1000))
+            started = time.perf_counter()
+            _, patched = refresh_snapshot()
+            patch_time = time.perf_counter() - started
+
+            print(f'--- {seeded:,} orders (seeded in {seed_time:.0f}s; snapshot extended by {added:,} '
+                  f'in {refresh_time:.1f}s, {patched} changed orders patched in {patch_time:.2f}s)')
+            for dimension in ('product', 'category', 'hour_of_week'):
+                summarize(f'snapshot: sales by {dimension}',
+                          time_calls(lambda: sales_by(dimension, limit=args.limit), [()] * args.requests))
+                summarize(f'SQL: sales by {dimension}',
+                          time_calls(lambda: sql_sales_by(dimension), [()] * args.sql_requests))
+                ok &= compare_sales_by(dimension, sales_by(dimension, limit=args.limit),
+                                       sql_sales_by(dimension), args.limit)
+            for bucket in ('day', 'month'):
+                summarize(f'snapshot: trend by {bucket}',
+                          time_calls(lambda: sales_trend(bucket), [()] * args.requests))
+                summarize(f'SQL: trend by {bucket}',
+                          time_calls(lambda: sql_sales_trend(bucket), [()] * args.sql_requests))
+                ok &= compare_trend(bucket, sales_trend(bucket), sql_sales_trend(bucket))
+
+        client = app.test_client()
+        admin = User(email='admin@example.com', full_name='Admin', is_admin=True)
+        admin.set_password('password1')
+        db.session.add(admin)
+        db.session.commit()
+        client.post('/api/v1/admin/login', data={'email': 'admin@example.com', 'password': 'password1'})
+        for url, status in [('/api/v1/admin/reports/sales?by=category&start=2000-01-01', 200),
+                            ('/api/v1/admin/reports/trend?bucket=week', 200),
+                            ('/api/v1/admin/reports/sales?by=colour', 400),
+                            ('/api/v1/admin/reports/trend?start=yesterday', 400)]:
+            response = client.get(url)
+            if response.status_code != status:
+                print(f'FAIL: {url} returned {response.status_code}, expected {status}')
+                ok = False
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Bulk price/stock updates against editing products one at a time.
+
+    python -m benchmarks.bench_bulk_update --products 100000 --rows 1000 10000 50000
+
+The catalog is seeded once. For each --rows a CSV of updates to random
+SKUs is posted to POST /admin/products/bulk-update as the raw request
+body. The rows mix new prices with discounts, stock-only rows, removed
+discounts and deactivations (some of them what the product already
+has), plus unknown SKUs and invalid rows. The report, every updated
+product and the number of UPDATE statements and cache invalidations are
+checked. The same kind of update applied the
+way edit_product does it (load, change, commit, invalidate per product)
+is timed on --legacy-rows rows for comparison. Exits non-zero on any
+mismatch.
+"""
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from .common import db, make_app, seed_categories, seed_products
+
+UNKNOWN_SHARE = 0.01
+INVALID_SHARE = 0.01
+
+
+def make_updates(rng, skus, n):
+    """CSV body for ``n`` rows, {sku: {column: expected value}} and the
+    number of unknown SKUs and of invalid rows"""
+    lines = ['sku,price,discount_price,stock,is_active']
+    expected = {}
+    unknown = invalid = 0
+    for sku in rng.sample(skus, n):
+        kind = rng.random()
+        if kind < UNKNOWN_SHARE:
+            lines.append(f'NOPE-{sku},1.00,,1,')
+            unknown += 1
+        elif kind < UNKNOWN_SHARE + INVALID_SHARE:
+            lines.append(f'{sku},,,-5,')
+            invalid += 1
+        elif kind < 0.4:
+            price = Decimal(rng.randint(100, 100000)) / 100
+            discount = (price * Decimal('0.75')).quantize(Decimal('0.01'))
+            lines.append(f'{sku},{price},{discount},,')
+            expected[sku] = {'price': price, 'discount_price': discount}
+        elif kind < 0.8:
+            stock = rng.randint(0, 500)
+            lines.append(f'{sku},,,{stock},')
+            expected[sku] = {'stock': stock}
+        elif kind < 0.9:
+            lines.append(f'{sku},,0,,')
+            expected[sku] = {'discount_price': None}
+        else:
+            lines.append(f'{sku},,,,false')
+            expected[sku] = {'is_active': False}
+    return ('\n'.join(lines) + '\n').encode(), expected, unknown, invalid
+
+
+def snapshot(skus):
+    from app.models import Product
+    table = Product.__table__
+    columns = (table.c.sku, table.c.price, table.c.discount_price, table.c.stock, table.c.is_active)
+    state = {}
+    skus = list(skus)
+    for start in range(0, len(skus), 500):
+        for row in db.session.execute(db.select(*columns).where(table.c.sku.in_(skus[start:start + 500]))):
+            state[row.sku] = dict(row._mapping)
+    return state
+
+
+def legacy_update(sku, changes):
+    """Per-product path: load, change, commit, invalidate"""
+    from app.models import Product
+    from app.services.cache_service import invalidate_products
+    product = Product.query.filter_by(sku=sku).first()
+    for name, value in changes.items():
+        setattr(product, name, value)
+    db.session.commit()
+    invalidate_products(product.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--legacy-rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0, CACHE_BACKEND='memory')
+    rng = random.Random(25)
+    ok = True
+    with app.app_context():
+        from app.extensions import cache
+        from app.models import Product, User
+        from app.services.cache_service import PRODUCT_LIST_TAG, product_tag
+        from app.services.product_io_service import BULK_UPDATE_BATCH_SIZE
+        seed_products(args.products, seed_categories(20))
+        skus = [f'SKU-{i:08d}' for i in range(args.products)]
+        admin = User(email='admin@example.com', full_name='Admin', is_admin=True)
+        admin.set_password('password1')
+        db.session.add(admin)
+        db.session.commit()
+        client = app.test_client()
+        client.post('/api/v1/admin/login', data={'email': 'admin@example.com', 'password': 'password1'})
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: statements.append(statement))
+        invalidations = []
+        invalidate_tags = cache.invalidate_tags
+        cache.invalidate_tags = lambda tags: (invalidations.append(len(tags)), invalidate_tags(tags))
+
+        print(f'--- {args.products:,} products')
+        for n in args.rows:
+            body, expected, unknown, invalid = make_updates(rng, skus, n)
+            before = snapshot(expected)
+            detail_sku = next(sku for sku, changes in expected.items() if dict(before[sku], **changes) != before[sku])
+            detail_id = db.session.query(Product.id).filter_by(sku=detail_sku).scalar()
+            cache.set('bench:list', 1, tags=[PRODUCT_LIST_TAG])
+            cache.set('bench:detail', 1, tags=[product_tag(detail_id)])
+            statements.clear()
+            invalidations.clear()
+
+            started = time.perf_counter()
+            response = client.post('/api/v1/admin/products/bulk-update', data=body, content_type='text/csv')
+            elapsed = time.perf_counter() - started
+            report = response.get_json()
+            updates = sum(1 for statement in statements if statement.lstrip().upper().startswith(('UPDATE PRODUCTS', 'WITH')))
+            print(f'bulk update: {n:,} rows in {elapsed:.2f}s ({n / elapsed:,.0f} rows/s), '
+                  f'{updates} UPDATE statement(s), {len(invalidations)} invalidation(s)')
+
+            db.session.expire_all()
+            after = snapshot(expected)
+            wrong = [sku for sku, changes in expected.items()
+                     if after[sku] != dict(before[sku], **changes)]
+            # Rows asking for what a product already has leave it alone
+            changed = sum(1 for sku in expected if after[sku] != before[sku])
+            batches = -(-(len(expected) + unknown) // BULK_UPDATE_BATCH_SIZE)
+            print(f'  {changed:,} products changed, {len(expected) - changed:,} already as asked, '
+                  f'{unknown + invalid} rows reported')
+            if response.status_code != 200 or report['processed'] != len(expected) \
+                    or report['updated'] != changed or report['failed'] != unknown + invalid:
+                print(f'FAIL: {response.status_code} {dict(report or {}, errors=len((report or {}).get("errors", [])))}, '
+                      f'expected {len(expected)} processed, {changed} updated, {unknown + invalid} failed')
+                ok = False
+            if wrong:
+                print(f'FAIL: {len(wrong)} product(s) not updated as asked, e.g. {wrong[0]}: '
+                      f'{after[wrong[0]]} vs {dict(before[wrong[0]], **expected[wrong[0]])}')
+                ok = False
+            if updates != batches or invalidations != [changed + 1]:
+                print(f'FAIL: {updates} UPDATEs for {batches} batch(es), invalidations {invalidations}')
+                ok = False
+            if cache.get('bench:list') is not None or cache.get('bench:detail') is not None:
+                print('FAIL: cached listing or product detail survived the update')
+                ok = False
+
+        legacy = [(sku, {'stock': rng.randint(0, 500)}) for sku in rng.sample(skus, args.legacy_rows)]
+        started = time.perf_counter()
+        for sku, changes in legacy:
+            legacy_update(sku, changes)
+        elapsed = time.perf_counter() - started
+        print(f'one product at a time: {args.legacy_rows:,} rows in {elapsed:.2f}s '
+              f'({args.legacy_rows / elapsed:,.0f} rows/s)')
+
+        for url, body, status in [('/api/v1/admin/products/bulk-update?format=xml', b'<rows/>', 400),
+                                  ('/api/v1/admin/products/bulk-update', b'{"sku": "SKU-00000000"}\n', 200)]:
+            response = client.post(url, data=body, content_type='application/x-ndjson')
+            if response.status_code != status:
+                print(f'FAIL: {url} returned {response.status_code}, expected {status}')
+                ok = False
+        if response.get_json()['failed'] != 1:
+            print(f'FAIL: a row without any column to update was accepted: {response.get_json()}')
+            ok = False
+
+        # A discount or price alone is checked against the product's other one
+        price = db.session.query(Product.price).filter_by(sku='SKU-00000001').scalar()
+        failed = []
+        for body in (f'SKU-00000001,,{price},,', f'SKU-00000001,,{price - 1},,',
+                     'SKU-00000002,1.00,0.50,,', 'SKU-00000002,0.50,,,'):
+            response = client.post('/api/v1/admin/products/bulk-update', content_type='text/csv',
+                                   data=f'sku,price,discount_price,stock,is_active\n{body}\n'.encode())
+            failed.append(response.get_json()['failed'])
+        db.session.expire_all()
+        discount = db.session.query(Product.discount_price).filter_by(sku='SKU-00000001').scalar()
+        if failed != [1, 0, 0, 1] or discount != price - 1:
+            print(f'FAIL: discounts not checked against stored prices: failed {failed}, discount {discount}')
+            ok = False
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
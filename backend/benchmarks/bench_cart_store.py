@@ -0,0 +1,99 @@
+"""Add-to-cart throughput per cart storage backend.
+
+    python -m benchmarks.bench_cart_store --users 200 --adds 10
+
+"database" is the ORM path that commits every change to carts and
+cart_items; "memory" and "sqlite" keep carts in the cart store and
+write them back in batches. The write-behind flush runs from the CLI
+entry point at the end (CART_FLUSH_INTERVAL is set out of reach), so its
+cost is reported separately, followed by a check that the database
+ends up with the same carts on every backend.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from flask_jwt_extended import create_access_token
+
+from .common import db, make_app, seed_products, summarize, time_calls
+
+
+def seed_users(n):
+    from app.models import User
+    db.session.execute(db.insert(User), [
+        {'email': f'shopper{i}@example.com', 'password_hash': 'x', 'full_name': f'Shopper {i}'}
+        for i in range(n)
+    ])
+    db.session.commit()
+    return [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+
+
+def run(backend, args):
+    workdir = tempfile.mkdtemp(prefix='bench_carts_')
+    store_path = os.path.join(workdir, 'carts.db')
+    app = make_app(CART_STORE=backend, CART_STORE_PATH=store_path, CART_FLUSH_INTERVAL=10 ** 9)
+    with app.app_context():
+        seed_products(args.products)
+        user_ids = seed_users(args.users)
+        headers = {
+            user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+            for user_id in user_ids
+        }
+        client = app.test_client()
+
+        rng = random.Random(5)
+        calls = [
+            (headers[rng.choice(user_ids)], {'product_id': rng.randint(1, args.products),
+                                             'quantity': rng.randint(1, 3)})
+            for _ in range(args.users * args.adds)
+        ]
+
+        def add(request_headers, body):
+            response = client.post('/api/v1/cart/items', headers=request_headers, json=body)
+            assert response.status_code == 200, response.get_json()
+
+        started = time.perf_counter()
+        latencies = time_calls(add, calls)
+        elapsed = time.perf_counter() - started
+        print(f'{backend:<9} {len(calls) / elapsed:10,.0f} adds/s')
+        summarize(f'  add to cart ({backend})', latencies)
+        summarize(f'  cart view ({backend})', time_calls(
+            lambda request_headers: client.get('/api/v1/cart/', headers=request_headers),
+            [(headers[user_id],) for user_id in user_ids]))
+
+        from app.services.cart_service import flush_carts
+        started = time.perf_counter()
+        flushed = flush_carts()
+        if flushed:
+            print(f'  write-behind flush: {flushed} carts in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+        from app.models import Cart, CartItem
+        contents = sorted(
+            db.session.query(Cart.user_id, CartItem.product_id, CartItem.quantity)
+            .join(CartItem, CartItem.cart_id == Cart.id).all()
+        )
+        db.session.remove()
+    shutil.rmtree(workdir)
+    return contents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--adds', type=int, default=10, help='add-to-cart calls per user')
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--backends', nargs='+', default=['database', 'memory', 'sqlite'])
+    args = parser.parse_args()
+
+    results = {backend: run(backend, args) for backend in args.backends}
+    reference = results[args.backends[0]]
+    for backend, contents in results.items():
+        assert contents == reference, f'{backend} persisted different carts'
+    print(f'All backends persisted the same {len(reference)} cart items.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Checkout latency against cart size.
+
+    python -m benchmarks.bench_checkout --sizes 1 10 100 500
+
+Before each checkout the shopper's cart is refilled with that many
+distinct products (not timed); POST /api/v1/orders/checkout is then
+timed end to end and the SQL statements it issues are counted. The
+statement count should not grow with the cart: lines are priced once,
+inserted with one executemany and removed with one DELETE.
+"""
+import argparse
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from .common import db, make_app, seed_products, summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100, 500])
+    parser.add_argument('--requests', type=int, default=20, help='checkouts per cart size')
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    with app.app_context():
+        seed_products(max(args.sizes))
+        from app.models import Address, Cart, CartItem, OrderItem, Product, User
+        db.session.execute(db.update(Product).values(stock=10 ** 6))
+        user = User(email='b2b@example.com', password_hash='x', full_name='Bulk Buyer')
+        db.session.add(user)
+        db.session.flush()
+        address = Address(user_id=user.id, label='Office', line1='1 Street', city='City',
+                          state='State', postal_code='000', country='IN')
+        cart = Cart(user_id=user.id)
+        db.session.add_all([address, cart])
+        db.session.commit()
+        cart_id, address_id = cart.id, address.id
+        product_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id).all()]
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+        body = {'shipping_address_id': address_id, 'payment_method': 'cod'}
+
+        def fill_cart(size):
+            db.session.execute(db.insert(CartItem), [
+                {'cart_id': cart_id, 'product_id': product_id, 'quantity': 2, 'unit_price': 10}
+                for product_id in product_ids[:size]
+            ])
+            db.session.commit()
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        def checkout():
+            response = client.post('/api/v1/orders/checkout', headers=headers, json=body)
+            assert response.status_code == 201, response.get_json()
+
+        for size in args.sizes:
+            fill_cart(size)
+            event.listen(db.engine, 'before_cursor_execute', count)
+            statements.clear()
+            checkout()
+            event.remove(db.engine, 'before_cursor_execute', count)
+            last_order = db.session.query(db.func.max(OrderItem.order_id)).scalar()
+            assert db.session.query(OrderItem).filter_by(order_id=last_order).count() == size
+
+            latencies = []
+            for _ in range(args.requests):
+                fill_cart(size)
+                latencies += time_calls(checkout, [()])
+            summarize(f'checkout, {size} lines ({len(statements)} statements)', latencies)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Admin dashboard latency against order volume, with the daily_sales rollup.
+
+    python -m benchmarks.bench_dashboard --sizes 100000 1000000 10000000
+
+Orders are bulk-inserted over the last three years (one in ten
+cancelled) until each size is reached, then daily_sales is rebuilt
+with backfill_daily_sales() (timed). For each size the dashboard page
+(GET /api/v1/admin/) is timed, next to the queries it used to run
+(seven per-day SUMs, a lifetime SUM and a COUNT over orders).
+
+Before that, a few orders go through checkout, a status change and an
+expired stock hold, and the incrementally maintained rollup must match
+a rebuild from the orders table. Exits non-zero if it does not, or if
+the rollup totals disagree with the orders table at any size.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask_jwt_extended import create_access_token
+
+from .common import SEED_BATCH_SIZE, db, make_app, seed_products, summarize, time_calls
+
+HISTORY_DAYS = 3 * 365
+
+
+def seed_admin():
+    from app.models import Address, User
+    admin = User(email='admin@example.com', full_name='Admin', is_admin=True)
+    admin.set_password('password1')
+    db.session.add(admin)
+    db.session.flush()
+    address = Address(user_id=admin.id, label='Home', line1='1 Street', city='City',
+                      state='State', postal_code='000', country='IN')
+    db.session.add(address)
+    db.session.commit()
+    return admin.id, address.id
+
+
+def rollup_rows():
+    from app.models import DailySales
+    db.session.expire_all()
+    return sorted(db.session.query(DailySales.day, DailySales.order_count, DailySales.revenue).all())
+
+
+def check_incremental(app, user_id, address_id):
+    """Rollup kept by checkout, status changes and hold release == a rebuild"""
+    from app.models import Order
+    from app.models.order import OrderStatus
+    from app.services.sales_service import backfill_daily_sales, sales_summary
+    from app.services.stock_hold_service import release_expired_holds
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    order_ids = []
+    for method in ('cod', 'cod', 'stripe', 'stripe'):
+        client.post('/api/v1/cart/items', headers=headers, json={'product_id': 1, 'quantity': 2})
+        response = client.post('/api/v1/orders/checkout', headers=headers, json={
+            'shipping_address_id': address_id, 'payment_method': method})
+        order_ids.append(response.get_json()['order_id'])
+
+    order = db.session.get(Order, order_ids[0])
+    order.status = OrderStatus.REFUNDED
+    db.session.commit()
+    client.post('/webhooks/payment/stripe', json={
+        'type': 'payment_intent.succeeded', 'data': {'object': {'metadata': {'order_id': str(order_ids[2])}}}})
+    release_expired_holds(now=datetime.now() + timedelta(days=1))  # cancels order_ids[3]
+
+    incremental = rollup_rows()
+    backfill_daily_sales()
+    rebuilt = rollup_rows()
+    ok = incremental == rebuilt and incremental and incremental[-1][1] == 4
+    print(f'incremental rollup {incremental} vs rebuilt {rebuilt}: {"ok" if ok else "FAIL"}')
+
+    # The chart's last day is the day these orders were rolled up under
+    today = sales_summary()['chart'][-1]
+    if incremental and (today['date'] != incremental[-1][0].isoformat()
+                        or Decimal(str(today['sales'])) != incremental[-1][2]):
+        print(f'FAIL: chart ends with {today}, rollup with {incremental[-1]}')
+        ok = False
+    return ok
+
+
+def seed_orders(first, last, user_id, address_id, rng):
+    """Insert orders number ``first``..``last - 1`` spread over HISTORY_DAYS days"""
+    from app.models import Order
+    from app.models.order import OrderStatus
+    now = datetime.now()
+    for start in range(first, last, SEED_BATCH_SIZE):
+        db.session.execute(db.insert(Order), [
+            {'user_id': user_id, 'shipping_address_id': address_id, 'payment_method': 'cod',
+             'total_amount': Decimal(rng.randint(100, 50000)) / 100,
+             'status': OrderStatus.CANCELLED if i % 10 == 0 else OrderStatus.PAID,
+             'created_at': now - timedelta(days=i % HISTORY_DAYS, seconds=rng.randint(0, 86399))}
+            for i in range(start, min(start + SEED_BATCH_SIZE, last))
+        ])
+        db.session.commit()
+
+
+def legacy_queries():
+    """What dashboard() used to run against the orders table"""
+    from app.models import Order
+    total_orders = Order.query.count()
+    total_revenue = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
+    for i in range(6, -1, -1):
+        day = datetime.now() - timedelta(days=i)
+        day_start = datetime(day.year, day.month, day.day)
+        db.session.query(db.func.sum(Order.total_amount)).filter(
+            Order.created_at >= day_start, Order.created_at < day_start + timedelta(days=1)
+        ).scalar()
+    return total_orders, total_revenue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--legacy-requests', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    rng = random.Random(21)
+    ok = True
+    with app.app_context():
+        seed_products(50)
+        from app.models import Order, Product
+        from app.models.daily_sales import NON_REVENUE_STATUSES
+        from app.services.sales_service import backfill_daily_sales, sales_summary
+        db.session.execute(db.update(Product).values(stock=10 ** 6))
+        db.session.commit()
+        user_id, address_id = seed_admin()
+        ok = check_incremental(app, user_id, address_id)
+
+        client = app.test_client()
+        client.post('/api/v1/admin/login', data={'email': 'admin@example.com', 'password': 'password1'})
+        assert client.get('/api/v1/admin/').status_code == 200
+
+        seeded = db.session.query(Order).count()
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            seed_orders(seeded, size, user_id, address_id, rng)
+            seeded = max(seeded, size)
+            seed_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            days = backfill_daily_sales()
+            backfill_time = time.perf_counter() - started
+
+            print(f'--- {seeded:,} orders (seeded in {seed_time:.0f}s; backfill of {days} days '
+                  f'took {backfill_time:.1f}s)')
+            summarize('dashboard page (rollup)', time_calls(lambda: client.get('/api/v1/admin/'), [()] * args.requests))
+            summarize('sales_summary() query', time_calls(sales_summary, [()] * args.requests))
+            summarize('previous order-table queries', time_calls(legacy_queries, [()] * args.legacy_requests))
+
+            summary = sales_summary()
+            expected_revenue = db.session.query(db.func.sum(Order.total_amount)).filter(
+                Order.status.notin_(NON_REVENUE_STATUSES)
+            ).scalar()
+            if summary['order_count'] != seeded or summary['revenue'] != expected_revenue:
+                print(f'FAIL: rollup says {summary["order_count"]} orders / {summary["revenue"]}, '
+                      f'orders table {seeded} / {expected_revenue}')
+                ok = False
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Facet counts for the product listing: one grouped pass vs. a count per facet value.
+
+    python -m benchmarks.bench_facets --sizes 100000 1000000 --budget-ms 1000
+
+"per-value counts" issues one COUNT(*) per category, price bucket and
+stock state (what a client stitching facets together would cause);
+"single pass" is compute_facets(). Exits non-zero when the single-pass
+p95 of any filter set exceeds --budget-ms.
+"""
+import argparse
+import random
+import sys
+
+from sqlalchemy import and_
+
+from .common import RARE_WORDS, db, make_app, percentile, seed_products, summarize, time_calls
+
+
+def filtered_query(filters):
+    from app.models import Product
+    from app.services.search_service import search_products
+    query = Product.query.filter(Product.is_active == True)
+    if filters.get('q'):
+        query = search_products(query, filters['q'])
+    if filters.get('category'):
+        query = query.filter(Product.category_id == filters['category'])
+    if filters.get('min_price') is not None:
+        query = query.filter(Product.price >= filters['min_price'])
+    return query
+
+
+def single_pass(filters):
+    from app.services.facet_service import compute_facets
+    return compute_facets(filtered_query(filters))
+
+
+def per_value_counts(filters, category_ids, bounds):
+    from app.models import Product
+    counts = {}
+    for category_id in category_ids:
+        counts[('category', category_id)] = filtered_query(filters).filter(
+            Product.category_id == category_id).order_by(None).count()
+    edges = [None] + list(bounds) + [None]
+    for low, high in zip(edges, edges[1:]):
+        conditions = []
+        if low is not None:
+            conditions.append(Product.price >= low)
+        if high is not None:
+            conditions.append(Product.price < high)
+        counts[('price', low)] = filtered_query(filters).filter(and_(*conditions)).order_by(None).count()
+    counts['in_stock'] = filtered_query(filters).filter(Product.stock > 0).order_by(None).count()
+    counts['out_of_stock'] = filtered_query(filters).filter(Product.stock <= 0).order_by(None).count()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    parser.add_argument('--skip-per-value', action='store_true', help='only time the single pass')
+    args = parser.parse_args()
+
+    over_budget = False
+    for size in args.sizes:
+        app = make_app()
+        with app.app_context():
+            seed_products(size)
+            from app.models import Category
+            category_ids = [row[0] for row in db.session.query(Category.id).all()]
+            bounds = app.config['FACET_PRICE_BUCKETS']
+            rng = random.Random(3)
+            filter_sets = {
+                'no filters': {},
+                'category': {'category': category_ids[0]},
+                'min_price': {'min_price': 200},
+                'search': {'q': rng.choice(RARE_WORDS)},
+            }
+
+            print(f'--- {size:,} products')
+            for label, filters in filter_sets.items():
+                latencies = time_calls(single_pass, [(filters,)] * args.requests)
+                summarize(f'single pass ({label})', latencies)
+                over_budget |= percentile(latencies, 95) > args.budget_ms
+                if args.skip_per_value:
+                    continue
+                summarize(f'per-value counts ({label})', time_calls(
+                    per_value_counts, [(filters, category_ids, bounds)] * max(1, args.requests // 10)))
+            db.session.remove()
+
+    if over_budget:
+        print(f'FAIL: single-pass facets exceeded the {args.budget_ms:.0f}ms p95 budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
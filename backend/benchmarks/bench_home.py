@@ -0,0 +1,38 @@
+"""Home page (/) latency with and without the precomputed page model.
+
+    python -m benchmarks.bench_home --sizes 10000 100000 1000000
+
+"uncached" uses the null cache backend, so every request runs the home
+page queries and renders both fragments (the pre-existing behaviour);
+"precomputed" serves the cached page model.
+"""
+import argparse
+
+from .common import db, make_app, seed_products, summarize, time_calls
+
+
+def run(size, backend, requests):
+    app = make_app(CACHE_BACKEND=backend)
+    with app.app_context():
+        seed_products(size)
+        client = app.test_client()
+        client.get('/')  # warm up (builds the page model when caching)
+        latencies = time_calls(lambda: client.get('/'), [()] * requests)
+        db.session.remove()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        print(f'--- {size:,} products')
+        summarize('uncached (queries + render per hit)', run(size, 'null', args.requests))
+        summarize('precomputed page model', run(size, 'memory', args.requests))
+
+
+if __name__ == '__main__':
+    main()
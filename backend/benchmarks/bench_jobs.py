@@ -0,0 +1,174 @@
+"""Job queue: enqueue overhead, throughput, concurrency bound and retries.
+
+    python -m benchmarks.bench_jobs [--jobs 5000] [--concurrency 1 4 8]
+
+Times enqueue() + commit one job at a time and in batches of 100, then
+for each concurrency drains --jobs no-op jobs with work(burst=True)
+(jobs/s) and --jobs / 10 jobs that sleep --sleep-ms each, tracking how
+many ran at once. Then checks the failure paths: a job failing twice
+before succeeding is retried, one that always fails ends up dead after
+JOBS_MAX_ATTEMPTS attempts, and a job claimed by a worker that died is
+run again once its lease is over. Exits non-zero if any job is lost or
+run twice, the concurrency bound is exceeded, or a failure path is off.
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+
+from .common import db, make_app, summarize, time_calls
+
+MAX_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_runs = Counter()
+_active = 0
+_peak = 0
+
+
+def noop(key):
+    with _lock:
+        _runs[key] += 1
+
+
+def sleeper(key, seconds):
+    global _active, _peak
+    with _lock:
+        _active += 1
+        _peak = max(_peak, _active)
+    time.sleep(seconds)
+    with _lock:
+        _active -= 1
+        _runs[key] += 1
+
+
+def flaky(key, failures):
+    with _lock:
+        _runs[key] += 1
+        attempt = _runs[key]
+    if attempt <= failures:
+        raise RuntimeError(f'{key} failed on attempt {attempt}')
+
+
+def reset():
+    global _peak
+    _runs.clear()
+    _peak = 0
+
+
+def drain(concurrency):
+    from app.services.job_service import work
+    started = time.perf_counter()
+    work(concurrency=concurrency, burst=True)
+    return time.perf_counter() - started
+
+
+def check_runs(label, keys):
+    """Every key ran exactly once and no job is left"""
+    from app.models import Job
+    wrong = [key for key in keys if _runs[key] != 1]
+    left = db.session.query(Job).count()
+    if wrong or left:
+        print(f'FAIL: {label}: {len(wrong)} job(s) not run exactly once, {left} left in the queue')
+        return False
+    return True
+
+
+def check_failures(app):
+    from app.models import Job
+    from app.services.job_service import _claim, enqueue, work
+    ok = True
+    reset()
+    enqueue(flaky, 'recovers', 2)
+    enqueue(flaky, 'broken', 99)
+    db.session.commit()
+    work(concurrency=2, burst=True)
+    dead = Job.query.filter_by(status='dead').all()
+    if _runs['recovers'] != 3 or _runs['broken'] != MAX_ATTEMPTS or len(dead) != 1 \
+            or dead[0].attempts != MAX_ATTEMPTS or 'broken failed' not in dead[0].last_error:
+        print(f'FAIL: retries {dict(_runs)}, dead {[(job.task, job.attempts) for job in dead]}')
+        ok = False
+    print(f'retries: recovering job ran {_runs["recovers"]}x, failing job dead after {_runs["broken"]} attempts')
+    db.session.execute(db.delete(Job))
+    db.session.commit()
+
+    # A worker claims a job and dies: it is run again after the lease
+    app.config['JOBS_LEASE'] = 1
+    reset()
+    enqueue(noop, 'orphan')
+    db.session.commit()
+    _claim(1)
+    db.session.commit()
+    work(burst=True)
+    early = _runs['orphan']
+    time.sleep(app.config['JOBS_LEASE'] + 0.1)
+    work(burst=True)
+    if early != 0 or not check_runs('lease', ['orphan']):
+        print(f'FAIL: orphaned job ran {early}x before its lease ran out')
+        ok = False
+    print(f'lease: orphaned job run again after {app.config["JOBS_LEASE"]}s')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--jobs', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--sleep-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0, JOBS_MAX_ATTEMPTS=MAX_ATTEMPTS, JOBS_RETRY_BACKOFF=0,
+                   JOBS_POLL_INTERVAL=0.05)
+    ok = True
+    with app.app_context():
+        from app.services.job_service import enqueue
+
+        def enqueue_one(key):
+            enqueue(noop, key)
+            db.session.commit()
+
+        def enqueue_batch(start):
+            for key in range(start, start + 100):
+                enqueue(noop, key)
+            db.session.commit()
+
+        keys = range(args.jobs)
+        summarize('enqueue + commit, 1 job', time_calls(enqueue_one, [(key,) for key in keys]))
+        batches = time_calls(enqueue_batch, [(args.jobs + start,) for start in range(0, args.jobs, 100)])
+        summarize('enqueue + commit, 100 jobs', batches)
+        reset()
+        drain(max(args.concurrency))
+
+        for concurrency in args.concurrency:
+            reset()
+            for key in keys:
+                enqueue(noop, key)
+            db.session.commit()
+            elapsed = drain(concurrency)
+            print(f'concurrency {concurrency}: {args.jobs} no-op jobs in {elapsed:.2f}s '
+                  f'({args.jobs / elapsed:,.0f} jobs/s)')
+            ok &= check_runs(f'no-op, concurrency {concurrency}', keys)
+
+            reset()
+            sleepers = range(args.jobs // 10)
+            for key in sleepers:
+                enqueue(sleeper, key, args.sleep_ms / 1000)
+            db.session.commit()
+            elapsed = drain(concurrency)
+            print(f'concurrency {concurrency}: {len(sleepers)} jobs of {args.sleep_ms:g}ms in {elapsed:.2f}s '
+                  f'({len(sleepers) / elapsed:,.0f} jobs/s, at most {_peak} at once)')
+            ok &= check_runs(f'sleeping, concurrency {concurrency}', sleepers)
+            if _peak > concurrency:
+                print(f'FAIL: {_peak} jobs ran at once with concurrency {concurrency}')
+                ok = False
+
+        ok &= check_failures(app)
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Throughput and peak memory of the admin product import/export endpoints.
+
+    python -m benchmarks.bench_product_io --sizes 10000 100000 500000
+
+For each size a CSV (or NDJSON) file is generated on disk and streamed
+to POST /admin/products/import as the raw request body, imported again
+(every row now updates the product with its SKU, and the product count
+must not move), then the catalog is streamed back from GET
+/admin/products/export. Every phase runs in a
+fresh child process so that its peak RSS (ru_maxrss) is its own; flat
+peaks across sizes show that neither direction buffers the catalog.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .common import WORDS, db, make_app, seed_categories
+
+
+def write_file(path, size, file_format, category_ids, seed=11):
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        if file_format == 'csv':
+            f.write('sku,name,description,price,discount_price,stock,category_id,is_active,is_featured,images\n')
+        for i in range(size):
+            name = ' '.join(rng.choice(WORDS) for _ in range(3)).title()
+            description = ' '.join(rng.choice(WORDS) for _ in range(30))
+            price = round(rng.uniform(1, 1000), 2)
+            row = {
+                'sku': f'SKU-{i:08d}', 'name': name, 'description': description,
+                'price': f'{price:.2f}', 'stock': rng.choice([0, 5, 50]),
+                'category_id': rng.choice(category_ids), 'is_active': True,
+                'is_featured': rng.random() < 0.01, 'images': [f'/static/uploads/products/{i}.jpg'],
+            }
+            if file_format == 'csv':
+                f.write(f"{row['sku']},{row['name']},{row['description']},{row['price']},,"
+                        f"{row['stock']},{row['category_id']},true,{str(row['is_featured']).lower()},"
+                        f"{row['images'][0]}\n")
+            else:
+                f.write(json.dumps(row) + '\n')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def login(client):
+    client.post('/api/v1/admin/login', data={'email': 'bench@example.com', 'password': 'password1'})
+
+
+def run_phase(phase, database_url, path, file_format):
+    """Child process: run one import or export and print a JSON result line"""
+    app = make_app(database_url) if phase == 'setup' else None
+    if app is None:
+        from app import create_app
+        from app.config import Config
+        config = type('BenchConfig', (Config,), dict(
+            SQLALCHEMY_DATABASE_URI=database_url, TESTING=True, CACHE_BACKEND='null'))
+        app = create_app(config)
+
+    with app.app_context():
+        from app.models import Product, User
+        if phase == 'setup':
+            category_ids = seed_categories()
+            admin = User(email='bench@example.com', full_name='Bench', is_admin=True)
+            admin.set_password('password1')
+            db.session.add(admin)
+            db.session.commit()
+            print(json.dumps({'category_ids': category_ids}))
+            return
+
+        client = app.test_client()
+        login(client)
+        baseline = peak_rss_mb()
+        started = time.perf_counter()
+
+        if phase in ('import', 'reimport'):
+            mimetype = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+            with open(path, 'rb') as f:
+                response = client.post('/api/v1/admin/products/import', input_stream=f,
+                                       content_type=mimetype, content_length=os.path.getsize(path))
+            report = response.get_json()
+            rows = report['processed']
+            assert not report['failed'], report['errors'][:3]
+            products = db.session.query(db.func.count(Product.id)).scalar()
+            assert products == rows, f'{products} products after importing {rows} rows'
+        else:
+            response = client.get(f'/api/v1/admin/products/export?format={file_format}', buffered=False)
+            rows = 0
+            for chunk in response.response:
+                rows += chunk.count(b'\n')
+            response.close()
+            rows -= 1 if file_format == 'csv' else 0  # header line
+            assert rows == db.session.query(db.func.count(Product.id)).scalar()
+
+        elapsed = time.perf_counter() - started
+        print(json.dumps({'rows': rows, 'seconds': elapsed, 'baseline_mb': baseline,
+                          'peak_mb': peak_rss_mb()}))
+
+
+def spawn(phase, database_url, path, file_format):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_product_io', '--phase', phase,
+         '--database-url', database_url, '--path', path, '--format', file_format],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    parser.add_argument('--phase', choices=['setup', 'import', 'reimport', 'export'], help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help=argparse.SUPPRESS)
+    parser.add_argument('--path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase(args.phase, args.database_url, args.path, args.format)
+        return
+
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix='bench_io_')
+        database_url = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+        path = os.path.join(workdir, f'products.{args.format}')
+        try:
+            category_ids = spawn('setup', database_url, path, args.format)['category_ids']
+            write_file(path, size, args.format, category_ids)
+            size_mb = os.path.getsize(path) / 1024 / 1024
+
+            print(f'--- {size:,} products ({args.format}, {size_mb:.0f} MB file)')
+            for phase in ('import', 'reimport', 'export'):
+                result = spawn(phase, database_url, path, args.format)
+                print(f"{phase:<8} {result['rows'] / result['seconds']:10,.0f} rows/s "
+                      f"({result['seconds']:.1f}s)  peak RSS {result['peak_mb']:6.1f} MB "
+                      f"(app baseline {result['baseline_mb']:.1f} MB)")
+        finally:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
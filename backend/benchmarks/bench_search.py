@@ -0,0 +1,54 @@
+"""p95 latency of product search: indexed full-text vs. ILIKE scan.
+
+    python -m benchmarks.bench_search --sizes 100000 1000000
+"""
+import argparse
+import random
+
+from sqlalchemy import or_
+
+from .common import RARE_WORDS, WORDS, db, make_app, seed_products, summarize, time_calls
+
+
+def ilike_search(search, per_page=20):
+    from app.models import Product
+    query = Product.query.filter(Product.is_active == True).filter(
+        or_(Product.name.ilike(f'%{search}%'), Product.description.ilike(f'%{search}%'))
+    )
+    return query.paginate(page=1, per_page=per_page, error_out=False).items
+
+
+def indexed_search(search, per_page=20):
+    from app.models import Product
+    from app.services.search_service import search_products
+    query = search_products(Product.query.filter(Product.is_active == True), search)
+    return query.paginate(page=1, per_page=per_page, error_out=False).items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--skip-ilike', action='store_true', help='only time the indexed path')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    # Mix of single brand-name lookups and "brand + generic term" queries
+    searches = [
+        (rng.choice(RARE_WORDS) + ('' if rng.random() < 0.5 else ' ' + rng.choice(WORDS)),)
+        for _ in range(args.queries)
+    ]
+
+    for size in args.sizes:
+        app = make_app()
+        with app.app_context():
+            seed_products(size)
+            print(f'--- {size:,} products')
+            summarize('full-text index', time_calls(indexed_search, searches))
+            if not args.skip_ilike:
+                summarize('ILIKE scan', time_calls(ilike_search, searches[:max(1, args.queries // 10)]))
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Statement-count check for the cart view (GET /api/v1/cart/).
+
+    python -m benchmarks.check_cart_queries [--sizes 1 10 50] [--max-queries 1]
+
+Fills one cart per size with that many distinct products, then counts
+the SQL statements a single cart view issues and its latency. Exits
+non-zero if any view issues more than --max-queries statements, i.e.
+if reading the cart goes back to loading items or products one by one.
+"""
+import argparse
+import sys
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from .common import db, make_app, seed_products, summarize, time_calls
+
+
+def seed_carts(sizes):
+    """One user per size whose cart holds that many products; returns [(size, user_id)]"""
+    from app.models import Cart, CartItem, Product, User
+
+    product_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id).limit(max(sizes))]
+    carts = []
+    for size in sizes:
+        user = User(email=f'cart{size}@example.com', password_hash='x', full_name=f'Cart {size}')
+        db.session.add(user)
+        db.session.flush()
+        cart = Cart(user_id=user.id)
+        db.session.add(cart)
+        db.session.flush()
+        db.session.execute(db.insert(CartItem), [
+            {'cart_id': cart.id, 'product_id': product_id, 'quantity': 2, 'unit_price': 10}
+            for product_id in product_ids[:size]
+        ])
+        carts.append((size, user.id))
+    db.session.commit()
+    return carts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--max-queries', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    failures = 0
+    with app.app_context():
+        seed_products(max(args.sizes))
+        carts = seed_carts(args.sizes)
+        client = app.test_client()
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for size, user_id in carts:
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+            event.listen(db.engine, 'before_cursor_execute', count)
+            statements.clear()
+            response = client.get('/api/v1/cart/', headers=headers)
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+            payload = response.get_json()
+            assert response.status_code == 200, payload
+            assert len(payload['items']) == size
+            assert payload['total'] == size * 2 * 10
+
+            ok = len(statements) <= args.max_queries
+            failures += not ok
+            print(f"{'ok' if ok else 'FAIL':<5} {size:>4} items: {len(statements)} statement(s)")
+            if not ok:
+                for statement in statements:
+                    print('      ' + ' '.join(statement.split())[:160])
+            summarize(f'cart view ({size} items)', time_calls(
+                lambda: client.get('/api/v1/cart/', headers=headers), [()] * args.requests))
+
+    if failures:
+        print(f'{failures} cart view(s) exceeded {args.max_queries} statement(s)')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Concurrent checkouts redeeming one hot coupon code.
+
+    python -m benchmarks.check_coupon_redemption [--threads 16] [--max-uses 40]
+
+Every thread is a shopper that keeps filling its cart and checking out
+with the same coupon code until checkout rejects the coupon. Exits
+non-zero if the coupon was redeemed more than max_uses times, if
+uses_count disagrees with the orders that carry the coupon, or if
+fewer than max_uses redemptions succeeded. Also reports how many
+coupon lookups reached the database (the terms are cached).
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from .common import db, make_app, seed_products
+
+
+def seed_shoppers(n):
+    from app.models import Address, User
+    db.session.execute(db.insert(User), [
+        {'email': f'promo{i}@example.com', 'password_hash': 'x', 'full_name': f'Promo {i}'}
+        for i in range(n)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+    db.session.execute(db.insert(Address), [
+        {'user_id': user_id, 'label': 'Home', 'line1': '1 Street', 'city': 'City',
+         'state': 'State', 'postal_code': '000', 'country': 'IN'}
+        for user_id in user_ids
+    ])
+    db.session.commit()
+    return dict(db.session.query(Address.user_id, Address.id).all())
+
+
+def shopper(app, token, address_id, code, results):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    outcome = Counter()
+    while True:
+        client.post('/api/v1/cart/items', headers=headers, json={'product_id': 1, 'quantity': 1})
+        response = client.post('/api/v1/orders/checkout', headers=headers, json={
+            'shipping_address_id': address_id, 'payment_method': 'cod', 'coupon_code': code})
+        if response.status_code == 201:
+            outcome['redeemed'] += 1
+            continue
+        outcome[response.get_json()['error']] += 1
+        break
+    results.append(outcome)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--max-uses', type=int, default=40)
+    args = parser.parse_args()
+
+    app = make_app(CACHE_BACKEND='memory')
+    code = 'FLASH50'
+    with app.app_context():
+        seed_products(10)
+        from app.models import Coupon, Order, Product
+        db.session.execute(db.update(Product).values(stock=10 ** 6))
+        coupon = Coupon(code=code, discount_type='percent', value=50, max_uses=args.max_uses,
+                        uses_count=0, valid_from=datetime.now() - timedelta(days=1),
+                        valid_to=datetime.now() + timedelta(days=1), active=True)
+        db.session.add(coupon)
+        db.session.commit()
+        coupon_id = coupon.id
+        addresses = seed_shoppers(args.threads)
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in addresses}
+
+        lookups = []
+
+        def count_lookups(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and 'FROM coupons' in statement:
+                lookups.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count_lookups)
+
+    results = []
+    threads = [
+        threading.Thread(target=shopper, args=(app, tokens[user_id], address_id, code, results))
+        for user_id, address_id in addresses.items()
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    outcome = sum(results, Counter())
+    with app.app_context():
+        event.remove(db.engine, 'before_cursor_execute', count_lookups)
+        uses_count = db.session.get(Coupon, coupon_id).uses_count
+        orders = Order.query.filter_by(coupon_id=coupon_id).count()
+
+    print(f"{args.threads} threads, max_uses {args.max_uses}: {outcome['redeemed']} redemptions "
+          f"in {elapsed:.1f}s ({outcome['redeemed'] / elapsed:,.0f}/s)")
+    for key, count in sorted(outcome.items()):
+        if key != 'redeemed':
+            print(f'  {count} x {key}')
+    print(f'uses_count {uses_count}, orders with the coupon {orders}, '
+          f'coupon lookups that reached the database {len(lookups)}')
+
+    ok = uses_count == orders == outcome['redeemed'] == args.max_uses
+    print('ok' if ok else 'FAIL: coupon over- or under-redeemed')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Guest carts: merge on login and the abandoned-cart sweep.
+
+    python -m benchmarks.check_guest_carts [--sizes 10 100 500] [--stale 20000]
+                                           [--batch-size 1000] [--store memory]
+
+For each size a guest fills a cart with that many products through the
+cart API (no login, X-Cart-Token), half of which the user already has
+in their own cart, then logs in with the cart token. The login must sum
+quantities per product and delete the guest cart, and the statements it
+issues must not grow with the size of either cart.
+
+Then --stale guest carts (three lines each) older than GUEST_CART_TTL
+are bulk-inserted next to a few fresh ones and `sweep_guest_carts()`
+is timed; every stale cart and its lines must be gone, the fresh ones
+kept. Exits non-zero on any failure.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import event
+
+from .common import db, make_app, seed_products
+
+PASSWORD = 'password1'
+
+
+def seed_user(size, product_ids):
+    """A user whose cart holds one of each of the first size // 2 products"""
+    from app.models import Cart, CartItem, User
+    user = User(email=f'guest{size}@example.com', full_name=f'Guest {size}')
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    cart = Cart(user_id=user.id)
+    db.session.add(cart)
+    db.session.flush()
+    db.session.execute(db.insert(CartItem), [
+        {'cart_id': cart.id, 'product_id': product_id, 'quantity': 1, 'unit_price': 10}
+        for product_id in product_ids[:size // 2]
+    ])
+    db.session.commit()
+    return user.email, cart.id
+
+
+def check_merge(app, size, product_ids):
+    from app.models import Cart, CartItem
+    email, cart_id = seed_user(size, product_ids)
+    client = app.test_client()
+
+    # The guest has two of each product from size // 4 on: some overlap, some new
+    guest_products = product_ids[size // 4:size // 4 + size]
+    response = client.post('/api/v1/cart/batch', json={'operations': [
+        {'op': 'add', 'product_id': product_id, 'quantity': 2} for product_id in guest_products[:100]
+    ]})
+    token = response.get_json()['cart_token']
+    headers = {'X-Cart-Token': token}
+    for start in range(100, len(guest_products), 100):
+        client.post('/api/v1/cart/batch', headers=headers, json={'operations': [
+            {'op': 'add', 'product_id': product_id, 'quantity': 2}
+            for product_id in guest_products[start:start + 100]
+        ]})
+    guest_cart = client.get('/api/v1/cart/', headers=headers).get_json()
+    guest_cart_id = guest_cart['id']
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    response = client.post('/api/v1/auth/login', json={
+        'email': email, 'password': PASSWORD, 'cart_token': token})
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, 'before_cursor_execute', count)
+
+    expected = Counter({product_id: 1 for product_id in product_ids[:size // 2]})
+    expected.update({product_id: 2 for product_id in guest_products})
+    merged = dict(db.session.query(CartItem.product_id, CartItem.quantity).filter_by(cart_id=cart_id))
+    errors = []
+    if response.status_code != 200:
+        errors.append(f'login returned {response.status_code}: {response.get_json()}')
+    if merged != dict(expected):
+        errors.append('merged quantities are wrong')
+    if db.session.get(Cart, guest_cart_id) is not None or CartItem.query.filter_by(cart_id=guest_cart_id).count():
+        errors.append('guest cart was not deleted')
+    if client.get('/api/v1/cart/', headers=headers).get_json()['items']:
+        errors.append('the cart token still shows the merged cart')
+    print(f'merge of {len(guest_products)} guest lines into {size // 2}: '
+          f'{len(statements)} statements, {elapsed * 1000:.1f}ms')
+    for error in errors:
+        print(f'  FAIL: {error}')
+    return len(statements), not errors
+
+
+def check_sweep(app, stale, fresh, batch_size):
+    from app.models import Cart, CartItem
+    from app.services.cart_service import sweep_guest_carts
+
+    now = db.session.execute(db.select(db.func.now())).scalar()
+    old = now - timedelta(seconds=app.config['GUEST_CART_TTL'] + 3600)
+    db.session.execute(db.insert(Cart), [{'user_id': None, 'updated_at': old} for _ in range(stale)])
+    db.session.execute(db.insert(Cart), [{'user_id': None, 'updated_at': now} for _ in range(fresh)])
+    guest_ids = [row[0] for row in db.session.query(Cart.id).filter(Cart.user_id.is_(None))]
+    db.session.execute(db.insert(CartItem), [
+        {'cart_id': cart_id, 'product_id': product_id, 'quantity': 1, 'unit_price': 10}
+        for cart_id in guest_ids for product_id in (1, 2, 3)
+    ])
+    db.session.commit()
+
+    started = time.perf_counter()
+    deleted = sweep_guest_carts(batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+
+    remaining = Cart.query.filter(Cart.user_id.is_(None)).count()
+    orphans = db.session.query(CartItem).outerjoin(Cart, Cart.id == CartItem.cart_id).filter(Cart.id.is_(None)).count()
+    print(f'sweep: deleted {deleted} of {stale} stale guest carts in {elapsed:.2f}s '
+          f'({stale / elapsed:,.0f}/s, batches of {batch_size}); '
+          f'{remaining} fresh kept, {orphans} orphaned lines')
+    ok = deleted == stale and remaining == fresh and not orphans
+    if not ok:
+        print('  FAIL: sweep left stale carts or deleted fresh ones')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--stale', type=int, default=20000)
+    parser.add_argument('--fresh', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--store', default='database', choices=['database', 'memory', 'sqlite'])
+    args = parser.parse_args()
+
+    app = make_app(CART_STORE=args.store)
+    ok = True
+    with app.app_context():
+        seed_products(2 * max(args.sizes))
+        from app.models import Product
+        product_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id)]
+
+        counts = set()
+        for size in args.sizes:
+            statements, merged = check_merge(app, size, product_ids)
+            counts.add(statements)
+            ok = ok and merged
+        if len(counts) > 1:
+            print('FAIL: the statements issued at login grow with the carts')
+            ok = False
+
+        ok = check_sweep(app, args.stale, args.fresh, args.batch_size) and ok
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
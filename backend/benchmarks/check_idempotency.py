@@ -0,0 +1,125 @@
+"""Concurrent duplicate submissions with an Idempotency-Key.
+
+    python -m benchmarks.check_idempotency [--threads 16]
+
+Fires the same checkout, and the same add-to-cart, from many threads at
+once with one Idempotency-Key (as a client retrying after a timeout
+would), against a SQLite file. Exactly one order must be created and
+the cart quantity incremented once; every duplicate must get either the
+stored response or 409 (first request still running), and a later retry
+must replay the original response, while a retry after a failure must
+run again. Exits non-zero on any violation.
+"""
+import argparse
+import sys
+import threading
+from collections import Counter
+
+from flask_jwt_extended import create_access_token
+
+from .common import db, make_app, seed_products
+
+
+def fire(app, n, method, url, headers, body):
+    """Send one request from each of n threads at the same moment; returns the responses"""
+    barrier = threading.Barrier(n)
+    responses = []
+
+    def send():
+        client = app.test_client()
+        barrier.wait()
+        response = getattr(client, method)(url, headers=headers, json=body)
+        responses.append((response.status_code, response.headers.get('Idempotent-Replayed'), response.get_json()))
+
+    threads = [threading.Thread(target=send) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    app = make_app()
+    failures = []
+
+    def check(condition, message):
+        print(f"{'ok' if condition else 'FAIL':<5} {message}")
+        if not condition:
+            failures.append(message)
+
+    with app.app_context():
+        seed_products(10)
+        from app.models import Address, CartItem, Order, Product, User
+        db.session.execute(db.update(Product).values(stock=100))
+        user = User(email='retry@example.com', password_hash='x', full_name='Retry')
+        db.session.add(user)
+        db.session.flush()
+        address = Address(user_id=user.id, label='Home', line1='1 Street', city='City',
+                          state='State', postal_code='000', country='IN')
+        db.session.add(address)
+        db.session.commit()
+        user_id, address_id = user.id, address.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+        client = app.test_client()
+
+        # Add to cart: the quantity must be incremented once
+        add_headers = dict(headers, **{'Idempotency-Key': 'add-1'})
+        responses = fire(app, args.threads, 'post', '/api/v1/cart/items', add_headers,
+                         {'product_id': 1, 'quantity': 2})
+        statuses = Counter(status for status, _, _ in responses)
+        print(f'add to cart x{args.threads}: {dict(statuses)}')
+        check(set(statuses) <= {200, 409}, 'duplicate adds answered 200 or 409')
+        quantity = db.session.query(CartItem.quantity).filter_by(product_id=1).scalar()
+        check(quantity == 2, f'cart quantity incremented once (quantity {quantity})')
+
+        retry = client.post('/api/v1/cart/items', headers=add_headers, json={'product_id': 1, 'quantity': 2})
+        check(retry.status_code == 200 and retry.headers.get('Idempotent-Replayed') == 'true',
+              'later retry of the add is replayed')
+        reused = client.post('/api/v1/cart/items', headers=add_headers, json={'product_id': 2, 'quantity': 1})
+        check(reused.status_code == 422, 'same key with a different body is rejected with 422')
+
+        # Checkout: exactly one order
+        checkout_headers = dict(headers, **{'Idempotency-Key': 'checkout-1'})
+        body = {'shipping_address_id': address_id, 'payment_method': 'cod'}
+        responses = fire(app, args.threads, 'post', '/api/v1/orders/checkout', checkout_headers, body)
+        statuses = Counter(status for status, _, _ in responses)
+        print(f'checkout x{args.threads}: {dict(statuses)}')
+        check(set(statuses) <= {201, 409}, 'duplicate checkouts answered 201 or 409')
+        db.session.expire_all()
+        orders = Order.query.filter_by(user_id=user_id).count()
+        check(orders == 1, f'exactly one order created ({orders})')
+
+        order_ids = {payload['order_id'] for status, _, payload in responses if status == 201}
+        retry = client.post('/api/v1/orders/checkout', headers=checkout_headers, json=body)
+        check(len(order_ids) == 1 and retry.status_code == 201 and retry.get_json()['order_id'] in order_ids,
+              'every 201 and the later retry carry the same order id')
+
+        # Without a key nothing changes: two adds add twice
+        for _ in range(2):
+            client.post('/api/v1/cart/items', headers=headers, json={'product_id': 3, 'quantity': 1})
+        quantity = db.session.query(CartItem.quantity).filter_by(product_id=3).scalar()
+        check(quantity == 2, 'requests without a key are not deduplicated')
+
+        # A failed request is not replayed: the retry runs again
+        retry_headers = dict(headers, **{'Idempotency-Key': 'checkout-2'})
+        db.session.execute(db.update(Product).where(Product.id == 3).values(stock=0))
+        db.session.commit()
+        failed = client.post('/api/v1/orders/checkout', headers=retry_headers, json=body)
+        db.session.execute(db.update(Product).where(Product.id == 3).values(stock=100))
+        db.session.commit()
+        retry = client.post('/api/v1/orders/checkout', headers=retry_headers, json=body)
+        check(failed.status_code == 409 and retry.status_code == 201
+              and retry.headers.get('Idempotent-Replayed') is None,
+              f'retry after a failed checkout runs again ({failed.status_code}, then {retry.status_code})')
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
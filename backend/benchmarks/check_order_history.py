@@ -0,0 +1,111 @@
+"""Statement-count check for the order history (GET /api/v1/orders/).
+
+    python -m benchmarks.check_order_history [--orders 1000] [--per-page 20 50] [--max-queries 2]
+
+Gives one user --orders orders of 1-5 lines each, then walks their whole
+history page by page with next_cursor, counting the SQL statements of
+every request. Exits non-zero if any page issues more than
+--max-queries statements (i.e. if items or products are loaded per
+order), if an order is missing or repeated, or if an item count
+disagrees with the items returned.
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from .common import db, make_app, seed_products, summarize, time_calls
+
+
+def seed_orders(n_orders, product_ids):
+    """One user with ``n_orders`` orders; returns (user_id, {order_id: line count})"""
+    from app.models import Address, Order, OrderItem, User
+    rng = random.Random(20)
+    user = User(email='history@example.com', password_hash='x', full_name='History')
+    db.session.add(user)
+    db.session.flush()
+    address = Address(user_id=user.id, label='Home', line1='1 Street', city='City',
+                      state='State', postal_code='000', country='IN')
+    db.session.add(address)
+    db.session.flush()
+
+    # Several orders share a timestamp, so pages must break ties on id
+    start = datetime.now() - timedelta(days=365)
+    db.session.execute(db.insert(Order), [
+        {'user_id': user.id, 'shipping_address_id': address.id, 'total_amount': 10, 'payment_method': 'cod',
+         'created_at': start + timedelta(hours=i // 3)}
+        for i in range(n_orders)
+    ])
+    order_ids = [row[0] for row in db.session.query(Order.id).filter_by(user_id=user.id)]
+    lines = {order_id: rng.randint(1, 5) for order_id in order_ids}
+    db.session.execute(db.insert(OrderItem), [
+        {'order_id': order_id, 'product_id': product_id, 'quantity': 2, 'unit_price': 5, 'total_price': 10}
+        for order_id, count in lines.items() for product_id in rng.sample(product_ids, count)
+    ])
+    db.session.commit()
+    return user.id, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--per-page', type=int, nargs='+', default=[20, 50])
+    parser.add_argument('--max-queries', type=int, default=2)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    failures = 0
+    with app.app_context():
+        seed_products(100)
+        from app.models import Product
+        product_ids = [row[0] for row in db.session.query(Product.id)]
+        user_id, lines = seed_orders(args.orders, product_ids)
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for per_page in args.per_page:
+            seen = []
+            counts = []
+            latencies = []
+            after = ''
+            while after is not None:
+                url = f'/api/v1/orders/?per_page={per_page}&after={after}'
+                event.listen(db.engine, 'before_cursor_execute', count)
+                statements.clear()
+                latencies += time_calls(lambda: client.get(url, headers=headers), [()])
+                event.remove(db.engine, 'before_cursor_execute', count)
+                counts.append(len(statements))
+
+                page = client.get(url, headers=headers).get_json()
+                for order in page['items']:
+                    seen.append(order['id'])
+                    if order['item_count'] != len(order['items']) or order['item_count'] != lines[order['id']]:
+                        print(f'FAIL: order {order["id"]} item count {order["item_count"]}, '
+                              f'{len(order["items"])} items returned, {lines[order["id"]]} expected')
+                        failures += 1
+                after = page['next_cursor']
+
+            summarize(f'{per_page} per page, {len(counts)} pages '
+                      f'({min(counts)}-{max(counts)} statements per page)', latencies)
+            if max(counts) > args.max_queries:
+                print(f'FAIL: a page issued {max(counts)} statements (limit {args.max_queries})')
+                failures += 1
+            if len(seen) != len(set(seen)) or set(seen) != set(lines):
+                print(f'FAIL: walked {len(seen)} orders ({len(set(seen))} distinct) of {len(lines)}')
+                failures += 1
+
+    print('ok' if not failures else f'{failures} failure(s)')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
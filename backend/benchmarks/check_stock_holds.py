@@ -0,0 +1,199 @@
+"""Stock holds: payment webhook, expiry and concurrent release.
+
+    python -m benchmarks.check_stock_holds [--orders 5000] [--workers 4] [--batch-size 500]
+
+Checks the hold life cycle through the API first: a Stripe checkout
+holds its stock, payment_intent.succeeded keeps it sold, and a hold
+that expires gives the stock back and cancels the order (a late
+webhook does not revive it).
+
+Then --orders pending orders with holds are bulk-inserted (two thirds
+expired; every tenth expired one already paid) and --workers threads,
+each with its own database connection like separate gunicorn workers,
+run release_expired_holds() at the same time. Exits non-zero if a
+hold was released twice, stock does not add up, or an order ends up
+in the wrong state. Set BENCH_DATABASE_URL to run against PostgreSQL
+(SKIP LOCKED) instead of the SQLite fallback.
+"""
+import argparse
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+
+from .common import db, make_app, seed_products
+
+STOCK = 10 ** 6
+
+
+def seed_shopper():
+    from app.models import Address, User
+    user = User(email='holds@example.com', password_hash='x', full_name='Holds')
+    db.session.add(user)
+    db.session.flush()
+    address = Address(user_id=user.id, label='Home', line1='1 Street', city='City',
+                      state='State', postal_code='000', country='IN')
+    db.session.add(address)
+    db.session.commit()
+    return user.id, address.id
+
+
+def check_life_cycle(app, user_id, address_id):
+    from app.models import Job, Order, Product, StockHold
+    from app.models.order import OrderStatus
+    from app.services.stock_hold_service import release_expired_holds
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+    errors = []
+
+    def checkout():
+        client.post('/api/v1/cart/items', headers=headers, json={'product_id': 1, 'quantity': 3})
+        response = client.post('/api/v1/orders/checkout', headers=headers, json={
+            'shipping_address_id': address_id, 'payment_method': 'stripe'})
+        return response.get_json()
+
+    def webhook(order_id):
+        return client.post('/webhooks/payment/stripe', json={
+            'type': 'payment_intent.succeeded',
+            'data': {'object': {'metadata': {'order_id': str(order_id)}}}})
+
+    def stock():
+        db.session.expire_all()
+        return db.session.get(Product, 1).stock
+
+    paid = checkout()
+    if 'payment_due_by' not in paid or StockHold.query.filter_by(order_id=paid['order_id']).count() != 1:
+        errors.append('stripe checkout did not hold its stock')
+    webhook(paid['order_id'])
+    webhook(paid['order_id'])  # retried by the provider
+    release_expired_holds(now=datetime.now() + timedelta(days=1))
+    if db.session.get(Order, paid['order_id']).status != OrderStatus.PAID or stock() != STOCK - 3:
+        errors.append('a paid order lost its stock or status')
+    if Job.query.filter(Job.task.endswith(':deliver_email')).count() != 1:
+        errors.append('the payment did not queue exactly one confirmation email')
+
+    expired = checkout()
+    release_expired_holds(now=datetime.now() + timedelta(days=1))
+    if db.session.get(Order, expired['order_id']).status != OrderStatus.CANCELLED or stock() != STOCK - 3:
+        errors.append('an expired hold was not given back')
+    webhook(expired['order_id'])
+    db.session.expire_all()
+    if db.session.get(Order, expired['order_id']).status != OrderStatus.CANCELLED:
+        errors.append('a late webhook revived a cancelled order')
+
+    print('life cycle: ' + ('ok' if not errors else 'FAIL'))
+    for error in errors:
+        print(f'  FAIL: {error}')
+    return not errors
+
+
+def seed_holds(n_orders, user_id, address_id, product_ids):
+    """Pending orders with two holds each; returns {order_id: (expired, paid)}"""
+    from app.models import Order, StockHold
+    from app.models.order import OrderStatus
+    now = datetime.now()
+    first_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+    plan = {}
+    for i in range(n_orders):
+        expired = i % 3 != 0
+        plan[first_id + i] = (expired, expired and i % 10 == 1)
+    db.session.execute(db.insert(Order), [
+        {'id': order_id, 'user_id': user_id, 'shipping_address_id': address_id, 'total_amount': 10,
+         'payment_method': 'stripe', 'status': OrderStatus.PAID if paid else OrderStatus.PENDING}
+        for order_id, (_, paid) in plan.items()
+    ])
+    db.session.execute(db.insert(StockHold), [
+        {'order_id': order_id, 'product_id': product_ids[(order_id + k) % len(product_ids)], 'quantity': k + 1,
+         'expires_at': now - timedelta(minutes=1) if expired else now + timedelta(hours=1)}
+        for order_id, (expired, _) in plan.items() for k in range(2)
+    ])
+    db.session.commit()
+    return plan
+
+
+def check_concurrent_release(app, args, user_id, address_id):
+    from app.models import Order, Product, StockHold
+    from app.models.order import OrderStatus
+    from app.services.stock_hold_service import release_expired_holds
+
+    product_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id)]
+    stock_before = dict(db.session.query(Product.id, Product.stock))
+    plan = seed_holds(args.orders, user_id, address_id, product_ids)
+    holds = db.session.query(StockHold.order_id, StockHold.product_id, StockHold.quantity).all()
+    expected_stock = dict(stock_before)
+    expired_holds = 0
+    for order_id, product_id, quantity in holds:
+        expired, paid = plan.get(order_id, (False, False))
+        expired_holds += expired
+        if expired and not paid:
+            expected_stock[product_id] += quantity
+
+    released = []
+    failures = []
+
+    def worker():
+        with app.app_context():
+            try:
+                released.append(release_expired_holds(batch_size=args.batch_size))
+            except Exception as e:
+                failures.append(repr(e))
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    db.session.expire_all()
+    statuses = dict(db.session.query(Order.id, Order.status).filter(Order.id.in_(list(plan))))
+    wrong_orders = sum(
+        statuses[order_id] != (OrderStatus.PAID if paid else OrderStatus.CANCELLED if expired else OrderStatus.PENDING)
+        for order_id, (expired, paid) in plan.items()
+    )
+    stock_after = dict(db.session.query(Product.id, Product.stock))
+    left = StockHold.query.filter(StockHold.expires_at <= datetime.now()).count()
+
+    print(f'{args.workers} workers released {sum(released)} of {expired_holds} expired holds '
+          f'({"/".join(map(str, released))}) in {elapsed:.2f}s, batches of {args.batch_size}; '
+          f'{left} expired left, {wrong_orders} orders in the wrong state')
+    ok = (not failures and sum(released) == expired_holds and not left and not wrong_orders
+          and stock_after == expected_stock)
+    for failure in failures:
+        print(f'  FAIL: {failure}')
+    if stock_after != expected_stock:
+        print('  FAIL: stock does not add up')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app(STOCK_HOLD_RELEASE_INTERVAL=0)
+    with app.app_context():
+        seed_products(50)
+        from app.models import Product
+        db.session.execute(db.update(Product).values(stock=STOCK))
+        db.session.commit()
+        user_id, address_id = seed_shopper()
+
+        ok = check_life_cycle(app, user_id, address_id)
+        ok = check_concurrent_release(app, args, user_id, address_id) and ok
+
+    print('ok' if ok else 'FAIL')
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Shared helpers for the benchmark scripts.
+
+Each benchmark builds the app against a throwaway SQLite file (or the
+database in BENCH_DATABASE_URL), seeds it with synthetic rows and prints
+its measurements. Run them from the backend directory, e.g.:
+
+    python -m benchmarks.bench_search --sizes 100000 1000000
+
+The check_* scripts assert behaviour rather than time it and exit
+non-zero on failure; CI (.github/workflows/ci.yml) runs them all.
+"""
+import atexit
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+WORDS = (
+    'wireless bluetooth headphones noise cancelling portable power bank fast '
+    'charging denim jacket oversized cotton shirt leather wallet smart watch '
+    'fitness tracker running shoes yoga mat stainless steel bottle ceramic mug '
+    'gaming mouse mechanical keyboard usb cable hdmi adapter laptop stand desk '
+    'lamp led bulb backpack travel organizer sunglasses polarized hoodie fleece'
+).split()
+
+SEED_BATCH_SIZE = 10000
+
+# Long-tail vocabulary (brand and model names) so that search terms have a
+# realistic selectivity instead of each matching half the catalog
+_SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'zu', 'ra', 'ti', 'vo', 'xe', 'qu', 'sa', 'dor']
+RARE_WORDS = sorted({
+    a + b + c for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES
+})
+
+
+def make_app(database_url=None, **overrides):
+    """Create the app against a fresh benchmark database"""
+    if database_url is None:
+        database_url = os.environ.get('BENCH_DATABASE_URL')
+    if database_url is None:
+        handle, path = tempfile.mkstemp(prefix='bench_', suffix='.db')
+        os.close(handle)
+        atexit.register(os.remove, path)
+        database_url = f'sqlite:///{path}'
+
+    settings = dict(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        TESTING=True,
+        CACHE_BACKEND='null',  # measure the database unless a benchmark opts in
+    )
+    settings.update(overrides)
+    config = type('BenchConfig', (Config,), settings)
+    app = create_app(config)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def random_text(rng, n_words, n_rare=0):
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    words += [rng.choice(RARE_WORDS) for _ in range(n_rare)]
+    rng.shuffle(words)
+    return ' '.join(words)
+
+
+def seed_categories(n=20):
+    """Insert n flat categories and return their ids"""
+    from app.models import Category
+    db.session.execute(db.insert(Category), [
+        {'name': f'Category {i}', 'slug': f'category-{i}', 'description': None}
+        for i in range(n)
+    ])
+    # Bulk inserts skip the mapper event that fills in the materialized path
+    db.session.execute(db.update(Category).values(path='/' + db.cast(Category.id, db.String) + '/', depth=0))
+    db.session.commit()
+    return [row[0] for row in db.session.query(Category.id).all()]
+
+
+def seed_products(n, category_ids=None, seed=42):
+    """Bulk-insert n synthetic products"""
+    from app.models import Product
+    rng = random.Random(seed)
+    category_ids = category_ids or seed_categories()
+    start = db.session.query(db.func.count(Product.id)).scalar()
+
+    for offset in range(0, n, SEED_BATCH_SIZE):
+        rows = []
+        for i in range(start + offset, start + min(offset + SEED_BATCH_SIZE, n)):
+            price = round(rng.uniform(1, 1000), 2)
+            rows.append({
+                'name': random_text(rng, 2, n_rare=2).title(),
+                'slug': f'product-{i}',
+                'description': random_text(rng, 40, n_rare=4),
+                'price': price,
+                'discount_price': round(price * 0.8, 2) if rng.random() < 0.2 else None,
+                'sku': f'SKU-{i:08d}',
+                'stock': rng.choice([0, 0, 5, 10, 50, 100]),
+                'is_active': rng.random() > 0.05,
+                'is_featured': rng.random() < 0.01,
+                'category_id': rng.choice(category_ids),
+                'images': [],
+            })
+        db.session.execute(db.insert(Product), rows)
+        db.session.commit()
+
+
+def time_calls(fn, args_list):
+    """Run fn once per argument tuple and return latencies in milliseconds"""
+    latencies = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(label, latencies):
+    print(f'{label:<40} p50={percentile(latencies, 50):8.2f}ms '
+          f'p95={percentile(latencies, 95):8.2f}ms '
+          f'mean={statistics.mean(latencies):8.2f}ms n={len(latencies)}')
@@ -0,0 +1,140 @@
+"""Concurrent checkouts of the same hot SKUs: throughput and oversell.
+
+    python -m benchmarks.stress_inventory --threads 16 --stock 200
+
+Every thread is a shopper that repeatedly adds the hot SKU (and, half
+the time, a second hot SKU, in random order) to its cart and checks
+out, until checkout answers 409 (sold out). At the end, the units sold
+per SKU are compared with its initial stock: the oversell count must be
+zero and the remaining stock must equal initial stock minus units sold.
+
+--naive swaps in a read-then-write reservation (SELECT stock, check,
+UPDATE stock = <new value>) to show the oversell the conditional
+decrement prevents. Exits non-zero on any oversell in the default mode.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask_jwt_extended import create_access_token
+
+from .common import db, make_app, seed_products
+
+
+def seed_shoppers(n):
+    from app.models import Address, User
+    db.session.execute(db.insert(User), [
+        {'email': f'shopper{i}@example.com', 'password_hash': 'x', 'full_name': f'Shopper {i}'}
+        for i in range(n)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+    db.session.execute(db.insert(Address), [
+        {'user_id': user_id, 'label': 'Home', 'line1': '1 Street', 'city': 'City',
+         'state': 'State', 'postal_code': '000', 'country': 'IN'}
+        for user_id in user_ids
+    ])
+    db.session.commit()
+    return dict(db.session.query(Address.user_id, Address.id).all())
+
+
+def naive_reserve(quantities):
+    """Read-modify-write reservation, for comparison only"""
+    from app.models import Product
+    from app.services.inventory_service import InsufficientStock
+    for product_id, quantity in quantities:
+        stock = db.session.query(Product.stock).filter(Product.id == product_id).scalar()
+        if stock < quantity:
+            raise InsufficientStock(product_id, quantity)
+        time.sleep(0)  # yield between the read and the write, as real work would
+        db.session.execute(db.update(Product).where(Product.id == product_id).values(stock=stock - quantity))
+
+
+def shopper(app, token, address_id, hot_ids, max_orders, seed, results):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    rng = random.Random(seed)
+    outcome = Counter()
+    for _ in range(max_orders):
+        product_ids = list(hot_ids) if rng.random() < 0.5 else hot_ids[:1]
+        rng.shuffle(product_ids)
+        for product_id in product_ids:
+            client.post('/api/v1/cart/items', headers=headers, json={'product_id': product_id, 'quantity': 1})
+        response = client.post('/api/v1/orders/checkout', headers=headers, json={
+            'shipping_address_id': address_id, 'payment_method': 'cod'})
+        if response.status_code == 201:
+            outcome['orders'] += 1
+        elif response.status_code == 409:
+            outcome['sold_out'] += 1
+            break
+        else:
+            outcome[f"error: {response.get_json().get('error')}"] += 1
+    results.append(outcome)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=200, help='initial stock of each hot SKU')
+    parser.add_argument('--naive', action='store_true', help='use a read-then-write reservation')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        seed_products(100)
+        from app.models import OrderItem, Product
+        hot_ids = [row[0] for row in db.session.query(Product.id).order_by(Product.id).limit(2).all()]
+        db.session.execute(db.update(Product).where(Product.id.in_(hot_ids)).values(stock=args.stock))
+        db.session.commit()
+        addresses = seed_shoppers(args.threads)
+        tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in addresses}
+
+    if args.naive:
+        from app.services import order_service
+        order_service.reserve_stock = naive_reserve
+
+    results = []
+    threads = [
+        threading.Thread(target=shopper, args=(
+            app, tokens[user_id], address_id, hot_ids, args.stock * 2, i, results))
+        for i, (user_id, address_id) in enumerate(addresses.items())
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    outcome = sum(results, Counter())
+    with app.app_context():
+        sold = dict(
+            db.session.query(OrderItem.product_id, db.func.sum(OrderItem.quantity))
+            .filter(OrderItem.product_id.in_(hot_ids)).group_by(OrderItem.product_id).all()
+        )
+        remaining = dict(db.session.query(Product.id, Product.stock).filter(Product.id.in_(hot_ids)).all())
+
+    mode = 'naive read-then-write' if args.naive else 'conditional decrement'
+    print(f'{mode}: {args.threads} threads, {args.stock} units of each of {len(hot_ids)} hot SKUs')
+    print(f"{outcome['orders']} orders in {elapsed:.1f}s ({outcome['orders'] / elapsed:,.0f} orders/s)")
+    for key, count in sorted(outcome.items()):
+        if key.startswith('error'):
+            print(f'  {count} x {key}')
+
+    oversold = lost = 0
+    for product_id in hot_ids:
+        units = sold.get(product_id, 0)
+        oversold += max(0, units - args.stock)
+        # Stock that disagrees with the units sold: decrements lost to races
+        lost += abs(remaining[product_id] - (args.stock - units))
+        print(f'  SKU {product_id}: sold {units}, stock left {remaining[product_id]}')
+    print(f'oversell count: {oversold} units, lost stock updates: {lost} units')
+
+    if (oversold or lost) and not args.naive:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""table counters
+
+Revision ID: 3c7a90e5d218
+Revises: 9f3d61c8b2e7
+Create Date: 2026-10-18 21:05:43.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7a90e5d218'
+down_revision = '9f3d61c8b2e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are created from an exact COUNT(*) the first time each counter is read
+    op.create_table('table_counters',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('count', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_counters')
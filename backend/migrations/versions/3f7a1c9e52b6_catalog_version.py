@@ -0,0 +1,29 @@
+"""catalog version
+
+Revision ID: 3f7a1c9e52b6
+Revises: c4a8f2d6e913
+Create Date: 2026-10-19 11:04:27.631952
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7a1c9e52b6'
+down_revision = 'c4a8f2d6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=32), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_version')
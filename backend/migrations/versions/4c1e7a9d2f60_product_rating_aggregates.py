@@ -0,0 +1,53 @@
+"""product rating aggregates
+
+Revision ID: 4c1e7a9d2f60
+Revises: 8bb50f620213
+Create Date: 2026-10-18 12:40:05.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e7a9d2f60'
+down_revision = '8bb50f620213'
+branch_labels = None
+depends_on = None
+
+COUNT_COLUMNS = ['rating_count'] + [f'rating_{star}_count' for star in range(1, 6)]
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_avg', sa.Numeric(precision=3, scale=2), nullable=True))
+        for name in COUNT_COLUMNS:
+            batch_op.add_column(sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing reviews with correlated subqueries
+    products = sa.table('products', sa.column('id', sa.Integer),
+                        sa.column('rating_avg', sa.Numeric), *[sa.column(n, sa.Integer) for n in COUNT_COLUMNS])
+    reviews = sa.table('reviews', sa.column('product_id', sa.Integer), sa.column('rating', sa.Integer))
+
+    def aggregate(expression, *criteria):
+        return (
+            sa.select(expression)
+            .where(reviews.c.product_id == products.c.id, *criteria)
+            .scalar_subquery()
+        )
+
+    values = {
+        'rating_count': aggregate(sa.func.count()),
+        'rating_avg': aggregate(sa.func.round(sa.func.avg(reviews.c.rating * 1.0), 2)),
+    }
+    for star in range(1, 6):
+        values[f'rating_{star}_count'] = aggregate(sa.func.count(), reviews.c.rating == star)
+
+    op.get_bind().execute(products.update().values(**values))
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        for name in reversed(COUNT_COLUMNS):
+            batch_op.drop_column(name)
+        batch_op.drop_column('rating_avg')
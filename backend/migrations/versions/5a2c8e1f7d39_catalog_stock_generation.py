@@ -0,0 +1,26 @@
+"""catalog stock generation
+
+Revision ID: 5a2c8e1f7d39
+Revises: 3f7a1c9e52b6
+Create Date: 2026-10-19 14:37:52.208614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2c8e1f7d39'
+down_revision = '3f7a1c9e52b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('catalog_version', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_generation', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_version', schema=None) as batch_op:
+        batch_op.drop_column('stock_generation')
@@ -0,0 +1,26 @@
+"""orders updated_at index
+
+Revision ID: 6d2f8b41c9a3
+Revises: 3c7a90e5d218
+Create Date: 2026-10-18 22:14:09.731552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2f8b41c9a3'
+down_revision = '3c7a90e5d218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_updated_at', ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_updated_at')
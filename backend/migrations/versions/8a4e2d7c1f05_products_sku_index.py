@@ -0,0 +1,26 @@
+"""products sku index
+
+Revision ID: 8a4e2d7c1f05
+Revises: 1e9b7c53a6d4
+Create Date: 2026-10-18 23:41:27.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e2d7c1f05'
+down_revision = '1e9b7c53a6d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_sku', ['sku'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_sku')
@@ -0,0 +1,60 @@
+"""category materialized path
+
+Revision ID: 8bb50f620213
+Revises: 8d52de591382
+Create Date: 2026-10-18 11:02:17.540981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8bb50f620213'
+down_revision = '8d52de591382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('path', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_categories_path'), ['path'], unique=False)
+
+    # Backfill paths top-down from the existing parent_id links
+    bind = op.get_bind()
+    categories = sa.table(
+        'categories',
+        sa.column('id', sa.Integer),
+        sa.column('parent_id', sa.Integer),
+        sa.column('path', sa.String),
+        sa.column('depth', sa.Integer),
+    )
+    parents = dict(bind.execute(sa.select(categories.c.id, categories.c.parent_id)).fetchall())
+
+    paths = {}
+
+    def resolve(category_id, seen=()):
+        if category_id in paths:
+            return paths[category_id]
+        parent_id = parents.get(category_id)
+        if parent_id is None or parent_id not in parents or parent_id in seen:
+            paths[category_id] = (f'/{category_id}/', 0)
+        else:
+            parent_path, parent_depth = resolve(parent_id, seen + (category_id,))
+            paths[category_id] = (f'{parent_path}{category_id}/', parent_depth + 1)
+        return paths[category_id]
+
+    for category_id in parents:
+        path, depth = resolve(category_id)
+        bind.execute(
+            categories.update().where(categories.c.id == category_id).values(path=path, depth=depth)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_categories_path'))
+        batch_op.drop_column('depth')
+        batch_op.drop_column('path')
@@ -0,0 +1,43 @@
+"""daily sales
+
+Revision ID: 9f3d61c8b2e7
+Revises: e27c95d4a1f8
+Create Date: 2026-10-18 19:48:21.307716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3d61c8b2e7'
+down_revision = 'e27c95d4a1f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+
+    # Backfill from the existing orders (`flask sales backfill` does the same)
+    orders = sa.table('orders', sa.column('created_at', sa.DateTime), sa.column('status', sa.String),
+                      sa.column('total_amount', sa.Numeric))
+    daily_sales = sa.table('daily_sales', sa.column('day', sa.Date), sa.column('order_count', sa.Integer),
+                           sa.column('revenue', sa.Numeric))
+    day = sa.func.date(orders.c.created_at)
+    revenue = sa.case((orders.c.status.in_(['CANCELLED', 'REFUNDED']), 0), else_=orders.c.total_amount)
+    op.get_bind().execute(daily_sales.insert().from_select(
+        ['day', 'order_count', 'revenue'],
+        sa.select(day, sa.func.count(), sa.func.coalesce(sa.func.sum(revenue), 0))
+        .where(orders.c.created_at.isnot(None))
+        .group_by(day)
+    ))
+
+
+def downgrade():
+    op.drop_table('daily_sales')
@@ -0,0 +1,45 @@
+"""hot query indexes
+
+Revision ID: a7d40f2e9b18
+Revises: e5b93a1c7d24
+Create Date: 2026-10-18 14:05:12.630418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d40f2e9b18'
+down_revision = 'e5b93a1c7d24'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns); see the model __table_args__ for what each serves
+INDEXES = [
+    ('ix_products_active_created', 'products', ['is_active', 'created_at', 'id']),
+    ('ix_products_created_at', 'products', ['created_at', 'id']),
+    ('ix_products_active_price', 'products', ['is_active', 'price', 'id']),
+    ('ix_products_category_price', 'products', ['category_id', 'price']),
+    ('ix_products_featured', 'products', ['is_featured', 'is_active']),
+    ('ix_orders_user_created', 'orders', ['user_id', 'created_at']),
+    ('ix_orders_created_at', 'orders', ['created_at', 'id']),
+    ('ix_orders_status_created', 'orders', ['status', 'created_at', 'id']),
+    ('ix_order_items_order_product', 'order_items', ['order_id', 'product_id']),
+    ('ix_order_items_product_order', 'order_items', ['product_id', 'order_id']),
+    ('ix_cart_items_cart_product', 'cart_items', ['cart_id', 'product_id']),
+    ('ix_carts_user_id', 'carts', ['user_id']),
+    ('ix_reviews_product_created', 'reviews', ['product_id', 'created_at', 'id']),
+    ('ix_reviews_created_at', 'reviews', ['created_at', 'id']),
+    ('ix_users_created_at', 'users', ['created_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
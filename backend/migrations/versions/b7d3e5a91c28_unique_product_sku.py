@@ -0,0 +1,37 @@
+"""unique product sku
+
+Revision ID: b7d3e5a91c28
+Revises: 8a4e2d7c1f05
+Create Date: 2026-10-19 09:12:44.185306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3e5a91c28'
+down_revision = '8a4e2d7c1f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # A blank SKU is no SKU (several products may have none)
+    bind.execute(sa.text("UPDATE products SET sku = NULL WHERE sku = ''"))
+    duplicates = bind.execute(sa.text(
+        'SELECT sku FROM products WHERE sku IS NOT NULL GROUP BY sku HAVING COUNT(*) > 1 LIMIT 10'
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f'Give these SKUs to one product each before upgrading: {", ".join(duplicates)}')
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_sku')
+        batch_op.create_index('ix_products_sku', ['sku'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_sku')
+        batch_op.create_index('ix_products_sku', ['sku'], unique=False)
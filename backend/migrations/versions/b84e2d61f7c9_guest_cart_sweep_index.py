@@ -0,0 +1,27 @@
+"""guest cart sweep index
+
+Revision ID: b84e2d61f7c9
+Revises: f1b6e83c2a95
+Create Date: 2026-10-18 18:41:09.512873
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b84e2d61f7c9'
+down_revision = 'f1b6e83c2a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (user_id, updated_at) also serves every lookup ix_carts_user_id did
+    op.create_index('ix_carts_user_updated', 'carts', ['user_id', 'updated_at'], unique=False)
+    op.drop_index('ix_carts_user_id', table_name='carts')
+
+
+def downgrade():
+    op.create_index('ix_carts_user_id', 'carts', ['user_id'], unique=False)
+    op.drop_index('ix_carts_user_updated', table_name='carts')
@@ -0,0 +1,26 @@
+"""cart version
+
+Revision ID: c3f18a6b5e42
+Revises: a7d40f2e9b18
+Create Date: 2026-10-18 16:05:41.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f18a6b5e42'
+down_revision = 'a7d40f2e9b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('carts', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,30 @@
+"""category path collation
+
+Revision ID: c4a8f2d6e913
+Revises: b7d3e5a91c28
+Create Date: 2026-10-19 09:48:03.526170
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8f2d6e913'
+down_revision = 'b7d3e5a91c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Subtree ranges need bytewise order, which SQLite compares in already;
+    # PostgreSQL rebuilds ix_categories_path under the new collation
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('categories', 'path', type_=sa.String(length=255, collation='C'),
+                        existing_type=sa.String(length=255), existing_nullable=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('categories', 'path', type_=sa.String(length=255),
+                        existing_type=sa.String(length=255, collation='C'), existing_nullable=True)
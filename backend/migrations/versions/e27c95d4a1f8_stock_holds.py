@@ -0,0 +1,41 @@
+"""stock holds
+
+Revision ID: e27c95d4a1f8
+Revises: b84e2d61f7c9
+Create Date: 2026-10-18 19:12:44.081532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27c95d4a1f8'
+down_revision = 'b84e2d61f7c9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_holds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('stock_holds', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stock_holds_expires_at'), ['expires_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_stock_holds_order_id'), ['order_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('stock_holds', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stock_holds_order_id'))
+        batch_op.drop_index(batch_op.f('ix_stock_holds_expires_at'))
+
+    op.drop_table('stock_holds')
@@ -0,0 +1,26 @@
+"""product facets index
+
+Revision ID: e5b93a1c7d24
+Revises: 4c1e7a9d2f60
+Create Date: 2026-10-18 13:26:41.902377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b93a1c7d24'
+down_revision = '4c1e7a9d2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_facets', ['is_active', 'category_id', 'price', 'stock'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_facets')
@@ -0,0 +1,26 @@
+"""order coupon discount
+
+Revision ID: f1b6e83c2a95
+Revises: d9a27c4e81b3
+Create Date: 2026-10-18 18:02:37.190264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6e83c2a95'
+down_revision = 'd9a27c4e81b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('coupon_discount', sa.Numeric(precision=10, scale=2), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_column('coupon_discount')